@@ -7,41 +7,45 @@ import os
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from firebase_admin import credentials, initialize_app
 import logging
 import socketio
 from app.services.SocketClient import socket_client
 from app.services.MongoDbClient import MongoDbClient
+from app.services.IndexRegistry import ensure_indexes
+from app.agents.client_registry import client_registry
+from app.services.LlmResponseCache import llm_response_cache
+from app.services.ColbertRegistry import colbert_registry
+from app.services.EmbeddingJobQueue import embedding_job_queue
 from app.services.System.SystemStateManager import SystemStateManager
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase
+# Firebase initializes on first use, see FirebaseService.get_firebase_app
 load_dotenv()
-cred = credentials.Certificate(os.getenv('FIREBASE_ADMIN_SDK'))
-try:
-    initialize_app(cred, {
-        'projectId': 'paxxiumv1',
-        'storageBucket': 'paxxiumv1.appspot.com'
-    })
-    logger.info("Firebase initialized successfully")
-except ValueError as e:
-    logger.error(f"Firebase initialization failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     mongo_client = MongoDbClient('paxxium')
     app.state.mongo_client = mongo_client
+    await ensure_indexes(mongo_client.db)
+    llm_response_cache.configure(mongo_client.db)
+    if os.getenv('COLBERT_WARMUP', 'true').lower() == 'true':
+        colbert_registry.start_warmup(mongo_client.db, int(os.getenv('COLBERT_WARMUP_INDEXES', '2')))
     app.state.system_state_manager = await SystemStateManager.get_instance(mongo_client)
     
     # Setup Socket.IO event handlers after system_state_manager is initialized
     from app.socket_handlers.setup_socket_handlers import setup_socket_handlers
     setup_socket_handlers(socket_client, app)
     app.state.sio = socket_client
+    embedding_job_queue.configure(mongo_client.db, socket_client)
+    await embedding_job_queue.start()
     yield
+    # Shutdown
+    await embedding_job_queue.close()
+    await client_registry.close()
 
 async def error_handling_middleware(request: Request, call_next):
     try:
@@ -79,7 +83,8 @@ def create_app():
     # Import and include routers
     from .routes import (
         chat_route, sam_route, moments_route, auth_route, images_route, 
-        news_routes, signup_route, insight_route, kb_route, systems_route, profile_route
+        news_routes, signup_route, insight_route, kb_route, systems_route, profile_route,
+        metrics_route
     )
     
     # Create chat routers
@@ -99,6 +104,7 @@ def create_app():
         news_routes.router,
         signup_route.router,
         kb_route.router,
+        metrics_route.router,
     ]
     
     for router in routers:
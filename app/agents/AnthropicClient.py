@@ -1,23 +1,30 @@
 import anthropic
 from dotenv import load_dotenv
 import os
+from app.agents.client_registry import client_registry
 
 class AnthropicClient:
+    provider = 'anthropic'
+
     def __init__(self, db=None, uid=None):
         self.db = db
         self.uid = uid
         self.client = None
 
     async def initialize(self):
-        """Initialize the Anthropic client asynchronously"""
+        """Initialize the async Anthropic client"""
         self.client = await self._get_client()
 
     async def _get_client(self):
+        uid = None if self.db is None else self.uid
+        return await client_registry.get_or_create(self.provider, uid, self._create_client)
+
+    async def _create_client(self):
         if self.db is None or self.uid is None:
             api_key = self._load_anthropic_key()
         else:
             api_key = await self._get_user_api_key()
-        return anthropic.Anthropic(api_key=api_key)
+        return anthropic.AsyncAnthropic(api_key=api_key, http_client=client_registry.async_http_client(anthropic))
 
     async def _get_user_api_key(self):
         user_doc = await self.db['users'].find_one({'_id': self.uid}, {'anthropic_key': 1})
@@ -36,5 +43,5 @@ class AnthropicClient:
         kwargs = {"messages": messages, "model": model, "stream": stream, "max_tokens": 8192}
         if system:
             kwargs["system"] = system
-        response = self.client.messages.create(**kwargs)
-        return response if stream else response.content[0].text
\ No newline at end of file
+        response = await self.client.messages.create(**kwargs)
+        return response if stream else response.content[0].text
@@ -1,3 +1,5 @@
+import asyncio
+import time
 from enum import Enum
 from dataclasses import dataclass
 from typing import Optional, List, Any, Dict, Union
@@ -5,11 +7,16 @@ import logging
 from app.agents.OpenAiClient import OpenAiClient
 from app.agents.AnthropicClient import AnthropicClient
 from app.utils.token_counter import token_counter
-from app.agents.handlers.stream_handler import StreamHandler
+from app.agents.handlers.stream_handler import StreamHandler, ResponseAccumulator
+from app.agents.generation_registry import stop_requested
+from app.utils.tracing import span
 from app.agents.chat_history_manager import ChatHistoryManager, DefaultChatHistoryManager
 
 logger = logging.getLogger(__name__)
 
+# Strong references to history maintenance tasks so they aren't garbage collected mid-run
+_background_tasks = set()
+
 class MessageType(Enum):
     END_OF_STREAM = "end_of_stream"
 
@@ -85,7 +92,7 @@ class BossAgent:
         self.image_path = None
 
         # Initialize handler
-        self.stream_handler = StreamHandler(config.sio, config.event_name)
+        self.stream_handler = StreamHandler(config.sio, config.event_name, model=config.model)
         
         # Use provided ChatHistoryManager or default
         self.chat_history_manager = chat_history_manager or DefaultChatHistoryManager()
@@ -97,29 +104,55 @@ class BossAgent:
             stream_response=self.stream_response,
         )
 
-    async def process_message(self, chat_history: List[Dict], chat_id: str, save_callback=None):
+    async def process_message(self, chat_history: List[Dict], chat_id: str, save_callback=None, room: Optional[str] = None):
         """
         Main entry point for processing messages. The chat_history is processed by 
         the ChatHistoryManager strategy, then an AI response is generated.
+        Stream events are delivered to `room`; without one they are broadcast.
         """
-        formatted_messages = self.chat_history_manager.process_history(chat_history)
-        return await self._get_ai_response(chat_id, formatted_messages, save_callback)
+        with span('BossAgent.process_message', model=self.model, history_messages=len(chat_history)):
+            with span('chat_history.prepare'):
+                await self.chat_history_manager.prepare(chat_id)
+                formatted_messages = self.chat_history_manager.process_history(chat_history)
+            final_response = await self._get_ai_response(chat_id, formatted_messages, save_callback, room)
+
+        # History maintenance (e.g. rolling summaries) runs after the reply has been streamed
+        task = asyncio.create_task(self._run_after_response(chat_id, chat_history))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return final_response
 
-    async def _get_ai_response(self, chat_id: str, formatted_messages: List[Dict], save_callback=None):
+    async def _run_after_response(self, chat_id: str, chat_history: List[Dict]):
+        try:
+            await self.chat_history_manager.after_response(chat_id, chat_history)
+        except Exception as e:
+            logger.error('Error in chat history maintenance for %s: %s', chat_id, str(e))
+
+    async def _get_ai_response(self, chat_id: str, formatted_messages: List[Dict], save_callback=None, room: Optional[str] = None):
         """Generate and process AI response"""
         system_content = self._create_system_content()
         message_role = Role.DEVELOPER.value if any(model in self.model.lower() for model in ['o1', 'o3-mini']) else Role.SYSTEM.value
         messages = [{"role": message_role, "content": system_content}, *formatted_messages]
         final_response = None
+        accumulator = ResponseAccumulator(chat_id)
         
         try:
-            response = await self.ai_response_generator.generate_response(messages)
-            stream_result = await self.stream_handler.process_stream(chat_id, response)
-            final_response = self.stream_handler.collapse_response_chunks(stream_result)
+            started_at = time.perf_counter()
+            with span('llm.request', model=self.model, messages=len(messages)):
+                response = await self.ai_response_generator.generate_response(messages)
+            await self.stream_handler.process_stream(chat_id, response, room, accumulator, started_at)
+            final_response = self.stream_handler.collapse_response_chunks(accumulator)
             
-            await self._send_end_of_stream(chat_id, 
-                stream_result['response_chunks'] if isinstance(stream_result, dict) else stream_result
-            )
+            await self._send_end_of_stream(chat_id, final_response, room)
+
+        except asyncio.CancelledError:
+            if not stop_requested():
+                raise
+            # Stopped by the user: finish the stream with what was generated so far
+            asyncio.current_task().uncancel()
+            logger.info('Generation for chat %s stopped by user', chat_id)
+            final_response = self.stream_handler.collapse_response_chunks(accumulator)
+            await self._send_end_of_stream(chat_id, final_response, room, stopped=True)
             
         finally:
             if save_callback and final_response:
@@ -134,13 +167,14 @@ class BossAgent:
             {self.system_message}
         '''
 
-    async def _send_end_of_stream(self, chat_id: str, response_chunks: List[Dict]):
+    async def _send_end_of_stream(self, chat_id: str, response_chunks: List[Dict], room: Optional[str] = None, stopped: bool = False):
         end_stream_obj = {
             'message_from': 'agent',
             'content': response_chunks,
             'type': MessageType.END_OF_STREAM.value,
             'room': chat_id,
             'image_path': self.image_path,
-            'context_urls': self.context_urls
+            'context_urls': self.context_urls,
+            'stopped': stopped
         }
-        await self.sio.emit(self.event_name, end_stream_obj)
\ No newline at end of file
+        await self.sio.emit(self.event_name, end_stream_obj, room=room)
\ No newline at end of file
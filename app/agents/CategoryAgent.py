@@ -1,11 +1,14 @@
 import dspy
 from dotenv import load_dotenv
+import logging
 import os
 from dspy import Signature, InputField, OutputField, LM, configure, Predict
 from pydantic import BaseModel
 from typing import List, Dict
+from app.services.LlmResponseCache import llm_response_cache
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 # OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 class Result(BaseModel):
     belongs: bool
@@ -38,28 +41,44 @@ class CategoryAgent:
         except Exception as e:
             print(f"Failed to initialize dspy: {e}")
         
-    def does_file_belong_in_category(self, file_path, category_list):
+    async def does_file_belong_in_category(self, file_path, category_list, bypass_cache=False):
+        # Failures raise out of the cached call, so a fallback answer is never cached
         try:
-            # Convert category_list to a string representation
-            category_list_str = ', '.join(category_list)
-            does_file_belong_in_category = Predict(DoesFileBelongInCategorySignature)
-            result_pred = does_file_belong_in_category(file_path=file_path, category_list=category_list_str)
-            result_obj = {
-                "belongs": result_pred.result.belongs,
-                "category": result_pred.result.category
-            }
-            print(result_obj)
-            return result_obj
+            return await llm_response_cache.get_or_compute(
+                'openai/gpt-4o-mini',
+                'DoesFileBelongInCategorySignature',
+                {'file_path': file_path, 'category_list': list(category_list)},
+                lambda: self._does_file_belong_in_category(file_path, category_list),
+                bypass=bypass_cache
+            )
         except Exception as e:
-            print(f"An error occurred: {e}")
-            return Result(belongs=False, category="")
-        
-    def create_new_category(self, file_path):
+            logger.error('Error checking the category of %s: %s', file_path, str(e))
+            return {"belongs": False, "category": ""}
+
+    def _does_file_belong_in_category(self, file_path, category_list):
+        # Convert category_list to a string representation
+        category_list_str = ', '.join(category_list)
+        does_file_belong_in_category = Predict(DoesFileBelongInCategorySignature)
+        result_pred = does_file_belong_in_category(file_path=file_path, category_list=category_list_str)
+        return {
+            "belongs": result_pred.result.belongs,
+            "category": result_pred.result.category
+        }
+
+    async def create_new_category(self, file_path, bypass_cache=False):
         try:
-            generate_new_category = Predict(GenerateNewCategorySignature)
-            result_pred = generate_new_category(file_path=file_path)
-            print(result_pred.new_category)
-            return result_pred.new_category
+            return await llm_response_cache.get_or_compute(
+                'openai/gpt-4o-mini',
+                'GenerateNewCategorySignature',
+                {'file_path': file_path},
+                lambda: self._create_new_category(file_path),
+                bypass=bypass_cache
+            )
         except Exception as e:
-            print(f"An error occurred: {e}")
-            return ""
\ No newline at end of file
+            logger.error('Error creating a category for %s: %s', file_path, str(e))
+            return ""
+
+    def _create_new_category(self, file_path):
+        generate_new_category = Predict(GenerateNewCategorySignature)
+        result_pred = generate_new_category(file_path=file_path)
+        return result_pred.new_category
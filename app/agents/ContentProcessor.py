@@ -3,6 +3,7 @@ import os
 from dspy import Signature, InputField, OutputField, LM, configure, Predict
 from pydantic import BaseModel
 from typing import List
+from app.services.LlmResponseCache import llm_response_cache
 
 class ActionItemsOutput(BaseModel):
     actions: List[str]
@@ -40,8 +41,16 @@ class ContentProcessor:
         except Exception as e:
             print(f"Failed to initialize dspy: {e}")
 
-    def extract_content(self, moment):
-        content = moment['transcript']
+    async def extract_content(self, moment, bypass_cache=False):
+        return await llm_response_cache.get_or_compute(
+            'openai/gpt-4o-mini',
+            'ActionItemsSignature+DocumentContent',
+            {'transcript': moment['transcript']},
+            lambda: self._extract_content(moment['transcript']),
+            bypass=bypass_cache
+        )
+
+    def _extract_content(self, content):
         extract_actions = Predict(ActionItemsSignature)
         actions_pred = extract_actions(content=content)
         generate_summary_prompt = dspy.ChainOfThought(DocumentContent)
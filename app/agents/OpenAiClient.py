@@ -1,17 +1,24 @@
-from openai import OpenAI
+from functools import partial
+import openai
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 from app.utils.token_counter import token_counter
+from app.agents.client_registry import client_registry
+from app.services.LlmResponseCache import llm_response_cache
 import os
 
 class OpenAiClient:
+    provider = 'openai'
+
     def __init__(self, db=None, uid=None):
         self.db = db
         self.uid = uid
         self.client = None
+        self.async_client = None
 
     async def initialize(self):
-        """Initialize the OpenAI client asynchronously"""
-        self.client = await self._get_client()
+        """Initialize the OpenAI clients asynchronously"""
+        self.client, self.async_client = await self._get_client()
 
     async def _get_user_api_key(self):
         user_doc = await self.db['users'].find_one({'_id': self.uid}, {'open_key': 1})
@@ -24,8 +31,15 @@ class OpenAiClient:
         return os.getenv('OPENAI_API_KEY')
 
     async def _get_client(self):
+        uses_user_key = self.db is not None and bool(self.uid)
+        return await client_registry.get_or_create(self.provider, self.uid if uses_user_key else None, self._create_clients)
+
+    async def _create_clients(self):
         api_key = await self._get_user_api_key() if self.db is not None and self.uid else self._load_api_key()
-        return OpenAI(api_key=api_key)
+        return (
+            OpenAI(api_key=api_key, http_client=client_registry.sync_http_client(openai)),
+            AsyncOpenAI(api_key=api_key, http_client=client_registry.async_http_client(openai))
+        )
 
     # Make all methods that use self.client async
     async def embed_content(self, content, model="text-embedding-3-small"):
@@ -48,10 +62,10 @@ class OpenAiClient:
             "stream": stream
         }
 
-        # Get response
-        response = self.client.chat.completions.create(**kwargs)
+        # Use the async SDK so neither the request nor the stream iteration blocks the event loop
+        response = await self.async_client.chat.completions.create(**kwargs)
 
-        # Handle streaming responses
+        # Streaming responses are consumed with `async for`
         if stream:
             return response
             
@@ -83,13 +97,22 @@ class OpenAiClient:
         )
         return response.data[0].url
     
-    async def summarize_content(self, content):
+    async def summarize_content(self, content, bypass_cache=False):
         if not self.client:
             await self.initialize()
         token_count = token_counter(content)
         if token_count > 10000:
             # Summarize each chunk individually
             return "Content is too long to summarize."
+        return await llm_response_cache.get_or_compute(
+            'gpt-4o-mini',
+            'summarize_content',
+            {'content': content},
+            partial(self._summarize_content, content),
+            bypass=bypass_cache
+        )
+
+    async def _summarize_content(self, content):
         response = await self.generate_chat_completion(
             model='gpt-4o-mini',
             messages=[
@@ -106,7 +129,7 @@ class OpenAiClient:
                 }
             ]
         )
-        return response
+        return response.content
     
     async def extract_structured_data(self, system_message, content, schema):
         if not self.client:
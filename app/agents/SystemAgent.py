@@ -3,6 +3,7 @@ from typing import List
 from dspy import Signature, InputField, OutputField, LM, configure, Predict
 
 from dotenv import load_dotenv
+from app.services.LlmResponseCache import llm_response_cache
 load_dotenv()
 
 class QueryClassifierSignature(Signature):
@@ -39,12 +40,30 @@ class SystemAgent:
         except Exception as e:
             print(f"Failed to initialize dspy: {e}")
 
-    def category_routing(self, user_query, category_list):
+    async def category_routing(self, user_query, category_list, bypass_cache=False):
+        return await llm_response_cache.get_or_compute(
+            'openai/gpt-4o-mini',
+            'SystemCategoryRoutingSignature',
+            {'user_query': user_query, 'users_file_categories': category_list},
+            lambda: self._category_routing(user_query, category_list),
+            bypass=bypass_cache
+        )
+
+    def _category_routing(self, user_query, category_list):
         category_routing = Predict(SystemCategoryRoutingSignature)
         result_pred = category_routing(user_query=user_query, users_file_categories=category_list)
         return result_pred.suggested_categories_list
 
-    def file_routing(self, user_query, file_list):
+    async def file_routing(self, user_query, file_list, bypass_cache=False):
+        return await llm_response_cache.get_or_compute(
+            'openai/gpt-4o-mini',
+            'SystemFileRoutingSignature',
+            {'user_query': user_query, 'users_file_paths': file_list},
+            lambda: self._file_routing(user_query, file_list),
+            bypass=bypass_cache
+        )
+
+    def _file_routing(self, user_query, file_list):
         file_routing = Predict(SystemFileRoutingSignature)
         result_pred = file_routing(user_query=user_query, users_file_paths=file_list)
         return result_pred.suggested_file_paths_list
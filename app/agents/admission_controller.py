@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PositionCallback = Callable[[int, float], Awaitable[None]]
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued; `retry_after` is a hint in seconds."""
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    """Parses 'openai/gpt-4o=4,anthropic=2' into {'openai/gpt-4o': 4, 'anthropic': 2}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in raw.split(','))):
+        key, _, value = item.partition('=')
+        try:
+            limits[key.strip()] = int(value)
+        except ValueError:
+            logger.warning('Ignoring invalid admission limit %r', item)
+    return limits
+
+@dataclass
+class AdmissionConfig:
+    default_concurrency: int = 8          # concurrent generations per provider/model
+    limits: Dict[str, int] = field(default_factory=dict)  # overrides keyed by 'provider/model' or 'provider'
+    max_queue_wait: float = 30.0          # shed when the estimated wait exceeds this (seconds)
+    max_loop_lag: float = 0.5             # shed when the event loop is this far behind (seconds)
+    lag_check_interval: float = 0.25
+    initial_hold_estimate: float = 10.0   # assumed generation time before any have finished
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionConfig':
+        return cls(
+            default_concurrency=int(os.getenv('ADMISSION_MAX_CONCURRENCY', '8')),
+            limits=_parse_limits(os.getenv('ADMISSION_LIMITS', '')),
+            max_queue_wait=float(os.getenv('ADMISSION_MAX_QUEUE_WAIT', '30')),
+            max_loop_lag=float(os.getenv('ADMISSION_MAX_LOOP_LAG', '0.5')),
+        )
+
+class _Waiter:
+    __slots__ = ('uid', 'start_tag', 'future', 'on_position', 'position')
+
+    def __init__(self, uid: str, start_tag: float, future: asyncio.Future, on_position: Optional[PositionCallback]):
+        self.uid = uid
+        self.start_tag = start_tag
+        self.future = future
+        self.on_position = on_position
+        self.position = 0
+
+class _ModelQueue:
+    """
+    Concurrency slots for one provider/model, handed out by weighted fair
+    queuing: each request gets a virtual finish tag of
+    max(virtual_time, uid's last tag) + 1 / weight, and the smallest tag is
+    admitted next. A uid that floods the queue only pushes its own tags out.
+    """
+    def __init__(self, capacity: int, hold_estimate: float):
+        self.capacity = capacity
+        self.active = 0
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.heap: List[Tuple[float, int, _Waiter]] = []
+        self.waiting = 0
+        self.avg_hold = hold_estimate
+
+    def estimated_wait(self, position: int) -> float:
+        return (position / self.capacity) * self.avg_hold
+
+    def record_hold(self, duration: float):
+        # Exponentially weighted so the estimate follows current provider latency
+        self.avg_hold = 0.8 * self.avg_hold + 0.2 * duration
+
+class AdmissionController:
+    """
+    Global admission control for LLM generations. `slot()` is an async
+    context manager that waits for a free slot for the provider/model,
+    reports queue positions through `on_position`, and raises
+    AdmissionRejected when the expected wait or event-loop lag is too high.
+    """
+    _instance: Optional['AdmissionController'] = None
+
+    def __init__(self, config: Optional[AdmissionConfig] = None):
+        self.config = config or AdmissionConfig()
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._sequence = itertools.count()
+        self._lag_task: Optional[asyncio.Task] = None
+        self.loop_lag = 0.0
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'cancelled': 0}
+
+    @classmethod
+    def get_instance(cls) -> 'AdmissionController':
+        if cls._instance is None:
+            cls._instance = cls(AdmissionConfig.from_env())
+        return cls._instance
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, uid: str, weight: float = 1.0, on_position: Optional[PositionCallback] = None):
+        key = f'{provider}/{model}'
+        queue = self._get_queue(key, provider)
+        await self._acquire(queue, uid or 'anonymous', weight, on_position)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            queue.record_hold(time.monotonic() - started)
+            await self._release(queue)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'loop_lag': self.loop_lag,
+            **self.stats,
+            'queues': {
+                key: {'active': queue.active, 'waiting': queue.waiting, 'capacity': queue.capacity, 'avg_hold': queue.avg_hold}
+                for key, queue in self._queues.items()
+            }
+        }
+
+    def _get_queue(self, key: str, provider: str) -> _ModelQueue:
+        queue = self._queues.get(key)
+        if queue is None:
+            capacity = self.config.limits.get(key, self.config.limits.get(provider, self.config.default_concurrency))
+            queue = _ModelQueue(max(1, capacity), self.config.initial_hold_estimate)
+            self._queues[key] = queue
+        return queue
+
+    async def _acquire(self, queue: _ModelQueue, uid: str, weight: float, on_position: Optional[PositionCallback]):
+        self._ensure_lag_monitor()
+        if self.loop_lag > self.config.max_loop_lag:
+            self.stats['rejected'] += 1
+            raise AdmissionRejected('Server is overloaded', retry_after=max(1.0, self.loop_lag * 4))
+
+        start_tag = max(queue.virtual_time, queue.last_finish.get(uid, 0.0))
+        finish_tag = start_tag + 1.0 / max(weight, 0.01)
+
+        if queue.active < queue.capacity and queue.waiting == 0:
+            queue.active += 1
+            queue.virtual_time = start_tag
+            queue.last_finish[uid] = finish_tag
+            self.stats['admitted'] += 1
+            return
+
+        position = queue.waiting + 1
+        estimated_wait = queue.estimated_wait(position)
+        if estimated_wait > self.config.max_queue_wait:
+            self.stats['rejected'] += 1
+            raise AdmissionRejected('Too many requests queued', retry_after=estimated_wait)
+
+        waiter = _Waiter(uid, start_tag, asyncio.get_running_loop().create_future(), on_position)
+        queue.last_finish[uid] = finish_tag
+        heapq.heappush(queue.heap, (finish_tag, next(self._sequence), waiter))
+        queue.waiting += 1
+        self.stats['queued'] += 1
+        await self._notify_positions(queue)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted just as we were cancelled: hand it on
+                await self._release(queue)
+            else:
+                waiter.future.cancel()
+                queue.waiting -= 1
+            self.stats['cancelled'] += 1
+            raise
+        self.stats['admitted'] += 1
+
+    async def _release(self, queue: _ModelQueue):
+        queue.active -= 1
+        while queue.heap and queue.active < queue.capacity:
+            _, _, waiter = heapq.heappop(queue.heap)
+            if waiter.future.done():
+                continue  # cancelled while queued
+            queue.waiting -= 1
+            queue.active += 1
+            queue.virtual_time = max(queue.virtual_time, waiter.start_tag)
+            waiter.future.set_result(None)
+        if not queue.heap:
+            # Idle queue: forget per-uid tags so they can't grow without bound
+            queue.last_finish.clear()
+        await self._notify_positions(queue)
+
+    async def _notify_positions(self, queue: _ModelQueue):
+        live = sorted((entry for entry in queue.heap if not entry[2].future.done()), key=lambda entry: entry[:2])
+        for position, (_, _, waiter) in enumerate(live, start=1):
+            if waiter.on_position is None or waiter.position == position:
+                continue
+            waiter.position = position
+            try:
+                await waiter.on_position(position, queue.estimated_wait(position))
+            except Exception as e:
+                logger.debug('Queue position callback failed: %s', str(e))
+
+    def _ensure_lag_monitor(self):
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.get_running_loop().create_task(self._monitor_loop_lag())
+
+    async def _monitor_loop_lag(self):
+        interval = self.config.lag_check_interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, time.monotonic() - expected)
+
+admission_controller = AdmissionController.get_instance()
@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
+import inspect
+import logging
 from app.utils.token_counter import token_counter
 
+logger = logging.getLogger(__name__)
+
 
 class ChatHistoryManager(ABC):
     @abstractmethod
@@ -13,10 +17,26 @@ class ChatHistoryManager(ABC):
         """
         pass
 
+    async def prepare(self, chat_id: str) -> None:
+        """
+        Load any persisted state needed by process_history. Runs before the
+        history is processed; the default strategy needs nothing.
+        """
+        pass
+
+    async def after_response(self, chat_id: str, chat_history: List[Dict]) -> None:
+        """
+        Runs off the critical path once the reply has been streamed.
+        Strategies can use it for maintenance such as updating summaries.
+        """
+        pass
+
 class DefaultChatHistoryManager(ChatHistoryManager):
     """
     This is the default strategy which simply formats the messages.
-    It enforces a token limit and handles images if present.
+    It keeps the newest messages that fit in the token limit and handles images if present.
+    Messages persisted by ChatService carry a stored `token_count`, so only
+    messages without one (normally just the new user message) are tokenized.
     """
     def __init__(self, token_limit: int = 20000):
         self.token_limit = token_limit
@@ -27,35 +47,48 @@ class DefaultChatHistoryManager(ChatHistoryManager):
         formatted_messages = []
         token_count = 0
 
-        for message in chat_history:
-            if token_count > self.token_limit:
+        # Walk newest-first so the latest turn is always kept and the stale start is dropped
+        for message in reversed(chat_history):
+            role, content = self._format_message(message)
+            message_tokens = self._get_message_token_count(message, content)
+
+            if formatted_messages and token_count + message_tokens > self.token_limit:
                 break
 
-            content = message['content']
-            role = 'user' if message.get('message_from') == 'user' else 'assistant'
-
-            if role == 'user' and 'images' in message:
-                content = self._format_message_with_images(message)
-            elif role == 'assistant':
-                content = message['content'][0]['content']
-
-            # Fix the problematic condition to properly handle different content types
-            if isinstance(content, str):
-                token_count += self.token_counter(content)
-            elif isinstance(content, list) and content and isinstance(content[0], dict) and 'content' in content[0]:
-                token_count += self.token_counter(content[0]['content'])
-            elif isinstance(content, list) and content:
-                # Fallback for other list structures
-                token_count += self.token_counter(str(content))
-            else:
-                # Safe fallback for any other content type
-                token_count += self.token_counter(str(content))
-                
-            formatted_message = {"role": role, "content": content}
-            formatted_messages.append(formatted_message)
-            
+            token_count += message_tokens
+            formatted_messages.append({"role": role, "content": content})
+
+        formatted_messages.reverse()
         return formatted_messages
 
+    def _format_message(self, message: Dict):
+        content = message['content']
+        role = 'user' if message.get('message_from') == 'user' else 'assistant'
+
+        if role == 'user' and 'images' in message:
+            content = self._format_message_with_images(message)
+        elif role == 'assistant':
+            content = message['content'][0]['content']
+
+        return role, content
+
+    def _get_message_token_count(self, message: Dict, content: Any) -> int:
+        stored_count = message.get('token_count')
+        if isinstance(stored_count, int):
+            return stored_count
+
+        if isinstance(content, str):
+            text = content
+        elif isinstance(content, list) and content and isinstance(content[0], dict):
+            # Text parts of an image message or chunks of an agent message
+            text = ''.join(part.get('text') or part.get('content') or '' for part in content)
+        else:
+            text = str(content)
+
+        # Cache on the message so repeated passes over the same history don't re-tokenize
+        message['token_count'] = self.token_counter(text)
+        return message['token_count']
+
     def get_system_and_last_user_message(self, chat_history: List[Dict]) -> List[Dict]:
         """
         Returns a list containing only the system message (if present) and the last user message.
@@ -80,19 +113,86 @@ class DefaultChatHistoryManager(ChatHistoryManager):
 class SummarizingChatHistoryManager(ChatHistoryManager):
     """
     This strategy first uses a base manager for initial formatting.
-    If the history grows too long, it uses a provided 'summarizer' 
-    to collapse old messages into a summary.
+    Older messages are folded into a rolling summary stored on the chat
+    document together with a high-water mark (the number of messages already
+    folded). Each turn starts from the cached summary plus the messages after
+    the mark; only messages that have aged out since the last summary are
+    sent to the summarizer, and that happens in after_response.
     """
-    def __init__(self, summarizer, base_manager: ChatHistoryManager):
+    def __init__(
+        self,
+        summarizer,
+        base_manager: ChatHistoryManager,
+        summary_store=None,
+        keep_recent: int = 5,
+        summarize_after: int = 10
+    ):
         self.summarizer = summarizer
         self.base_manager = base_manager
+        self.summary_store = summary_store
+        self.keep_recent = keep_recent
+        self.summarize_after = summarize_after
+        self.summary: Optional[str] = None
+        self.high_water = 0
 
+    async def prepare(self, chat_id: str) -> None:
+        if self.summary_store is None:
+            return
+        state = await self.summary_store.get_summary_state(chat_id)
+        self.summary = state.get('summary')
+        self.high_water = state.get('summary_high_water', 0)
 
     def process_history(self, chat_history: List[Dict]) -> List[Dict]:
-        processed_history = self.base_manager.process_history(chat_history)
-        if len(processed_history) > 10:
-            summary = self.summarizer(processed_history[:-5])
+        # A cleared chat can leave a mark past the end of the history
+        if self.high_water > len(chat_history):
+            self.summary, self.high_water = None, 0
+
+        processed_history = self.base_manager.process_history(chat_history[self.high_water:])
+        if self.summary:
             processed_history = [
-                {"role": "assistant", "content": summary}
-            ] + processed_history[-5:]
-        return processed_history
\ No newline at end of file
+                {"role": "assistant", "content": self.summary}
+            ] + processed_history
+        return processed_history
+
+    async def after_response(self, chat_id: str, chat_history: List[Dict]) -> None:
+        unsummarized = len(chat_history) - self.high_water
+        if unsummarized <= self.summarize_after:
+            return
+
+        new_high_water = len(chat_history) - self.keep_recent
+        aged_out = self.base_manager.process_history(chat_history[self.high_water:new_high_water])
+        try:
+            summary = self.summarizer(aged_out, self.summary)
+            if inspect.isawaitable(summary):
+                summary = await summary
+        except Exception as e:
+            logger.error('Error updating rolling summary for chat %s: %s', chat_id, str(e))
+            return
+
+        if self.summary_store is not None:
+            await self.summary_store.update_summary(chat_id, summary, new_high_water, self.high_water)
+        self.summary, self.high_water = summary, new_high_water
+
+def create_llm_summarizer(ai_client, model: str = 'gpt-4o-mini'):
+    """Returns an async summarizer that folds new messages into the previous summary"""
+    async def summarize(messages: List[Dict], previous_summary: Optional[str] = None) -> str:
+        transcript = '\n'.join(
+            f"{message['role']}: {message['content'] if isinstance(message['content'], str) else message['content'][0].get('text', '')}"
+            for message in messages
+        )
+        previous = f"Existing summary:\n{previous_summary}\n\n" if previous_summary else ''
+        response = await ai_client.generate_chat_completion(
+            model=model,
+            messages=[
+                {
+                    'role': 'system',
+                    'content': 'You maintain a running summary of a conversation. Keep every fact, decision and open question needed to continue it.'
+                },
+                {
+                    'role': 'user',
+                    'content': f"{previous}Fold these newer messages into the summary:\n{transcript}"
+                }
+            ]
+        )
+        return response.content
+    return summarize
@@ -0,0 +1,123 @@
+import asyncio
+import importlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ClientRegistry:
+    """
+    Process-wide cache of SDK clients keyed by (provider, uid).
+
+    Building a client costs a `users` lookup for the API key plus a fresh
+    HTTP connection pool. Cached entries skip both; every SDK client is built
+    on its SDK's shared httpx clients, so keep-alive connections are reused
+    across users. Entries expire after `ttl` seconds and the least recently
+    used entry is evicted beyond `max_entries`. Call `invalidate` whenever a
+    user's API key changes.
+    """
+    _instance: Optional['ClientRegistry'] = None
+
+    def __init__(self, ttl: float = 900, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]' = OrderedDict()
+        self._locks: Dict[Tuple[str, Hashable], asyncio.Lock] = {}
+        # (sdk module name, sync) -> that SDK's shared httpx client
+        self._http_clients: Dict[Tuple[str, bool], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get_instance(cls) -> 'ClientRegistry':
+        if cls._instance is None:
+            cls._instance = cls(
+                ttl=float(os.getenv('CLIENT_REGISTRY_TTL', '900')),
+                max_entries=int(os.getenv('CLIENT_REGISTRY_MAX_ENTRIES', '256'))
+            )
+        return cls._instance
+
+    def async_http_client(self, sdk) -> Any:
+        """
+        Shared async connection pool for `sdk` (the `openai` or `anthropic`
+        module). Each SDK gets its own pool, built with the SDK's own httpx
+        client class, since SDKs may reject clients from a different httpx.
+        """
+        return self._http_client(sdk, sync=False)
+
+    def sync_http_client(self, sdk) -> Any:
+        """Shared sync connection pool for `sdk`; see `async_http_client`."""
+        return self._http_client(sdk, sync=True)
+
+    def _http_client(self, sdk, sync: bool) -> Any:
+        key = (sdk.__name__, sync)
+        http_client = self._http_clients.get(key)
+        if http_client is None:
+            client_class = sdk.DefaultHttpxClient if sync else sdk.DefaultAsyncHttpxClient
+            # Timeout and limits must come from the httpx package the SDK itself uses
+            sdk_httpx = importlib.import_module(sdk.Timeout.__module__.split('.')[0])
+            http_client = client_class(
+                timeout=sdk_httpx.Timeout(600, connect=10),
+                limits=sdk_httpx.Limits(max_connections=50, max_keepalive_connections=20) if sync
+                else sdk_httpx.Limits(max_connections=200, max_keepalive_connections=50),
+            )
+            self._http_clients[key] = http_client
+        return http_client
+
+    async def get_or_create(self, provider: str, uid: Optional[str], factory: Callable[[], Awaitable[Any]]) -> Any:
+        key = (provider, uid)
+        clients = self._get_fresh(key)
+        if clients is not None:
+            self.hits += 1
+            return clients
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another coroutine may have built the clients while we waited
+            clients = self._get_fresh(key)
+            if clients is not None:
+                self.hits += 1
+                return clients
+
+            self.misses += 1
+            clients = await factory()
+            self._entries[key] = (time.monotonic() + self.ttl, clients)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._locks.pop(evicted_key, None)
+            return clients
+
+    def invalidate(self, uid: Optional[str] = None, provider: Optional[str] = None):
+        """Drops cached clients for a uid and/or provider; no arguments clears everything."""
+        for key in list(self._entries):
+            entry_provider, entry_uid = key
+            if (uid is None or entry_uid == uid) and (provider is None or entry_provider == provider):
+                del self._entries[key]
+        logger.debug('Invalidated cached clients for uid=%s provider=%s', uid, provider)
+
+    def _get_fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, clients = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return clients
+
+    async def close(self):
+        self._entries.clear()
+        http_clients = list(self._http_clients.items())
+        self._http_clients.clear()
+        for (_, sync), http_client in http_clients:
+            if sync:
+                http_client.close()
+            else:
+                await http_client.aclose()
+
+client_registry = ClientRegistry.get_instance()
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class Generation:
+    __slots__ = ('task', 'uid', 'stop_requested')
+
+    def __init__(self, task: asyncio.Task, uid: Optional[str]):
+        self.task = task
+        self.uid = uid
+        self.stop_requested = False
+
+_current_generation: ContextVar[Optional[Generation]] = ContextVar('current_generation', default=None)
+
+def current_generation() -> Optional[Generation]:
+    """The generation tracked for the running task, if any."""
+    return _current_generation.get()
+
+def stop_requested() -> bool:
+    generation = _current_generation.get()
+    return generation is not None and generation.stop_requested
+
+class GenerationRegistry:
+    """
+    Tracks the task generating a reply for each chat so it can be stopped.
+    `stop` cancels the task; code that handles the CancelledError checks
+    `stop_requested()` to tell a user stop apart from a shutdown, keeps the
+    partial reply and calls `task.uncancel()`. A stop that lands before the
+    stream started is absorbed by `track` itself.
+    """
+    def __init__(self):
+        self._active: Dict[str, Generation] = {}
+
+    @contextmanager
+    def track(self, key: str, uid: Optional[str] = None):
+        generation = Generation(asyncio.current_task(), uid)
+        previous = self._active.get(key)
+        if previous is not None and not previous.task.done():
+            logger.debug('Generation for %s replaced while still running', key)
+        self._active[key] = generation
+        token = _current_generation.set(generation)
+        try:
+            yield generation
+        except asyncio.CancelledError:
+            if not generation.stop_requested:
+                raise
+            generation.task.uncancel()
+            logger.debug('Generation for %s stopped before streaming', key)
+        finally:
+            _current_generation.reset(token)
+            if self._active.get(key) is generation:
+                del self._active[key]
+
+    def stop(self, key: str, uid: Optional[str] = None) -> bool:
+        """Cancels the running generation for `key`; only its owner may stop it."""
+        generation = self._active.get(key)
+        if generation is None or generation.task.done():
+            return False
+        if generation.uid and uid != generation.uid:
+            logger.warning('Refusing to stop generation for %s: uid mismatch', key)
+            return False
+        generation.stop_requested = True
+        generation.task.cancel()
+        return True
+
+    def is_running(self, key: str) -> bool:
+        generation = self._active.get(key)
+        return generation is not None and not generation.task.done()
+
+generation_registry = GenerationRegistry()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CoalescingConfig:
+    base_window: float = 0.03       # seconds a delta may wait before being flushed
+    max_window: float = 0.25        # upper bound when the transport is falling behind
+    max_chars: int = 512            # flush as soon as this many characters are buffered
+    slow_emit_threshold: float = 0.02  # an emit slower than this means the client is lagging
+
+@dataclass
+class EmitterStats:
+    deltas: int = 0
+    frames: int = 0
+    flush_latency_total: float = 0.0
+    flush_latency_max: float = 0.0
+    window: float = 0.0
+
+    @property
+    def avg_flush_latency(self) -> float:
+        return self.flush_latency_total / self.frames if self.frames else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'deltas': self.deltas,
+            'frames': self.frames,
+            'avg_flush_latency': self.avg_flush_latency,
+            'max_flush_latency': self.flush_latency_max,
+            'window': self.window,
+        }
+
+@dataclass
+class _GlobalEmitterStats:
+    responses: int = 0
+    deltas: int = 0
+    frames: int = 0
+    flush_latency_total: float = 0.0
+    frames_per_response: List[int] = field(default_factory=list)
+
+    def record(self, stats: EmitterStats):
+        self.responses += 1
+        self.deltas += stats.deltas
+        self.frames += stats.frames
+        self.flush_latency_total += stats.flush_latency_total
+        # Keep a bounded sample for the frames-per-response distribution
+        self.frames_per_response.append(stats.frames)
+        if len(self.frames_per_response) > 1000:
+            del self.frames_per_response[:500]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'responses': self.responses,
+            'deltas': self.deltas,
+            'frames': self.frames,
+            'avg_frames_per_response': self.frames / self.responses if self.responses else 0.0,
+            'avg_flush_latency': self.flush_latency_total / self.frames if self.frames else 0.0,
+        }
+
+global_emitter_stats = _GlobalEmitterStats()
+
+class CoalescingEmitter:
+    """
+    Buffers stream deltas for a single chat and emits them as larger frames.
+    A frame is flushed when the time window elapses, the buffer reaches
+    `max_chars`, or the chunk type/language changes. Every frame keeps the
+    same shape as a single delta, so the frontend sees fewer, bigger chunks.
+    """
+    def __init__(self, sio, event_name: str, room: str, config: Optional[CoalescingConfig] = None, emit_kwargs: Optional[Dict] = None):
+        self.sio = sio
+        self.event_name = event_name
+        self.room = room
+        self.config = config or CoalescingConfig()
+        self.emit_kwargs = emit_kwargs or {}
+        self.stats = EmitterStats(window=self.config.base_window)
+
+        self._parts: List[str] = []
+        self._size = 0
+        self._key = None
+        self._first_delta_at = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._emit_lock = asyncio.Lock()
+        self._pending_flushes = set()
+
+    async def add(self, content: str, message_type: str, language: Optional[str] = None):
+        if not content:
+            return
+        key = (message_type, language)
+        if self._parts and key != self._key:
+            await self.flush()
+
+        self._key = key
+        self._parts.append(content)
+        self._size += len(content)
+        self.stats.deltas += 1
+
+        if self._first_delta_at is None:
+            self._first_delta_at = time.perf_counter()
+            self._schedule_timer()
+
+        if self._size >= self.config.max_chars:
+            await self.flush()
+
+    async def flush(self):
+        self._cancel_timer()
+        if not self._parts:
+            return
+
+        message_type, language = self._key
+        formatted_message = {
+            'type': message_type,
+            'content': ''.join(self._parts),
+            'room': self.room,
+        }
+        if language is not None:
+            formatted_message['language'] = language
+
+        first_delta_at = self._first_delta_at
+        self._parts = []
+        self._size = 0
+        self._first_delta_at = None
+
+        # The lock keeps frames in order when a timer flush overlaps an inline flush
+        async with self._emit_lock:
+            emit_started = time.perf_counter()
+            await self.sio.emit(self.event_name, formatted_message, **self.emit_kwargs)
+            emit_finished = time.perf_counter()
+
+        self._record_flush(emit_finished - first_delta_at, emit_finished - emit_started)
+
+    async def close(self) -> EmitterStats:
+        await self.flush()
+        if self._pending_flushes:
+            await asyncio.gather(*self._pending_flushes, return_exceptions=True)
+        global_emitter_stats.record(self.stats)
+        logger.debug('Stream emitter stats for %s: %s', self.room, self.stats.as_dict())
+        return self.stats
+
+    def _record_flush(self, latency: float, emit_duration: float):
+        self.stats.frames += 1
+        self.stats.flush_latency_total += latency
+        self.stats.flush_latency_max = max(self.stats.flush_latency_max, latency)
+        self._adapt_window(emit_duration)
+
+    def _adapt_window(self, emit_duration: float):
+        """Widen the window while emits are slow (transport backpressure), shrink it back otherwise."""
+        if emit_duration > self.config.slow_emit_threshold:
+            self.stats.window = min(self.stats.window * 2, self.config.max_window)
+        else:
+            self.stats.window = max(self.stats.window * 0.75, self.config.base_window)
+
+    def _schedule_timer(self):
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(self.stats.window, self._on_timer)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._pending_flushes.add(task)
+        task.add_done_callback(self._pending_flushes.discard)
@@ -1,110 +1,244 @@
+import asyncio
 from enum import Enum
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any, AsyncIterator
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 import logging
+import time
+from app.agents.handlers.stream_emitter import CoalescingConfig, CoalescingEmitter, EmitterStats
+from app.utils.metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND
+from app.utils.tracing import span
+
+FENCE = '```'
 
 class MessageType(Enum):
     TEXT = "text"
     CODE = "code"
     END_OF_STREAM = "end_of_stream"
 
-@dataclass
-class StreamState:
-    inside_code_block: bool = False
-    language: Optional[str] = None
-    ignore_next_token: bool = False
-    buffer: str = ""
+class Segment:
+    """A run of same-typed content inside the accumulator buffer."""
+    __slots__ = ('type', 'language', 'start', 'end')
+
+    def __init__(self, type: str, language: Optional[str], start: int, end: int):
+        self.type = type
+        self.language = language
+        self.start = start
+        self.end = end
+
+class ResponseAccumulator:
+    """
+    Compact storage for a streamed response: one growing buffer plus
+    (type, language, start, end) segments. Adjacent content of the same
+    type and language extends the last segment instead of adding a chunk.
+    """
+    __slots__ = ('room', 'parts', 'length', 'segments')
+
+    def __init__(self, room: str):
+        self.room = room
+        self.parts: List[str] = []
+        self.length = 0
+        self.segments: List[Segment] = []
+
+    def append(self, content: str, message_type: str, language: Optional[str] = None):
+        if not content:
+            return
+        start = self.length
+        self.parts.append(content)
+        self.length += len(content)
+
+        last = self.segments[-1] if self.segments else None
+        if last is not None and last.type == message_type and last.language == language:
+            last.end = self.length
+        else:
+            self.segments.append(Segment(message_type, language, start, self.length))
+
+    def __len__(self):
+        return len(self.segments)
+
+    def to_chunks(self) -> List[Dict]:
+        buffer = ''.join(self.parts)
+        # Keep the joined buffer so repeated calls stay linear
+        self.parts = [buffer] if buffer else []
+        chunks = []
+        for segment in self.segments:
+            chunk = {
+                'type': segment.type,
+                'content': buffer[segment.start:segment.end],
+                'room': self.room
+            }
+            if segment.language is not None:
+                chunk['language'] = segment.language
+            chunks.append(chunk)
+        return chunks
+
+class FenceParser:
+    """
+    Splits streamed text into text/code pieces. Fences are found in the
+    text itself rather than by matching whole tokens, so backticks split
+    across deltas (e.g. '``' + '`python') are still detected.
+    """
+    __slots__ = ('inside_code_block', 'language', 'awaiting_language', 'language_buffer', 'pending')
+
+    def __init__(self):
+        self.inside_code_block = False
+        self.language: Optional[str] = None
+        self.awaiting_language = False
+        self.language_buffer = ''
+        self.pending = ''
+
+    def feed(self, text: str) -> List[Tuple[str, str, Optional[str]]]:
+        text = self.pending + text
+        self.pending = ''
+        pieces = []
+        position = 0
+        length = len(text)
+
+        while position < length:
+            if self.awaiting_language:
+                newline = text.find('\n', position)
+                if newline == -1:
+                    self.language_buffer += text[position:]
+                    break
+                self.language_buffer += text[position:newline]
+                self.language = self.language_buffer.strip() or None
+                self.language_buffer = ''
+                self.awaiting_language = False
+                position = newline + 1
+                continue
+
+            fence = text.find(FENCE, position)
+            if fence == -1:
+                # Hold back trailing backticks that may be the start of a split fence
+                end = length
+                while end > position and length - end < len(FENCE) - 1 and text[end - 1] == '`':
+                    end -= 1
+                self._add_piece(pieces, text[position:end])
+                self.pending = text[end:]
+                break
+
+            self._add_piece(pieces, text[position:fence])
+            position = fence + len(FENCE)
+            self.inside_code_block = not self.inside_code_block
+            if self.inside_code_block:
+                self.awaiting_language = True
+            else:
+                self.language = None
+
+        return pieces
+
+    def finish(self) -> List[Tuple[str, str, Optional[str]]]:
+        pieces = []
+        if self.awaiting_language and self.language_buffer:
+            # A fence without a newline after it: treat what followed as code
+            self.awaiting_language = False
+            self._add_piece(pieces, self.language_buffer)
+            self.language_buffer = ''
+        self._add_piece(pieces, self.pending)
+        self.pending = ''
+        return pieces
+
+    def _add_piece(self, pieces: List, content: str):
+        if not content:
+            return
+        if self.inside_code_block:
+            pieces.append((MessageType.CODE.value, content, self.language or 'markdown'))
+        else:
+            pieces.append((MessageType.TEXT.value, content, None))
 
 class StreamHandler:
-    def __init__(self, sio, event_name):
+    def __init__(self, sio, event_name, coalescing_config: Optional[CoalescingConfig] = None, model: Optional[str] = None):
         self.sio = sio
         self.event_name = event_name
+        self.coalescing_config = coalescing_config
+        self.model = model or 'unknown'
+        self.last_stream_stats: Optional[EmitterStats] = None
+
+    async def process_stream(self, chat_id: str, response: AsyncIterator, room: Optional[str] = None, accumulator: Optional[ResponseAccumulator] = None, started_at: Optional[float] = None) -> ResponseAccumulator:
+        """
+        Streams `response` to the room and collects it into `accumulator`.
+        Passing in the accumulator lets a caller keep the partial reply if the
+        stream is cancelled; the upstream provider stream is closed either way.
+        `started_at` (a perf_counter value) marks when the request was sent,
+        for time-to-first-token; it defaults to now.
+        """
+        if accumulator is None:
+            accumulator = ResponseAccumulator(chat_id)
+        started_at = started_at if started_at is not None else time.perf_counter()
+        first_token_at = None
+        deltas = 0
+        parser = FenceParser()
+        emitter = CoalescingEmitter(self.sio, self.event_name, chat_id, self.coalescing_config, {'room': room})
+
+        with span('StreamHandler.process_stream', model=self.model, event=self.event_name) as stream_span:
+            try:
+                async for chunk in response:
+                    text = self._extract_text(chunk)
+                    if text:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            LLM_TIME_TO_FIRST_TOKEN.observe(first_token_at - started_at, model=self.model)
+                        deltas += 1
+                        await self._handle_pieces(parser.feed(text), accumulator, emitter)
+                await self._handle_pieces(parser.finish(), accumulator, emitter)
+                self._record_throughput(first_token_at, deltas)
+            except asyncio.CancelledError:
+                # Keep text the parser was holding back so the saved reply is complete
+                for message_type, content, language in parser.finish():
+                    accumulator.append(content, message_type, language)
+                await self._close_stream(response)
+                raise
+            finally:
+                self.last_stream_stats = await emitter.close()
+                stream_span.set_attribute('deltas', deltas)
+                stream_span.set_attribute('frames', self.last_stream_stats.frames)
+                if first_token_at is not None:
+                    stream_span.set_attribute('ttft_ms', round((first_token_at - started_at) * 1000, 1))
+
+        return accumulator
 
-    async def process_stream(self, chat_id: str, response: AsyncIterator) -> List[Dict]:
-        response_chunks = []
-        stream_state = StreamState()
-        
-        for chunk in response:
-            await self._handle_chunk(chunk, chat_id, response_chunks, stream_state)
+    def _record_throughput(self, first_token_at: Optional[float], deltas: int):
+        # Providers send roughly one token per delta, so deltas/sec approximates tokens/sec
+        if first_token_at is None or deltas < 2:
+            return
+        elapsed = time.perf_counter() - first_token_at
+        if elapsed > 0:
+            LLM_TOKENS_PER_SECOND.observe(deltas / elapsed, model=self.model)
 
-        return response_chunks
+    async def _close_stream(self, response: Any):
+        """Closes the provider stream so the upstream request stops generating."""
+        close = getattr(response, 'close', None)
+        if close is None:
+            return
+        try:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logging.warning('Failed to close upstream stream: %s', str(e))
 
-    async def _handle_chunk(self, chunk: Any, chat_id: str, response_chunks: List, stream_state: StreamState):
+    def _extract_text(self, chunk: Any) -> Optional[str]:
         if hasattr(chunk, 'type'):
-            await self._handle_anthropic_chunk(chunk, chat_id, response_chunks, stream_state)
-        else:
-            await self._handle_openai_chunk(chunk, chat_id, response_chunks, stream_state)
+            return self._extract_anthropic_text(chunk)
+        return self._extract_openai_text(chunk)
 
-    async def _handle_anthropic_chunk(self, chunk: Any, chat_id: str, response_chunks: List, stream_state: StreamState):
+    def _extract_anthropic_text(self, chunk: Any) -> Optional[str]:
         if chunk.type == 'message_start':
             logging.debug('Stream message start')
         elif chunk.type == 'message_stop':
             logging.debug('Stream message end')
         elif chunk.type == 'content_block_delta':
             if chunk.delta.type == 'text_delta':
-                await self._process_response_chunk(chat_id, chunk.delta.text, response_chunks, stream_state)
-        elif chunk.type == 'message_delta':
-            pass  # Handle message delta if needed
-
-    async def _handle_openai_chunk(self, chunk: Any, chat_id: str, response_chunks: List, stream_state: StreamState):
-        # Handle content if present
-        response_chunk = chunk.choices[0].delta.content
-        if response_chunk is not None:
-            await self._process_response_chunk(chat_id, response_chunk, response_chunks, stream_state)
-
-    async def _process_response_chunk(self, chat_id: str, response_chunk: str, response_chunks: List, stream_state: StreamState):
-        if stream_state.ignore_next_token:
-            stream_state.ignore_next_token = False
-            return
+                return chunk.delta.text
+        return None
 
-        if response_chunk == '```':
-            stream_state.inside_code_block = not stream_state.inside_code_block
-            if stream_state.inside_code_block:
-                stream_state.buffer = ''
-            else:
-                stream_state.language = None
-            return
+    def _extract_openai_text(self, chunk: Any) -> Optional[str]:
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
 
-        if stream_state.inside_code_block and not stream_state.language:
-            stream_state.buffer += response_chunk
-            if '\n' in stream_state.buffer:
-                language, code = stream_state.buffer.split('\n', 1)
-                stream_state.language = language.strip()
-                if code:
-                    await self._handle_chunk_content(chat_id, code, response_chunks, stream_state)
-                stream_state.buffer = ''
-            return
+    async def _handle_pieces(self, pieces: List[Tuple[str, str, Optional[str]]], accumulator: ResponseAccumulator, emitter: CoalescingEmitter):
+        for message_type, content, language in pieces:
+            accumulator.append(content, message_type, language)
+            await emitter.add(content, message_type, language)
 
-        if response_chunk == '``':
-            stream_state.inside_code_block = False
-            stream_state.language = None
-            stream_state.ignore_next_token = True
-        else:
-            await self._handle_chunk_content(chat_id, response_chunk, response_chunks, stream_state)
-
-    async def _handle_chunk_content(self, chat_id: str, response_chunk: str, response_chunks: List, stream_state: StreamState):
-        formatted_message = {
-            'type': MessageType.CODE.value if stream_state.inside_code_block else MessageType.TEXT.value,
-            'content': response_chunk,
-            'room': chat_id
-        }
-        
-        if stream_state.inside_code_block:
-            formatted_message['language'] = stream_state.language or 'markdown'
-            
-        response_chunks.append(formatted_message)
-        logging.debug('Formatted message: %s', formatted_message)
-        await self.sio.emit(self.event_name, formatted_message)
-
-    def collapse_response_chunks(self, response_chunks: List[Dict]) -> List[Dict]:
-        collapsed_response = []
-        if response_chunks:
-            current_message = response_chunks[0].copy()
-            for chunk in response_chunks[1:]:
-                if chunk['type'] == current_message['type']:
-                    current_message['content'] += chunk['content']
-                else:
-                    collapsed_response.append(current_message)
-                    current_message = chunk.copy()
-            collapsed_response.append(current_message)
-        return collapsed_response
+    def collapse_response_chunks(self, accumulator: ResponseAccumulator) -> List[Dict]:
+        return accumulator.to_chunks()
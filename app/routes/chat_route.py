@@ -1,9 +1,7 @@
-import json
-from fastapi import APIRouter, Depends, Header, HTTPException
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from pydantic import BaseModel
-from app.utils.custom_json_encoder import CustomJSONEncoder
+from app.utils.mongo_json_response import MongoJSONResponse
 from app.services.ChatService import ChatService
 from fastapi import Request
 
@@ -33,35 +31,59 @@ def create_chat_router(prefix: str = "", chat_type: str = "default"):
             raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
 
     @router.get("")  # /chat or /system/chat
-    async def get_all_chats(chat_service=Depends(get_specific_chat_service)):
+    async def get_all_chats(
+        view: str = "full",
+        cursor: Optional[str] = None,
+        limit: int = Query(30, ge=1, le=100),
+        chat_service=Depends(get_specific_chat_service)
+    ):
         chat_service, uid = chat_service
+        if view == "summary":
+            # Sidebar listing: projected fields only, keyset-paginated on updated_at
+            summaries = await chat_service.get_chat_summaries(uid, before=cursor, limit=limit)
+            return MongoJSONResponse(content=summaries)
+
         chats = await chat_service.get_all_chats(uid)
-        json_chats = jsonable_encoder(chats)
-        json_str = json.dumps(json_chats, cls=CustomJSONEncoder)
-        return JSONResponse(content=json.loads(json_str))
+        return MongoJSONResponse(content=chats)
+
+    @router.get("/{chat_id}")  # /chat/{chat_id} or /system/chat/{chat_id}
+    async def get_chat(chat_id: str, chat_service=Depends(get_specific_chat_service)):
+        chat_service, uid = chat_service
+        chat = await chat_service.get_chat_state(uid, chat_id)
+        if not chat:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        return MongoJSONResponse(content=chat)
+
+    @router.get("/{chat_id}/messages")  # /chat/{chat_id}/messages or /system/chat/{chat_id}/messages
+    async def get_messages(chat_id: str, before: Optional[str] = None, limit: int = Query(50, ge=1, le=200), chat_service=Depends(get_specific_chat_service)):
+        chat_service, uid = chat_service
+        if not await chat_service.get_single_chat(uid, chat_id):
+            raise HTTPException(status_code=404, detail="Chat not found")
+        page = await chat_service.get_messages(chat_id, before=before, limit=limit)
+        return MongoJSONResponse(content=page)
 
     @router.post("")  # /chat or /system/chat
     async def create_chat(data: ChatData, chat_service=Depends(get_specific_chat_service)):
         chat_service, _ = chat_service
         chat_data = await chat_service.create_chat_in_db(data.uid)
-        return JSONResponse(content=chat_data)
+        return MongoJSONResponse(content=chat_data)
 
     @router.delete("")  # /chat or /system/chat
     async def delete_chat(data: DeleteChatData, chat_service=Depends(get_specific_chat_service)):
         chat_service, _ = chat_service
         await chat_service.delete_chat(data.chatId)
-        return JSONResponse(content={'message': 'Conversation deleted'})
+        return MongoJSONResponse(content={'message': 'Conversation deleted'})
 
     @router.patch("/update_settings")  # /chat/update_settings or /system/chat/update_settings
     async def update_settings(data: UpdateSettingsData, chat_service=Depends(get_specific_chat_service)):
         chat_service, _ = chat_service
         await chat_service.update_settings(data.chatId, **data.model_dump(exclude={'chatId', 'uid'}))
-        return JSONResponse(content={'message': 'Conversation settings updated'})
+        return MongoJSONResponse(content={'message': 'Conversation settings updated'})
 
     @router.delete("/messages")  # /chat/messages or /system/chat/messages
     async def delete_all_messages(data: DeleteChatData, chat_service=Depends(get_specific_chat_service)):
         chat_service, _ = chat_service
         await chat_service.delete_all_messages(data.chatId)
-        return JSONResponse(content={'message': 'Memory Cleared'})
+        return MongoJSONResponse(content={'message': 'Memory Cleared'})
 
     return router
\ No newline at end of file
@@ -1,5 +1,4 @@
 import io
-from PIL import Image
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import List
@@ -162,6 +161,7 @@ async def save_image(request: Request, uid: str = Header(...)):
     image_blob = io.BytesIO(image_data)
     
     # Create thumbnail
+    from PIL import Image
     with Image.open(image_blob) as img:
         img.thumbnail((200, 200))  # This maintains aspect ratio
         thumb_blob = io.BytesIO()
@@ -1,8 +1,7 @@
 from fastapi import APIRouter, Depends, Header, HTTPException, Request
-from fastapi.responses import JSONResponse
+from app.utils.mongo_json_response import MongoJSONResponse
 from dotenv import load_dotenv
 from app.services.InsightService import InsightService
-from app.agents.AnalyzeUser import AnalyzeUser
 
 load_dotenv()
 
@@ -14,6 +13,7 @@ def get_services(request: Request, uid: str = Header(...)):
         db = mongo_client.db
         sio = request.app.state.sio
         insight_service = InsightService(db, sio, uid)
+        from app.agents.AnalyzeUser import AnalyzeUser  # dspy loads on first use
         analyze_user = AnalyzeUser(db, uid)
         return {"db": db, "analyze_user": analyze_user, "mongo_client": mongo_client, "insight_service": insight_service, "uid": uid}
     except Exception as e:
@@ -23,17 +23,17 @@ def get_services(request: Request, uid: str = Header(...)):
 async def get_questions(services: dict = Depends(get_services)):
     insight_data = await services["insight_service"].get_user_insight()
     if insight_data:
-        return JSONResponse(content=insight_data.model_dump())
-    return JSONResponse(content={'response': 'No insight data found'})
+        return MongoJSONResponse(content=insight_data.model_dump())
+    return MongoJSONResponse(content={'response': 'No insight data found'})
     
 @router.post("/insight/update_answer")
 async def update_answers(request: Request, services: dict = Depends(get_services)):
     data = await request.json()
     await services["insight_service"].update_profile_answer(data)
-    return JSONResponse(content={'response': 'Profile questions/answers updated successfully'})
+    return MongoJSONResponse(content={'response': 'Profile questions/answers updated successfully'})
 
 @router.post("/insight/analyze")
 async def analyze_profile(services: dict = Depends(get_services)):
     answered_questions = await services["insight_service"].load_questions(fetch_answered=True)
     response = await services["analyze_user"].analyze_cateogry(answered_questions)
-    return JSONResponse(content=response)
\ No newline at end of file
+    return MongoJSONResponse(content=response)
\ No newline at end of file
@@ -1,10 +1,12 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Header, Request, File, UploadFile
-from fastapi.responses import JSONResponse
+from app.utils.mongo_json_response import MongoJSONResponse
 from typing import Optional
 from app.services.KnowledgeBaseService import KnowledgeBaseService
 from app.services.KbDocumentService import KbDocumentService
 from app.services.ExtractionService import ExtractionService
 from app.services.ColbertService import ColbertService
+from app.services.EmbeddingJobQueue import embedding_job_queue
 from app.agents.OpenAiClient import OpenAiClient
 
 router = APIRouter()
@@ -24,13 +26,13 @@ def get_services(request: Request, uid: str = Header(...)):
 @router.get("/kb")
 async def get_kb_list(services: dict = Depends(get_services)):
     kb_list = await services["kb_service"].get_kb_list(services["uid"])
-    return JSONResponse(content=kb_list)
+    return MongoJSONResponse(content=kb_list)
 
 @router.post("/kb")
 async def create_kb(request: Request, services: dict = Depends(get_services)):
     data = await request.json()
     new_kb_details = await services["kb_service"].create_new_kb(services["uid"], data.get('name'), data.get('objective'))
-    return JSONResponse(content=new_kb_details)
+    return MongoJSONResponse(content=new_kb_details)
 
 @router.delete("/kb/{kb_id}")
 async def delete_kb(kb_id: str, services: dict = Depends(get_services)):
@@ -41,13 +43,18 @@ async def delete_kb(kb_id: str, services: dict = Depends(get_services)):
     colbert_service = ColbertService(index_path)
     services["kb_service"].set_colbert_service(colbert_service)
     await services["kb_service"].delete_kb_by_id(kb_id)
-    return JSONResponse(content={"message": "KB deleted"})
+    return MongoJSONResponse(content={"message": "KB deleted"})
 
 @router.get("/kb/{kb_id}/documents")
 async def get_documents(kb_id: str, services: dict = Depends(get_services)):
     kb_doc_service = KbDocumentService(services["db"], kb_id)
     documents = await kb_doc_service.get_docs_by_kbId()
-    return JSONResponse(content={"documents": documents})
+    return MongoJSONResponse(content={"documents": documents})
+
+@router.get("/kb/{kb_id}/jobs")
+async def get_embedding_jobs(kb_id: str, services: dict = Depends(get_services)):
+    jobs = await embedding_job_queue.get_jobs(kb_id, services["uid"])
+    return MongoJSONResponse(content={"jobs": jobs})
 
 @router.post("/kb/{kb_id}/extract")
 async def extract(
@@ -62,7 +69,7 @@ async def extract(
     if file:
         if file.filename.lower().endswith('.pdf'):
             kb_doc = await extraction_service.extract_from_pdf(file, kb_id)
-            return JSONResponse(content=kb_doc)
+            return MongoJSONResponse(content=kb_doc)
         else:
             raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are allowed.")
     else:
@@ -74,7 +81,7 @@ async def extract(
             raise HTTPException(status_code=400, detail="URL is required when not uploading a file")
         
         kb_doc = await extraction_service.extract_from_url(url, endpoint)
-        return JSONResponse(content=kb_doc)
+        return MongoJSONResponse(content=kb_doc)
 
 @router.delete("/kb/{kb_id}/documents/page")
 async def delete_page(kb_id: str, request: Request, services: dict = Depends(get_services)):
@@ -86,34 +93,36 @@ async def delete_page(kb_id: str, request: Request, services: dict = Depends(get
         raise HTTPException(status_code=400, detail="Page source is required")
     
     kb_doc_service = KbDocumentService(services["db"], kb_id)
-    is_embedded = kb_doc_service.is_document_embedded(doc_id, page_source)
-    kb_doc_service.delete_page_by_source(doc_id, page_source)
-    if is_embedded:
+    chunk_ids = await kb_doc_service.delete_page_by_source(doc_id, page_source)
+    if chunk_ids:
         await services["kb_service"].set_kb_id(kb_id)
         index_path = services["kb_service"].index_path
         colbert_service = ColbertService(index_path)
-        colbert_service.delete_document_from_index([page_source])
+        # All of the page's chunks go in one index update
+        await asyncio.to_thread(colbert_service.delete_document_from_index, chunk_ids)
+        await embedding_job_queue.compact_if_needed(services["uid"], kb_id, index_path)
     
-    return JSONResponse(content={"message": "Page deleted", "was_embedded": is_embedded})
+    return MongoJSONResponse(content={"message": "Page deleted", "was_embedded": bool(chunk_ids)})
 
 @router.delete("/kb/{kb_id}/documents/{doc_id}")
 async def delete_document(kb_id: str, doc_id: str, services: dict = Depends(get_services)):
     kb_doc_service = KbDocumentService(services["db"], kb_id)
     
-    # Delete the document and get embedded sources
-    embedded_sources = await kb_doc_service.delete_doc_by_id(doc_id)
+    # Delete the document and get the index ids of its embedded chunks
+    embedded_chunk_ids = await kb_doc_service.delete_doc_by_id(doc_id)
 
-    # If there are embedded sources, delete them from the Colbert index
-    if embedded_sources:
+    # If there are embedded chunks, delete them from the Colbert index
+    if embedded_chunk_ids:
         await services["kb_service"].set_kb_id(kb_id)
         index_path = services["kb_service"].index_path
         colbert_service = ColbertService(index_path)
         
-        # Delete all embedded sources at once
-        colbert_service.delete_document_from_index(embedded_sources)
+        # Delete all embedded chunks at once
+        await asyncio.to_thread(colbert_service.delete_document_from_index, embedded_chunk_ids)
+        await embedding_job_queue.compact_if_needed(services["uid"], kb_id, index_path)
     
-    return JSONResponse(content={
+    return MongoJSONResponse(content={
         "message": "Document deleted",
-        "embedded_sources_deleted": embedded_sources
+        "embedded_sources_deleted": sorted({chunk_id.rsplit('#chunk-', 1)[0] for chunk_id in embedded_chunk_ids})
     })
 
@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.utils.metrics import registry
+from app.services.LlmResponseCache import llm_response_cache
+from app.services.ColbertRegistry import colbert_registry
+from app.agents.admission_controller import admission_controller
+from app.agents.client_registry import client_registry
+from app.agents.handlers.stream_emitter import global_emitter_stats
+
+router = APIRouter()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _admission_queues(field):
+    return lambda: [((key,), values[field]) for key, values in admission_controller.snapshot()['queues'].items()]
+
+# Totals and levels kept by other components, read at scrape time
+registry.counter(
+    'llm_cache_events_total', 'LLM response cache lookups by result', ('result',),
+    lambda: [((result,), count) for result, count in llm_response_cache.stats.items()])
+registry.counter(
+    'colbert_registry_events_total', 'ColBERT model registry lookups, loads and evictions', ('event',),
+    lambda: [((event,), count) for event, count in colbert_registry.stats.items()])
+registry.gauge(
+    'colbert_loaded_bytes', 'Approximate resident memory of loaded ColBERT models', ('kind',),
+    lambda: [((kind,), sum(e['size_bytes'] for e in colbert_registry.snapshot() if e['kind'] == kind)) for kind in ('index', 'pretrained', 'searcher', 'checkpoint')])
+registry.gauge(
+    'llm_admission_active', 'Generations holding an admission slot', ('queue',), _admission_queues('active'))
+registry.gauge(
+    'llm_admission_waiting', 'Generations waiting for an admission slot', ('queue',), _admission_queues('waiting'))
+registry.counter(
+    'llm_admission_decisions_total', 'Admission decisions by outcome', ('outcome',),
+    lambda: [((outcome,), admission_controller.stats[outcome]) for outcome in admission_controller.stats])
+registry.gauge(
+    'event_loop_lag_seconds', 'Event loop lag measured by the admission controller', (),
+    lambda: [((), admission_controller.loop_lag)])
+registry.counter(
+    'llm_client_registry_lookups_total', 'SDK client registry lookups by result', ('result',),
+    lambda: [(('hit',), client_registry.hits), (('miss',), client_registry.misses)])
+registry.counter(
+    'stream_emitter_frames_total', 'Totals from the coalescing stream emitter', ('kind',),
+    lambda: [(('responses',), global_emitter_stats.responses), (('deltas',), global_emitter_stats.deltas), (('frames',), global_emitter_stats.frames)])
+
+@router.get("/metrics")
+async def get_metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,10 +1,9 @@
 from dotenv import load_dotenv
 from fastapi import APIRouter, Header, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from app.utils.mongo_json_response import MongoJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from app.agents.OpenAiClient import OpenAiClient
-from app.agents.ContentProcessor import ContentProcessor
 from app.services.MomentService import MomentService
 from fastapi import Request
 
@@ -31,18 +30,23 @@ def get_services(db = Depends(get_db)):
     openai_client = OpenAiClient()
     return moment_service, openai_client
 
+def get_content_processor(model='gpt-4o'):
+    # ContentProcessor needs dspy (and litellm); load it on first use, not at startup
+    from app.agents.ContentProcessor import ContentProcessor
+    return ContentProcessor(model=model)
+
 @router.get("/moments")
 async def handle_fetch_moments(services: tuple = Depends(get_services)):
     moment_service, _ = services
     all_moments = moment_service.get_all_moments()
-    return JSONResponse(content=all_moments, status_code=200)
+    return MongoJSONResponse(content=all_moments, status_code=200)
 
 @router.post("/moments")
 async def handle_add_moment(new_moment: Moment, services: tuple = Depends(get_services)):
     moment_service, openai_client = services
-    content_processor = ContentProcessor(model='gpt-4o')
+    content_processor = get_content_processor()
     
-    processed_moment = {**new_moment.dict(), **content_processor.extract_content(new_moment.dict())}
+    processed_moment = {**new_moment.dict(), **(await content_processor.extract_content(new_moment.dict()))}
     new_moment = moment_service.add_moment(processed_moment)
     
     combined_content = f"Transcript: {new_moment['transcript']}\nAction Items:\n" + "\n".join(new_moment['actionItems']) + f"\nSummary: {new_moment['summary']}"
@@ -51,14 +55,14 @@ async def handle_add_moment(new_moment: Moment, services: tuple = Depends(get_se
     
     moment_service.create_snapshot(snapshot_data)
     
-    return JSONResponse(content=new_moment, status_code=200)
+    return MongoJSONResponse(content=new_moment, status_code=200)
 
 @router.put("/moments")
 async def handle_update_moment(moment: Moment, services: tuple = Depends(get_services)):
     moment_service, openai_client = services
-    content_processor = ContentProcessor(model='gpt-4o')
+    content_processor = get_content_processor()
     
-    current_snapshot = {**moment.dict(), **content_processor.extract_content(moment.dict())}
+    current_snapshot = {**moment.dict(), **(await content_processor.extract_content(moment.dict()))}
     previous_snapshot = moment_service.get_previous_snapshot(moment.momentId)
 
     combined_content = f"Transcript: {moment.transcript}\nAction Items:\n" + "\n".join(current_snapshot['actionItems']) + f"\nSummary: {current_snapshot['summary']}"
@@ -74,10 +78,10 @@ async def handle_update_moment(moment: Moment, services: tuple = Depends(get_ser
     })
 
     new_snapshot['transcript'] = moment_service.update_moment(new_snapshot)
-    return JSONResponse(content=new_snapshot, status_code=200)
+    return MongoJSONResponse(content=new_snapshot, status_code=200)
 
 @router.delete("/moments")
 async def handle_delete_moment(moment_id: str, services: tuple = Depends(get_services)):
     moment_service, _ = services
     moment_service.delete_moment(moment_id)
-    return JSONResponse(content={'message': 'Moment Deleted'}, status_code=200)
\ No newline at end of file
+    return MongoJSONResponse(content={'message': 'Moment Deleted'}, status_code=200)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Header, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from app.utils.mongo_json_response import MongoJSONResponse
 from typing import Any
 import random
 from dotenv import load_dotenv
@@ -28,9 +28,7 @@ def get_services(db: Any = Depends(get_db), uid: str = Header(...)):
 async def get_news(services: tuple = Depends(get_services)):
     _, news_service = services
     news_data = await news_service.get_all_news_articles()
-    for article in news_data:
-        article['_id'] = str(article['_id'])
-    return JSONResponse(content=news_data)
+    return MongoJSONResponse(content=news_data)
 
 @router.post("/news")
 async def post_news(request: Request, services: tuple = Depends(get_services)):
@@ -38,9 +36,9 @@ async def post_news(request: Request, services: tuple = Depends(get_services)):
     data = await request.json()
     query = data['query']
     urls = news_service.get_article_urls(query)
-    news_data = news_service.summarize_articles(urls)
-    news_service.upload_news_data(news_data)
-    return JSONResponse(content=news_data)
+    news_data = await news_service.summarize_articles(urls)
+    await news_service.upload_news_data(news_data)
+    return MongoJSONResponse(content=news_data)
 
 @router.put("/news")
 async def update_news(request: Request, services: tuple = Depends(get_services)):
@@ -49,7 +47,7 @@ async def update_news(request: Request, services: tuple = Depends(get_services))
     doc_id = data['articleId']
     is_read = data['isRead']
     news_service.mark_is_read(doc_id, is_read)
-    return JSONResponse(content={"message": "Updated successfully"})
+    return MongoJSONResponse(content={"message": "Updated successfully"})
 
 @router.delete("/news")
 async def delete_news(request: Request, services: tuple = Depends(get_services)):
@@ -57,17 +55,17 @@ async def delete_news(request: Request, services: tuple = Depends(get_services))
     data = await request.json()
     doc_id = data['articleId']
     news_service.delete_news_article(doc_id)
-    return JSONResponse(content={"message": "Deleted successfully"})
+    return MongoJSONResponse(content={"message": "Deleted successfully"})
 
 @router.get("/ai-fetch-news")
 async def ai_fetch_news(services: tuple = Depends(get_services)):
     _, news_service = services
-    topics = news_service.get_user_topics()
+    topics = await news_service.get_user_topics()
     if not topics:
         raise HTTPException(status_code=404, detail="No topics found, please answer some questions in the profile section and analyze")
     
     random_topic = random.choice(topics)
     urls = news_service.get_article_urls(random_topic)
-    news_data_list = news_service.summarize_articles(urls)
-    news_service.upload_news_data(news_data_list)
-    return JSONResponse(content=news_data_list)
\ No newline at end of file
+    news_data_list = await news_service.summarize_articles(urls)
+    await news_service.upload_news_data(news_data_list)
+    return MongoJSONResponse(content=news_data_list)
\ No newline at end of file
@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse
 from app.services.UserService import UserService
+from app.agents.client_registry import client_registry
 from pydantic import BaseModel
 from typing import Any
 load_dotenv()
@@ -34,7 +35,8 @@ async def signup(data: SignupData, user_service: UserService = Depends(get_user_
             'authorized': data.authorized
         }
       
-        user_service.update_user(data.uid, updates)
+        await user_service.update_user(data.uid, updates)
+        client_registry.invalidate(data.uid)
 
         return JSONResponse(content={'message': 'User added successfully'}, status_code=200)
     except Exception as e:
@@ -3,7 +3,6 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Header
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from app.services.System.SystemService import SystemService
-from app.agents.SystemAgent import SystemAgent
 from app.services.System.SystemIndexManager import SystemIndexManager
 from app.services.ChatService import ChatService
 from app.services.ColbertService import ColbertService
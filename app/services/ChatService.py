@@ -1,21 +1,36 @@
 from datetime import datetime, timezone
+import logging
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, InsertOne
+from pymongo.errors import BulkWriteError
+from app.utils.token_counter import token_counter
+from app.utils.tracing import traced
+
+DEFAULT_PAGE_SIZE = 50
+CHAT_LIST_PAGE_SIZE = 30
+PREVIEW_LENGTH = 120
+SUMMARY_PROJECTION = {'chat_name': 1, 'agent_model': 1, 'updated_at': 1, 'last_message': 1}
+DUPLICATE_KEY_ERROR = 11000
 
 class ChatService:
     def __init__(self, db, chat_type='user'):
         self.db = db
         self.chat_type = chat_type
-        # Select the appropriate collection based on chat_type
+        # Select the appropriate collections based on chat_type
         self.collection = self.db['system_chats'] if chat_type == 'system' else self.db['chats']
+        # Messages live in their own collection keyed by (chat_id, created_at)
+        self.messages_collection = self.db['system_chat_messages'] if chat_type == 'system' else self.db['chat_messages']
 
     async def create_chat_in_db(self, uid):
+        current_time = datetime.now(timezone.utc).isoformat()
         new_chat = {
             'uid': uid,
             'chat_name': 'New Chat',
             'agent_model': 'gpt-4o-mini',
             'system_message': '',
             'context': [],
-            'updated_at': datetime.now(timezone.utc).isoformat()
+            'created_at': current_time,
+            'updated_at': current_time
         }
 
         result = await self.collection.insert_one(new_chat)
@@ -24,33 +39,113 @@ class ChatService:
         return new_chat
         
     async def get_all_chats(self, uid):
-        chats_cursor = self.collection.find({'uid': uid}).sort('created_at', -1)
-        
-        # Function to recursively convert ObjectId to string
-        def convert_objectid(obj):
-            if isinstance(obj, ObjectId):
-                return str(obj)
-            elif isinstance(obj, list):
-                return [convert_objectid(item) for item in obj]
-            elif isinstance(obj, dict):
-                return {k: convert_objectid(v) for k, v in obj.items()}
-            else:
-                return obj
+        chats_cursor = self.collection.find({'uid': uid}).sort([('updated_at', DESCENDING), ('_id', DESCENDING)])
 
-        # Get all chats and convert to list
+        # Get all chats and convert to list; nested ObjectIds are left to MongoJSONResponse
         chats = []
-        async for conv in chats_cursor:
-            chat = convert_objectid(conv)
-            chat['chatId'] = chat.pop('_id')  # Rename '_id' to 'chatId'
+        async for chat in chats_cursor:
+            if chat.get('messages'):
+                await self.migrate_embedded_messages(chat)
+            chat.pop('messages', None)
+            chat['chatId'] = str(chat.pop('_id'))  # Rename '_id' to 'chatId'
             chats.append(chat)
+
+        # Attach messages with one query across all chats instead of one per chat
+        messages_by_chat = {chat['chatId']: [] for chat in chats}
+        messages_cursor = self.messages_collection.find(
+            {'chat_id': {'$in': list(messages_by_chat)}}
+        ).sort([('chat_id', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)])
+        async for message in messages_cursor:
+            messages_by_chat[message['chat_id']].append(self._format_message(message))
+        for chat in chats:
+            chat['messages'] = messages_by_chat[chat['chatId']]
         return chats
 
+    async def get_chat_summaries(self, uid, before=None, limit=CHAT_LIST_PAGE_SIZE):
+        """
+        Lightweight chat list for the sidebar: id, name, model, updated_at and a
+        preview of the last message, most recently updated first. Uses keyset
+        pagination on the (uid, updated_at, _id) index, so the cost of a page
+        doesn't depend on how many chats or messages a user has.
+        """
+        query = {'uid': uid}
+        if before:
+            updated_at, chat_id = self._decode_chat_cursor(before)
+            if updated_at:
+                query['$or'] = [
+                    {'updated_at': {'$lt': updated_at}},
+                    {'updated_at': updated_at, '_id': {'$lt': chat_id}},
+                    # Chats without updated_at (not yet backfilled) sort last
+                    {'updated_at': None}
+                ]
+            else:
+                query['updated_at'] = None
+                query['_id'] = {'$lt': chat_id}
+
+        cursor = self.collection.find(query, SUMMARY_PROJECTION).sort(
+            [('updated_at', DESCENDING), ('_id', DESCENDING)]
+        ).limit(limit + 1)
+        page = await cursor.to_list(length=limit + 1)
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        next_cursor = f"{page[-1].get('updated_at') or ''}_{page[-1]['_id']}" if has_more else None
+
+        chats = []
+        for chat in page:
+            chat['chatId'] = str(chat.pop('_id'))
+            chats.append(chat)
+        return {'chats': chats, 'next_cursor': next_cursor}
+
+    async def get_chat_state(self, uid, chat_id, limit=DEFAULT_PAGE_SIZE):
+        """Full state for one chat: settings, context and the newest page of messages"""
+        chat = await self.get_single_chat(uid, chat_id)
+        if not chat:
+            return None
+        chat['chatId'] = str(chat.pop('_id'))
+        page = await self.get_messages(chat_id, limit=limit)
+        chat['messages'] = page['messages']
+        chat['next_cursor'] = page['next_cursor']
+        return chat
+
     async def get_single_chat(self, uid, chat_id):
         chat = await self.collection.find_one({'_id': ObjectId(chat_id), 'uid': uid})
+        if chat and chat.get('messages'):
+            await self.migrate_embedded_messages(chat)
+            chat.pop('messages', None)
         return chat if chat else None
 
+    async def get_messages(self, chat_id, before=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns one page of a chat's messages, newest page first, using keyset
+        pagination on (created_at, _id). Pass the returned `next_cursor` as
+        `before` to fetch the previous (older) page.
+        """
+        query = {'chat_id': chat_id}
+        if before:
+            created_at, message_id = self._decode_cursor(before)
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': message_id}}
+            ]
+
+        cursor = self.messages_collection.find(query).sort(
+            [('created_at', DESCENDING), ('_id', DESCENDING)]
+        ).limit(limit + 1)
+        page = await cursor.to_list(length=limit + 1)
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        next_cursor = self._encode_cursor(page[-1]) if has_more else None
+        page.reverse()
+        return {
+            'messages': [self._format_message(message) for message in page],
+            'next_cursor': next_cursor
+        }
+
     async def delete_chat(self, chat_id):
         result = await self.collection.delete_one({'_id': ObjectId(chat_id)})
+        await self.messages_collection.delete_many({'chat_id': chat_id})
         return result.deleted_count
 
     async def update_settings(self, chat_id, **kwargs):
@@ -66,30 +161,158 @@ class ChatService:
             return update_result
         return None
 
+    @traced('ChatService.create_message')
     async def create_message(self, chat_id, message_from, message_content):
-        current_time = datetime.now(timezone.utc).isoformat()
+        created_at = datetime.now(timezone.utc)
+        current_time = created_at.isoformat()
         new_message = {
             '_id': ObjectId(),
+            'chat_id': chat_id,
             'message_from': message_from,
             'content': message_content,
             'type': 'database',
             'current_time': current_time,
+            'created_at': created_at,
+            'token_count': self._count_message_tokens(message_content),
         }
 
-        # Update the chat document to append the new message and update the 'updated_at' field
+        # A single insert per message; the chat document only tracks 'updated_at' and a preview
+        await self.messages_collection.insert_one(new_message)
         await self.collection.update_one(
             {'_id': ObjectId(chat_id)}, 
-            {
-                '$push': {'messages': new_message},
-                '$set': {'updated_at': current_time}
-            }
+            {'$set': {
+                'updated_at': current_time,
+                'last_message': {
+                    'message_from': message_from,
+                    'preview': self._message_text(message_content)[:PREVIEW_LENGTH],
+                    'current_time': current_time
+                }
+            }}
         )
 
         return new_message
 
+    async def migrate_embedded_messages(self, chat=None):
+        """
+        Moves messages embedded in chat documents into the messages collection.
+        Pass a chat document to migrate just that chat; without one every chat
+        that still has an embedded 'messages' array is migrated. Safe to re-run:
+        messages keep their original _id, so already-copied ones are skipped.
+        """
+        if chat is not None:
+            return await self._migrate_chat_messages(chat)
+
+        migrated = 0
+        async for embedded_chat in self.collection.find({'messages.0': {'$exists': True}}):
+            migrated += await self._migrate_chat_messages(embedded_chat)
+        return migrated
+
+    async def backfill_chat_summaries(self):
+        """
+        Sets 'updated_at' and 'last_message' on chats created before the
+        chat list tracked them, from each chat's newest message. Safe to re-run.
+        """
+        backfilled = 0
+        async for chat in self.collection.find({'$or': [{'updated_at': None}, {'last_message': None}]}):
+            chat_id = str(chat['_id'])
+            latest = await self.messages_collection.find_one(
+                {'chat_id': chat_id}, sort=[('created_at', DESCENDING), ('_id', DESCENDING)]
+            )
+            update_fields = {}
+            if not chat.get('updated_at'):
+                if latest:
+                    update_fields['updated_at'] = latest.get('current_time') or latest['created_at'].isoformat()
+                else:
+                    update_fields['updated_at'] = chat.get('created_at') or chat['_id'].generation_time.isoformat()
+            if not chat.get('last_message') and latest:
+                update_fields['last_message'] = {
+                    'message_from': latest.get('message_from'),
+                    'preview': self._message_text(latest.get('content'))[:PREVIEW_LENGTH],
+                    'current_time': latest.get('current_time') or latest['created_at'].isoformat()
+                }
+            if update_fields:
+                await self.collection.update_one({'_id': chat['_id']}, {'$set': update_fields})
+                backfilled += 1
+        return backfilled
+
+    async def _migrate_chat_messages(self, chat):
+        chat_id = str(chat['_id'])
+        operations = []
+        for message in chat.get('messages', []):
+            message = dict(message)
+            message.setdefault('_id', ObjectId())
+            message['chat_id'] = chat_id
+            message['created_at'] = self._parse_message_time(message)
+            if 'token_count' not in message:
+                message['token_count'] = self._count_message_tokens(message.get('content'))
+            operations.append(InsertOne(message))
+
+        if operations:
+            try:
+                await self.messages_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates mean a previous run already copied these messages
+                if any(error.get('code') != DUPLICATE_KEY_ERROR for error in e.details.get('writeErrors', [])):
+                    raise
+
+        await self.collection.update_one({'_id': chat['_id']}, {'$unset': {'messages': ''}})
+        logging.info('Migrated %d embedded messages for chat %s', len(operations), chat_id)
+        return len(operations)
+
+    def _parse_message_time(self, message):
+        try:
+            return datetime.fromisoformat(message['current_time'])
+        except (KeyError, TypeError, ValueError):
+            return message['_id'].generation_time
+
+    def _format_message(self, message):
+        message['_id'] = str(message['_id'])
+        message.pop('created_at', None)
+        return message
+
+    def _encode_cursor(self, message):
+        return f"{message['created_at'].isoformat()}_{message['_id']}"
+
+    def _decode_chat_cursor(self, cursor):
+        updated_at, chat_id = cursor.rsplit('_', 1)
+        return updated_at, ObjectId(chat_id)
+
+    def _decode_cursor(self, cursor):
+        created_at, message_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), ObjectId(message_id)
+
+    def _message_text(self, message_content):
+        if isinstance(message_content, list):
+            return ''.join(chunk.get('content', '') for chunk in message_content if isinstance(chunk, dict))
+        return message_content or ''
+
+    def _count_message_tokens(self, message_content):
+        """Token count stored with each message so history windows don't re-tokenize old turns"""
+        return token_counter(self._message_text(message_content))
+
+    async def get_summary_state(self, chat_id):
+        chat = await self.collection.find_one(
+            {'_id': ObjectId(chat_id)},
+            {'summary': 1, 'summary_high_water': 1}
+        )
+        return chat or {}
+
+    async def update_summary(self, chat_id, summary, high_water, previous_high_water=0):
+        """
+        Stores the rolling summary only if no other turn has advanced the
+        high-water mark in the meantime.
+        """
+        high_water_filter = {'$in': [previous_high_water, None]} if previous_high_water == 0 else previous_high_water
+        result = await self.collection.update_one(
+            {'_id': ObjectId(chat_id), 'summary_high_water': high_water_filter},
+            {'$set': {'summary': summary, 'summary_high_water': high_water}}
+        )
+        return result.modified_count
+
     async def delete_all_messages(self, chat_id):
-        # Update the chat document to clear the 'messages' array
+        # Remove the chat's messages and the summary built from them
+        await self.messages_collection.delete_many({'chat_id': chat_id})
         await self.collection.update_one(
             {'_id': ObjectId(chat_id)},
-            {'$set': {'messages': []}}
+            {'$unset': {'messages': '', 'summary': '', 'summary_high_water': ''}}
         )
@@ -0,0 +1,272 @@
+import asyncio
+import gc
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = 'colbert-ir/colbertv2.0'
+
+def _rag_pretrained_model():
+    # ragatouille pulls in torch; import it when a model is first needed, not at startup
+    from ragatouille import RAGPretrainedModel
+    return RAGPretrainedModel
+
+# Serializes the Checkpoint swap in _SegmentSearcher across threads
+_searcher_build_lock = threading.Lock()
+
+class _SegmentSearcher:
+    """
+    ColBERT searcher for one segment of a SegmentedIndex. Queries are
+    encoded with the registry's shared Checkpoint, so each segment only
+    adds its own index data in memory, not another copy of the model.
+    Results have the same shape as ragatouille's.
+    """
+
+    def __init__(self, index_path: str, checkpoint_name: str, checkpoint, checkpoint_lock: threading.RLock):
+        import colbert.searcher as colbert_searcher
+
+        self.checkpoint_lock = checkpoint_lock
+        # ragatouille writes these next to the ColBERT index files
+        self.collection = self._read_json(index_path, 'collection.json')
+        self.pid_docid_map = {int(pid): doc_id for pid, doc_id in self._read_json(index_path, 'pid_docid_map.json').items()}
+        self.docid_metadata_map = self._read_json(index_path, 'docid_metadata_map.json', required=False)
+
+        # Searcher always loads its own Checkpoint; hand it the shared one instead
+        with _searcher_build_lock:
+            load_checkpoint = colbert_searcher.Checkpoint
+            colbert_searcher.Checkpoint = lambda *args, **kwargs: checkpoint
+            try:
+                self.searcher = colbert_searcher.Searcher(
+                    index=os.path.basename(index_path),
+                    index_root=os.path.dirname(index_path),
+                    checkpoint=checkpoint_name,
+                    collection=self.collection,
+                    verbose=0
+                )
+            finally:
+                colbert_searcher.Checkpoint = load_checkpoint
+
+    @staticmethod
+    def _read_json(index_path: str, name: str, required: bool = True):
+        path = os.path.join(index_path, name)
+        if not required and not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as json_file:
+            return json.load(json_file)
+
+    def search(self, query: str, k: int) -> List[dict]:
+        with self.checkpoint_lock:
+            encoded_query = self.searcher.encode(query)
+        pids, ranks, scores = self.searcher.dense_search(encoded_query, k=k)
+        results = []
+        for pid, rank, score in zip(pids, ranks, scores):
+            document_id = self.pid_docid_map[pid]
+            result = {'content': self.collection[pid], 'score': score, 'rank': rank, 'document_id': document_id, 'passage_id': pid}
+            if self.docid_metadata_map is not None:
+                result['document_metadata'] = self.docid_metadata_map.get(document_id)
+            results.append(result)
+        return results
+
+def _load_checkpoint(checkpoint_name: str):
+    from colbert.infra import ColBERTConfig
+    from colbert.modeling.checkpoint import Checkpoint
+    return Checkpoint(checkpoint_name, colbert_config=ColBERTConfig(), verbose=0)
+
+def _resident_memory() -> int:
+    import psutil
+    return psutil.Process().memory_info().rss
+
+class _Entry:
+    __slots__ = ('model', 'lock', 'size', 'loaded_at')
+
+    def __init__(self, model, size: int):
+        self.model = model
+        self.lock = threading.RLock()  # ragatouille models aren't safe to use from two threads at once
+        self.size = size
+        self.loaded_at = time.monotonic()
+
+class ColbertRegistry:
+    """
+    Process-wide cache of loaded ColBERT models.
+
+    ragatouille binds a model either to an index (`from_index`) or to the
+    root new indexes are written under (`from_pretrained`), so entries are
+    keyed by ('index', path) or ('pretrained', index_root). Segments of a
+    SegmentedIndex are searched through ('searcher', path) entries that
+    share one pinned ('checkpoint', name) entry, since a ragatouille model
+    per segment would mean a copy of the weights per segment. Each is loaded
+    once and shared by every ColbertService that asks for it, and handed
+    out with the lock to hold while using it. Each entry's size is the
+    resident memory its load added; entries are evicted least recently
+    used first while their summed size is over `memory_limit_bytes`. The
+    entry just requested is never evicted, so a single oversized index
+    still works. (Live RSS can't be the budget: allocators rarely return
+    freed model memory, so it would stay over the limit and evict
+    everything on each load.)
+
+    `checkpoint` may be a Hugging Face model id or a local directory
+    (COLBERT_CHECKPOINT); a local path means nothing is downloaded.
+    """
+    _instance: Optional['ColbertRegistry'] = None
+
+    def __init__(self, checkpoint: str = DEFAULT_CHECKPOINT, memory_limit_bytes: int = 4 * 1024 ** 3):
+        self.checkpoint = checkpoint
+        self.memory_limit_bytes = memory_limit_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # Last measured size per key, for reloads that reuse freed memory and so don't grow RSS
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._warmup_task: Optional[asyncio.Task] = None
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+    @classmethod
+    def get_instance(cls) -> 'ColbertRegistry':
+        if cls._instance is None:
+            cls._instance = cls(
+                checkpoint=os.getenv('COLBERT_CHECKPOINT', DEFAULT_CHECKPOINT),
+                memory_limit_bytes=int(os.getenv('COLBERT_MEMORY_LIMIT_MB', '4096')) * 1024 ** 2
+            )
+        return cls._instance
+
+    def pretrained(self, index_root: str) -> Tuple[Any, threading.RLock]:
+        """(model, lock) for creating new indexes under `index_root`."""
+        return self._get(('pretrained', index_root), lambda: _rag_pretrained_model().from_pretrained(self.checkpoint, index_root=index_root))
+
+    def index(self, index_path: str) -> Tuple[Any, threading.RLock]:
+        """(model, lock) for the index at `index_path`, ready to search or update."""
+        return self._get(('index', index_path), lambda: _rag_pretrained_model().from_index(index_path))
+
+    def segment_searcher(self, index_path: str) -> Tuple[_SegmentSearcher, threading.RLock]:
+        """(searcher, lock) for one segment of a SegmentedIndex, on the shared checkpoint."""
+        checkpoint, checkpoint_lock = self._get(('checkpoint', self.checkpoint), lambda: _load_checkpoint(self.checkpoint))
+        return self._get(('searcher', index_path), lambda: _SegmentSearcher(index_path, self.checkpoint, checkpoint, checkpoint_lock))
+
+    def evict(self, index_path: str):
+        """Drops a cached index, e.g. after it was deleted or rebuilt on disk."""
+        with self._lock:
+            entries = [self._entries.pop((kind, index_path), None) for kind in ('index', 'searcher')]
+        for entry in entries:
+            if entry is not None:
+                self._release(entry)
+
+    def evict_missing(self):
+        """Drops indexes whose directory is gone, e.g. segments replaced by a compaction in another process."""
+        with self._lock:
+            missing = [key for key in self._entries if key[0] in ('index', 'searcher') and not os.path.exists(key[1])]
+            entries = [self._entries.pop(key) for key in missing]
+        for entry in entries:
+            self._release(entry)
+
+    def _get(self, key: Tuple[str, str], load) -> Tuple[Any, threading.RLock]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry.model, entry.lock
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other keys stay available meanwhile
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.stats['hits'] += 1
+                    return entry.model, entry.lock
+
+            self._enforce_limit(keep=None, incoming=self._sizes.get(key, 0))
+            started = time.perf_counter()
+            before = _resident_memory()
+            model = load()
+            size = _resident_memory() - before
+            with self._lock:
+                if size <= 0:
+                    # Loaded into memory freed by an earlier eviction; reuse what we know
+                    known = [entry.size for entry in self._entries.values() if entry.size > 0]
+                    size = self._sizes.get(key) or (sum(known) // len(known) if known else 0)
+                self._sizes[key] = size
+                entry = _Entry(model, size)
+                self._entries[key] = entry
+                self._load_locks.pop(key, None)
+                self.stats['loads'] += 1
+            logger.info('Loaded ColBERT %s %s in %.1fs (~%d MB)', key[0], key[1], time.perf_counter() - started, size // 1024 ** 2)
+            self._enforce_limit(keep=key)
+            return model, entry.lock
+
+    def _enforce_limit(self, keep: Optional[Tuple[str, str]], incoming: int = 0):
+        """Evicts least recently used entries until they fit, with room for `incoming` bytes."""
+        while True:
+            with self._lock:
+                if sum(entry.size for entry in self._entries.values()) + incoming <= self.memory_limit_bytes:
+                    return
+                # Segment searchers hold the checkpoint anyway; evicting it would only load a second copy
+                victim = next((key for key in self._entries if key != keep and key[0] != 'checkpoint'), None)
+                if victim is None:
+                    return
+                entry = self._entries.pop(victim)
+                self.stats['evictions'] += 1
+            logger.info('Evicting ColBERT %s %s to stay under %d MB', victim[0], victim[1], self.memory_limit_bytes // 1024 ** 2)
+            self._release(entry)
+
+    @staticmethod
+    def _release(entry: _Entry):
+        # Wait for in-flight searches on this model before dropping it
+        with entry.lock:
+            entry.model = None
+        gc.collect()
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [
+                {'kind': kind, 'key': key, 'size_bytes': entry.size, 'age_seconds': time.monotonic() - entry.loaded_at}
+                for (kind, key), entry in self._entries.items()
+            ]
+
+    def prefetch_checkpoint(self):
+        """Imports ragatouille/torch and makes sure the checkpoint is on local disk."""
+        _rag_pretrained_model()
+        if not os.path.isdir(self.checkpoint):
+            from huggingface_hub import snapshot_download
+            snapshot_download(self.checkpoint)
+
+    def start_warmup(self, db=None, max_indexes: int = 2):
+        """
+        Prefetches the checkpoint and loads the most recently created KB
+        indexes in a worker thread, so the first query doesn't download
+        weights or cold-load an index. Returns immediately.
+        """
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.get_running_loop().create_task(self._warm_up(db, max_indexes))
+        return self._warmup_task
+
+    async def _warm_up(self, db, max_indexes: int):
+        try:
+            index_paths = []
+            if db is not None and max_indexes > 0:
+                cursor = db['knowledge_bases'].find({'index_path': {'$ne': None}}, {'index_path': 1}).sort('_id', -1).limit(max_indexes)
+                index_paths = [kb['index_path'] async for kb in cursor]
+
+            def warm():
+                from app.services.SegmentedIndex import SegmentedIndex
+                self.prefetch_checkpoint()
+                for index_path in index_paths:
+                    if SegmentedIndex.is_segmented(index_path):
+                        for segment_path in SegmentedIndex(index_path).segment_paths():
+                            self.segment_searcher(segment_path)
+                    elif os.path.exists(index_path):
+                        self.index(index_path)
+
+            started = time.perf_counter()
+            await asyncio.to_thread(warm)
+            logger.info('ColBERT warm-up finished in %.1fs (%d indexes)', time.perf_counter() - started, len(index_paths))
+        except Exception as e:
+            logger.warning('ColBERT warm-up failed: %s', str(e))
+
+colbert_registry = ColbertRegistry.get_instance()
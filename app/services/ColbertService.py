@@ -4,7 +4,9 @@ from dotenv import load_dotenv
 import shutil
 import time
 import logging
-from ragatouille import RAGPretrainedModel
+from app.utils.metrics import COLBERT_SECONDS
+from app.services.ColbertRegistry import colbert_registry
+from app.services.SegmentedIndex import SegmentedIndex
 
 load_dotenv()
 
@@ -13,14 +15,26 @@ class ColbertService:
         is_local = os.getenv('LOCAL_DEV') == 'true'
         base_path = f'/mnt/media_storage/users/{uid}' if not is_local else os.path.join(os.getcwd(), f'media_storage/users/{uid}')
         self.index_root = os.path.join(base_path, '.ragatouille')
-
-        if index_path and os.path.exists(index_path):
-            self.rag = RAGPretrainedModel.from_index(index_path)
-        else:
-            self.rag = RAGPretrainedModel.from_pretrained("colbert-ir/colbertv2.0", index_root=self.index_root)
         self.index_path = index_path
-    
-    def process_content(self, content):
+
+    def _model(self):
+        """(model, lock) from the process-wide registry; models are only loaded on first use."""
+        if self.index_path and os.path.exists(self.index_path) and not self.is_segmented:
+            return colbert_registry.index(self.index_path)
+        return colbert_registry.pretrained(self.index_root)
+
+    @property
+    def is_segmented(self):
+        return SegmentedIndex.is_segmented(self.index_path)
+
+    def process_content(self, content, stale_ids=()):
+        """
+        Adds `content` to the KB index. New pages go into a delta segment of a
+        segmented index; an index without one is created, and an index from
+        before segmenting is adopted as the base. `stale_ids` are removed in
+        the same update. Returns {'index_path': ...} when the KB must point
+        at a new path, otherwise {'message': ...}.
+        """
         try:
             if self.index_path is None or not os.path.exists(self.index_path):
                 result = self.create_index(content)
@@ -29,31 +43,48 @@ class ColbertService:
                     return {'index_path': self.index_path}
                 else:
                     raise ValueError("Failed to create index")
+            elif not self.is_segmented:
+                legacy_index_path = self.index_path
+                self.index_path = SegmentedIndex.adopt(self._new_segmented_path(), legacy_index_path).path
+                segment = SegmentedIndex(self.index_path).add(content, self._build_segment, stale_ids)
+                return {'index_path': self.index_path, 'message': f'Documents added to {segment}'}
             else:
-                result = self.add_documents_to_index(content)
-                return {'message': result}
+                segment = SegmentedIndex(self.index_path).add(content, self._build_segment, stale_ids)
+                return {'message': f'Documents added to {segment}'}
         except Exception as e:
             logging.error(f"Error processing content: {str(e)}")
             raise
-    
-    def create_index(self, content: List[dict]):
-        try:
-            doc_ids = [doc['id'] for doc in content]
-            collection = [doc['content'] for doc in content]
-            metadata = [doc['metadata'] for doc in content]
-            
-            if not doc_ids or not collection:
-                raise ValueError("No documents to index")
-            
-            index_name = f"index_{int(time.time())}"
-            
-            path = self.rag.index(
+
+    def _new_segmented_path(self):
+        return os.path.join(self.index_root, 'segmented', f"index_{int(time.time() * 1000)}")
+
+    def _build_segment(self, index_name, content):
+        doc_ids = [doc['id'] for doc in content]
+        collection = [doc['content'] for doc in content]
+        metadata = [doc.get('metadata', {}) for doc in content]
+
+        if not doc_ids or not collection:
+            raise ValueError("No documents to index")
+
+        rag, lock = colbert_registry.pretrained(self.index_root)
+        with lock, COLBERT_SECONDS.time(operation='create_index'):
+            return rag.index(
                 index_name=index_name,
                 collection=collection,
                 document_ids=doc_ids,
-                document_metadatas=metadata
+                document_metadatas=metadata,
+                split_documents=False  # KbDocumentService already chunked the pages
             )
-            return {'index_path': path}
+
+    def _search_segment(self, index_path, query, k):
+        searcher, lock = colbert_registry.segment_searcher(index_path)
+        with lock:
+            return searcher.search(query, k)
+
+    def create_index(self, content: List[dict]):
+        try:
+            index = SegmentedIndex.create(self._new_segmented_path(), content, self._build_segment)
+            return {'index_path': index.path}
         except ValueError as ve:
             print(f"ValueError in create_index: {ve}")
             return None
@@ -72,7 +103,12 @@ class ColbertService:
                 logging.warning("Index path %s is not a directory", self.index_path)
                 return f'Index path {self.index_path} is not a directory'
 
-            shutil.rmtree(self.index_path)
+            if self.is_segmented:
+                for segment_path in SegmentedIndex(self.index_path).destroy():
+                    colbert_registry.evict(segment_path)
+            else:
+                colbert_registry.evict(self.index_path)
+                shutil.rmtree(self.index_path)
             logging.info("Index directory %s deleted", self.index_path)
             return f'Index directory {self.index_path} deleted'
 
@@ -80,36 +116,44 @@ class ColbertService:
             logging.error("Error deleting index: %s", str(e))
             return False
     
-    def add_documents_to_index(self, content):
-        try:
-            doc_ids = [doc['id'] for doc in content]
-            collection = [doc['content'] for doc in content]
-            metadata = [doc['metadata'] for doc in content] | []
-            self.rag.add_to_index(
-                new_collection=collection,
-                new_document_ids=doc_ids,
-                new_document_metadatas=metadata
-            )
-            return 'Documents added to index'
-        except Exception as e:
-            print(f"Error adding documents to index: {e}")
-            return False
-    
     def delete_document_from_index(self, doc_sources):
         try:
             if not self.index_path:
                 raise ValueError("No index path available")
 
-            self.rag.delete_from_index(document_ids=doc_sources)
+            if self.is_segmented:
+                # A tombstone write; the copies are dropped at the next compaction
+                with COLBERT_SECONDS.time(operation='delete_documents'):
+                    SegmentedIndex(self.index_path).delete(doc_sources)
+                return 'Documents deleted from index'
+
+            rag, lock = self._model()
+            with lock, COLBERT_SECONDS.time(operation='delete_documents'):
+                rag.delete_from_index(document_ids=doc_sources)
             return 'Documents deleted from index'
         except Exception as e:
             logging.error(f"Error deleting documents from index: {e}")
             return False
         
-    def search_index(self, query):
+    def search_index(self, query, k=10):
         if not self.index_path:
             raise ValueError("An index path is required to query an index")
-        return self.rag.search(query)
+        if self.is_segmented:
+            with COLBERT_SECONDS.time(operation='search'):
+                return SegmentedIndex(self.index_path).search(query, k, self._search_segment)
+        rag, lock = self._model()
+        with lock, COLBERT_SECONDS.time(operation='search'):
+            return rag.search(query, k=k)
+
+    def compact_index(self, content):
+        """Rebuilds a segmented index's base from `content`, every live document of the KB."""
+        if not self.is_segmented:
+            raise ValueError("Only segmented indexes can be compacted")
+        with COLBERT_SECONDS.time(operation='compact'):
+            replaced = SegmentedIndex(self.index_path).compact(content, self._build_segment)
+        for segment_path in replaced:
+            colbert_registry.evict(segment_path)
+        return replaced
         
     def prepare_vector_response(self, query_results):
         text = []
@@ -1,7 +1,10 @@
 from typing import List, Dict, Any, Optional
+import asyncio
 import base64
 import os
-from app.services.interfaces import ExtractionProvider, SettingsProvider
+from app.services.interfaces import ExtractionProvider, SettingsProvider, KnowledgeBaseProvider
+from app.utils.metrics import CONTEXT_PROCESSING_SECONDS
+from app.utils.tracing import span
 from dotenv import load_dotenv
 import logging
 load_dotenv()
@@ -10,10 +13,12 @@ class ContextManagerService:
     def __init__(
         self,
         extraction_provider: ExtractionProvider,
-        settings_provider: Optional[SettingsProvider] = None
+        settings_provider: Optional[SettingsProvider] = None,
+        kb_provider: Optional[KnowledgeBaseProvider] = None
     ):
         self.extraction_provider = extraction_provider
         self.settings_provider = settings_provider
+        self.kb_provider = kb_provider
 
     def prepare_url_content(self, url_contents: List[Dict[str, Any]]) -> str:
         combined_content = "<<URL_CONTENT_START>>\n"
@@ -26,6 +31,20 @@ class ContextManagerService:
         combined_content += "<<URL_CONTENT_END>>"
         return combined_content
 
+    def prepare_kb_content(self, kb_name: str, search_results: List[Dict[str, Any]]) -> str:
+        combined_content = "<<KB_CONTENT_START>>\n"
+        combined_content += f"Answer the users question using these excerpts from the knowledge base {kb_name}:\n"
+
+        for result in search_results:
+            metadata = result.get('document_metadata') or {}
+            combined_content += f"SOURCE: {metadata.get('sourceURL', result.get('document_id'))}\n"
+            if metadata.get('headings'):
+                combined_content += f"SECTION: {' > '.join(metadata['headings'])}\n"
+            combined_content += f"CONTENT: {result['content']}\n\n"
+
+        combined_content += "<<KB_CONTENT_END>>"
+        return combined_content
+
     async def process_context(self, context: List[Dict[str, Any]], user_message: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Main method to process all types of context and combine results
@@ -36,29 +55,34 @@ class ContextManagerService:
         file_context = [item for item in context if item.get('type') == 'file'] or None
         results = {}
 
-        if url_context:
-            prepared_url_content, url_contents = await self.process_url_context(url_context)
-            results['url'] = prepared_url_content
-            if self.settings_provider:
-                # Create a lookup dictionary for quick source-to-content mapping
-                content_updates = {item['source']: item['content'] for item in url_contents}
-                
-                # Update the content in the original context list
-                for item in context:
-                    if item.get('source') in content_updates:
-                        item['content'] = content_updates[item['source']]
-                
-                # Update the entire context array
-                await self.settings_provider.update_settings(context=context)
-        
-        if file_context:
-            results['file'] = self.process_file_context(file_context)
-        
-        if image_context:
-            results['image'] = await self.process_image_context(image_context, user_message)
-        
-        if kb_context and user_message:
-            results['kb'] = await self.process_kb_context(kb_context, user_message)
+        with span('ContextManagerService.process_context', context_items=len(context)), CONTEXT_PROCESSING_SECONDS.time(context_type='all'):
+            if url_context:
+                with span('context.url', urls=len(url_context)), CONTEXT_PROCESSING_SECONDS.time(context_type='url'):
+                    prepared_url_content, url_contents = await self.process_url_context(url_context)
+                    results['url'] = prepared_url_content
+                    if self.settings_provider:
+                        # Create a lookup dictionary for quick source-to-content mapping
+                        content_updates = {item['source']: item['content'] for item in url_contents}
+                        
+                        # Update the content in the original context list
+                        for item in context:
+                            if item.get('source') in content_updates:
+                                item['content'] = content_updates[item['source']]
+                        
+                        # Update the entire context array
+                        await self.settings_provider.update_settings(context=context)
+            
+            if file_context:
+                with span('context.file', files=len(file_context)), CONTEXT_PROCESSING_SECONDS.time(context_type='file'):
+                    results['file'] = self.process_file_context(file_context)
+            
+            if image_context:
+                with span('context.image', images=len(image_context)), CONTEXT_PROCESSING_SECONDS.time(context_type='image'):
+                    results['image'] = await self.process_image_context(image_context, user_message)
+            
+            if kb_context and user_message:
+                with span('context.kb', kbs=len(kb_context)), CONTEXT_PROCESSING_SECONDS.time(context_type='kb'):
+                    results['kb'] = await self.process_kb_context(kb_context, user_message)
 
         return self.combine_context_results(results)
 
@@ -109,23 +133,33 @@ class ContextManagerService:
         user_message['images'] = image_urls
         return user_message
 
-    async def process_kb_context(self, kb_context: List[Dict[str, Any]], user_message: str) -> List[Dict[str, Any]]:
+    async def process_kb_context(self, kb_context: List[Dict[str, Any]], user_message: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
-        Process knowledge base type context using ColbertService
+        Searches each knowledge base in the context for the user's message.
+        The searches run concurrently; a KB that fails or runs over the
+        retrieval budget is left out rather than holding up the turn.
         """
+        if not self.kb_provider:
+            return []
+
+        query = user_message.get('content') if isinstance(user_message, dict) else user_message
+        if not isinstance(query, str) or not query.strip():
+            return []
+
+        kb_items = [item for item in kb_context if item.get('kb_id') or item.get('id')]
+        search_results = await asyncio.gather(
+            *(self.kb_provider.search(item.get('kb_id') or item.get('id'), query) for item in kb_items)
+        )
+
         kb_results = []
-        
-        # for kb_item in kb_context:
-        #     kb_id = kb_item.get('kb_id')
-        #     if kb_id:
-        #         kb_service = KnowledgeBaseService(self.db, self.uid, kb_id)
-        #         colbert_service = ColbertService(kb_service.index_path)
-        #         search_results = colbert_service.search_index(user_message)
-        #         kb_results.append({
-        #             'kb_id': kb_id,
-        #             'content': colbert_service.prepare_vector_response(search_results),
-        #             'type': 'kb'
-        #         })
+        for kb_item, results in zip(kb_items, search_results):
+            if results:
+                kb_id = kb_item.get('kb_id') or kb_item.get('id')
+                kb_results.append({
+                    'kb_id': kb_id,
+                    'content': self.prepare_kb_content(kb_item.get('name', kb_id), results),
+                    'type': 'kb'
+                })
         
         return kb_results
 
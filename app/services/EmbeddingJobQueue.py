@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.services.PubSubBroker import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+# An interrupted job whose identical twin was queued in the meantime
+SUPERSEDED = 'superseded'
+EMBED, COMPACT = 'embed', 'compact'
+
+def _embed_batch(index_path: Optional[str], uid: str, documents: List[dict], stale_ids: List[str]) -> Dict[str, Any]:
+    """
+    Runs in a pool process: adds `documents` to the index, creating it when
+    there is none yet, and drops `stale_ids`. Pool processes are long-lived,
+    so the ColBERT registry in each keeps its models loaded between batches.
+    """
+    from app.services.ColbertService import ColbertService
+    return ColbertService(index_path=index_path, uid=uid).process_content(documents, stale_ids)
+
+def _compact_index(index_path: str, uid: str, documents: List[dict]) -> List[str]:
+    """Runs in a pool process: rebuilds a segmented index's base from every live document."""
+    from app.services.ColbertService import ColbertService
+    return ColbertService(index_path=index_path, uid=uid).compact_index(documents)
+
+def _serialize(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': str(job['_id']),
+        'kind': job.get('kind', EMBED),
+        'kb_id': job['kb_id'],
+        'doc_id': job['doc_id'],
+        'state': job['state'],
+        'progress': job.get('progress', {'done': 0, 'total': 0}),
+        'error': job.get('error'),
+        'created_at': job['created_at'].isoformat(),
+        'updated_at': job['updated_at'].isoformat(),
+    }
+
+class EmbeddingJobQueue:
+    """
+    Mongo-backed queue of KB embedding jobs, executed in a process pool so
+    ColBERT indexing never runs on the event loop.
+
+    Jobs move queued -> running -> done | failed in the `embedding_jobs`
+    collection. Enqueueing the same pages of a document while an identical
+    job is still queued returns that job (a partial unique index on
+    `dedupe_key` enforces it). Pages are indexed in batches; after each one
+    they are marked embedded and a `process_progress` event goes to the
+    user's room. Running jobs heartbeat, and jobs whose heartbeat went stale
+    (the worker died or restarted) are queued again, or marked superseded
+    if an identical job was queued meanwhile; pages already marked
+    embedded are skipped when they resume. Only one job per KB runs at a
+    time, since ColBERT indexes can't take concurrent writers.
+
+    Compaction of segmented indexes (see SegmentedIndex) runs as a job of
+    kind 'compact' in the same queue, queued when an embed job or a delete
+    leaves the index past its compaction thresholds.
+    """
+    _instance: Optional['EmbeddingJobQueue'] = None
+
+    def __init__(self, max_workers: int = 1, batch_size: int = 8, poll_interval: float = 5.0, stale_after: float = 120.0):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.collection = None
+        self.db = None
+        self.sio = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'EmbeddingJobQueue':
+        if cls._instance is None:
+            cls._instance = cls(
+                max_workers=int(os.getenv('EMBEDDING_WORKERS', '1')),
+                batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', '8')),
+                stale_after=float(os.getenv('EMBEDDING_JOB_STALE_SECONDS', '120'))
+            )
+        return cls._instance
+
+    def configure(self, db, sio):
+        self.db = db
+        self.collection = db['embedding_jobs']
+        self.sio = sio
+
+    async def start(self):
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for task in list(self._running.values()):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def dedupe_key(kb_id: str, doc_id: Optional[str], sources: Optional[List[str]], kind: str = EMBED) -> str:
+        scope = '\n'.join(sorted(sources)) if sources is not None else '*'
+        return hashlib.sha256(f'{kind}\n{kb_id}\n{doc_id}\n{scope}'.encode('utf-8')).hexdigest()
+
+    async def enqueue(self, uid: str, kb_id: str, doc_id: Optional[str], sources: Optional[List[str]] = None, kind: str = EMBED) -> Tuple[Dict[str, Any], bool]:
+        """Queues a job and returns (job, created); created is False for a deduplicated request."""
+        now = datetime.now(timezone.utc)
+        job = {
+            '_id': ObjectId(),
+            'kind': kind,
+            'uid': uid,
+            'kb_id': kb_id,
+            'doc_id': doc_id,
+            'sources': sources,
+            'dedupe_key': self.dedupe_key(kb_id, doc_id, sources, kind),
+            'state': QUEUED,
+            'progress': {'done': 0, 'total': 0},
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for attempt in range(3):
+            try:
+                await self.collection.insert_one(job)
+                break
+            except DuplicateKeyError:
+                existing = await self.collection.find_one({'dedupe_key': job['dedupe_key'], 'state': QUEUED})
+                if existing is not None:
+                    return _serialize(existing), False
+                # The queued twin was claimed in the meantime; try again to queue behind it
+                if attempt == 2:
+                    raise
+        self._wakeup.set()
+        return _serialize(job), True
+
+    async def compact_if_needed(self, uid: str, kb_id: str, index_path: Optional[str]) -> bool:
+        """Queues a compaction when the KB's segmented index is past its thresholds."""
+        from app.services.SegmentedIndex import SegmentedIndex
+        if not SegmentedIndex.is_segmented(index_path):
+            return False
+        if not await asyncio.to_thread(SegmentedIndex(index_path).needs_compaction):
+            return False
+        await self.enqueue(uid, kb_id, None, kind=COMPACT)
+        return True
+
+    async def get_jobs(self, kb_id: str, uid: str, limit: int = 20) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({'kb_id': kb_id, 'uid': uid}).sort('created_at', -1).limit(limit)
+        return [_serialize(job) async for job in cursor]
+
+    async def _dispatch(self):
+        while True:
+            try:
+                await self._requeue_stale()
+                while len(self._running) < self.max_workers:
+                    job = await self._claim()
+                    if job is None:
+                        break
+                    task = asyncio.get_running_loop().create_task(self._run_job(job))
+                    self._running[job['kb_id']] = task
+                    task.add_done_callback(lambda _, kb_id=job['kb_id']: self._on_job_finished(kb_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error('Embedding job dispatch failed: %s', str(e))
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_job_finished(self, kb_id: str):
+        self._running.pop(kb_id, None)
+        self._wakeup.set()
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        # Skip KBs with a job running anywhere, so an index only ever has one writer
+        busy = await self.collection.distinct('kb_id', {'state': RUNNING})
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {'state': QUEUED, 'kb_id': {'$nin': list(set(busy) | set(self._running))}},
+            {
+                '$set': {'state': RUNNING, 'worker_id': WORKER_ID, 'started_at': now, 'heartbeat_at': now, 'updated_at': now},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _requeue_stale(self):
+        """
+        Queues interrupted jobs again, one at a time: a job whose twin was
+        queued while it ran can't go back to queued (dedupe_key is unique
+        among queued jobs), so it's marked superseded and the twin resumes
+        its pages instead.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        stale = self.collection.find({'state': RUNNING, 'heartbeat_at': {'$lt': cutoff}}, {'_id': 1})
+        async for job in stale:
+            now = datetime.now(timezone.utc)
+            match = {'_id': job['_id'], 'state': RUNNING, 'heartbeat_at': {'$lt': cutoff}}
+            try:
+                result = await self.collection.update_one(
+                    match, {'$set': {'state': QUEUED, 'updated_at': now}, '$unset': {'worker_id': ''}}
+                )
+                if result.modified_count:
+                    logger.info('Resuming interrupted embedding job %s', job['_id'])
+            except DuplicateKeyError:
+                await self.collection.update_one(
+                    match, {'$set': {'state': SUPERSEDED, 'finished_at': now, 'updated_at': now}, '$unset': {'worker_id': ''}}
+                )
+                logger.info('Interrupted embedding job %s superseded by a queued twin', job['_id'])
+
+    async def _heartbeat(self, job_id: ObjectId):
+        while True:
+            await asyncio.sleep(self.stale_after / 4)
+            await self.collection.update_one({'_id': job_id, 'state': RUNNING}, {'$set': {'heartbeat_at': datetime.now(timezone.utc)}})
+
+    async def _update(self, job: Dict[str, Any], **fields):
+        fields['updated_at'] = datetime.now(timezone.utc)
+        job.update(fields)
+        await self.collection.update_one({'_id': job['_id']}, {'$set': fields})
+
+    async def _emit(self, event: str, job: Dict[str, Any], **payload):
+        if self.sio is None:
+            return
+        from app.socket_handlers.room_handler import user_room
+        await self.sio.emit(event, {'process_id': str(job['_id']), 'kb_id': job['kb_id'], 'doc_id': job['doc_id'], **payload}, room=user_room(job['uid']))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and Mongo client threads isn't safe
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def _run_job(self, job: Dict[str, Any]):
+        from app.services.KnowledgeBaseService import KnowledgeBaseService
+        from app.services.ColbertRegistry import colbert_registry
+
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job['_id']))
+        try:
+            index_path = await KnowledgeBaseService(self.db, job['uid']).set_kb_id(job['kb_id'])
+            if job.get('kind') == COMPACT:
+                await self._run_compaction(job, index_path)
+            else:
+                index_path = await self._run_embedding(job, index_path)
+            await self._update(job, state=DONE, finished_at=datetime.now(timezone.utc))
+            if job.get('kind') != COMPACT:
+                await self.compact_if_needed(job['uid'], job['kb_id'], index_path)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job running so it's resumed once its heartbeat goes stale
+            raise
+        except Exception as e:
+            logger.error('Embedding job %s failed: %s', job['_id'], str(e))
+            await self._update(job, state=FAILED, error=str(e), finished_at=datetime.now(timezone.utc))
+            await self._emit('process_error', job, status='error', message=str(e))
+        finally:
+            heartbeat.cancel()
+            # Pool processes may have replaced segments on disk; drop our stale copies
+            colbert_registry.evict_missing()
+
+    async def _run_compaction(self, job: Dict[str, Any], index_path: Optional[str]):
+        from app.services.KbDocumentService import KbDocumentService
+        from app.services.SegmentedIndex import SegmentedIndex
+        if not SegmentedIndex.is_segmented(index_path):
+            return
+        documents = []
+        async for doc in self.db['kb_docs'].find({'kb_id': job['kb_id']}):
+            pages = [page for page in doc.get('content', []) if page.get('isEmbedded', False)]
+            documents.extend(KbDocumentService.prepare_for_index(pages))
+        replaced = await asyncio.get_running_loop().run_in_executor(self._get_pool(), _compact_index, index_path, job['uid'], documents)
+        logger.info('Compacted KB %s: %d documents, %d segments replaced', job['kb_id'], len(documents), len(replaced))
+
+    async def _run_embedding(self, job: Dict[str, Any], index_path: Optional[str]) -> Optional[str]:
+        from app.services.KbDocumentService import KbDocumentService
+        kb_document_service = KbDocumentService(self.db, job['kb_id'])
+        doc = await self.db['kb_docs'].find_one({'_id': ObjectId(job['doc_id'])})
+        if not doc:
+            raise ValueError(f"Document with id {job['doc_id']} not found")
+
+        pages = kb_document_service.pages_to_embed(doc, job.get('sources'))
+        progress = {'done': 0, 'total': len(pages)}
+        await self._update(job, progress=progress)
+        await self._emit('process_progress', job, status='running', **progress)
+
+        loop = asyncio.get_running_loop()
+        for start in range(0, len(pages), self.batch_size):
+            batch = pages[start:start + self.batch_size]
+            # Batches are counted in pages; each page is indexed as its chunks
+            documents = kb_document_service.prepare_for_index(batch)
+            if documents:
+                stale_ids = kb_document_service.stale_chunk_ids(batch, documents)
+                result = await loop.run_in_executor(self._get_pool(), _embed_batch, index_path, job['uid'], documents, stale_ids)
+                if 'index_path' in result:
+                    index_path = result['index_path']
+                    await kb_document_service.update_knowledge_base(index_path=index_path)
+                await kb_document_service.mark_pages_embedded(job['doc_id'], documents)
+
+            progress = {'done': progress['done'] + len(batch), 'total': progress['total']}
+            await self._update(job, progress=progress)
+            await self._emit('process_progress', job, status='running', **progress)
+
+        kb_doc = await self.db['kb_docs'].find_one({'_id': ObjectId(job['doc_id'])})
+        kb_doc['id'] = str(kb_doc.pop('_id'))
+        await self._emit('process_complete', job, status='success', kb_doc=kb_doc)
+        return index_path
+
+embedding_job_queue = EmbeddingJobQueue.get_instance()
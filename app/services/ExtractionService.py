@@ -1,12 +1,13 @@
 import os
-import pymupdf4llm
-import fitz
 import httpx
 import asyncio
+import time
 from dotenv import load_dotenv
 from fastapi import HTTPException
-from app.utils.token_counter import token_counter
+from app.utils.token_counter import count_many
 from app.services.LocalStorageService import LocalStorageService
+from app.utils.metrics import FIRECRAWL_REQUEST_SECONDS, FIRECRAWL_POLL_SECONDS
+from app.utils.tracing import span, traced
 
 load_dotenv()
 
@@ -19,6 +20,8 @@ class ExtractionService:
 
     async def extract_from_pdf(self, file, kb_id):
         try:
+            import fitz
+            import pymupdf4llm
             file_content = await file.read()
             pdf_document = fitz.open(stream=file_content, filetype="pdf")
             md_text = pymupdf4llm.to_markdown(pdf_document)
@@ -32,6 +35,7 @@ class ExtractionService:
             print(f"Error extracting text from PDF: {e}")
             raise HTTPException(status_code=500, detail="Failed to extract text from PDF")
 
+    @traced('ExtractionService.extract_from_url')
     async def extract_from_url(self, url, endpoint, for_kb=False):
         """Base extraction method that can be used for both KB and chat scenarios"""
         normalized_url = self.normalize_url(url)
@@ -40,11 +44,12 @@ class ExtractionService:
         
         try:
             content = await self._fetch_and_process_url(firecrawl_url, normalized_url, endpoint)
+            token_counts = count_many(url_content.get('markdown') for url_content in content)
             url_docs = [{
                 'content': url_content.get('markdown'),
-                'token_count': token_counter(url_content.get('markdown')),
+                'token_count': token_count,
                 'metadata': url_content.get('metadata')
-            } for url_content in content]
+            } for url_content, token_count in zip(content, token_counts)]
             if for_kb:
                 return await self._process_for_kb(url_docs, normalized_url)
 
@@ -68,11 +73,12 @@ class ExtractionService:
         """Internal method to handle the URL fetching and processing"""
         params = {'url': normalized_url, "removeBase64Images": True,}
         async with httpx.AsyncClient() as client:
-            firecrawl_response = await client.post(
-                f"{firecrawl_url}/{endpoint}", 
-                json=params, 
-                timeout=60
-            )
+            with span('firecrawl.request', endpoint=endpoint), FIRECRAWL_REQUEST_SECONDS.time(endpoint=endpoint):
+                firecrawl_response = await client.post(
+                    f"{firecrawl_url}/{endpoint}", 
+                    json=params, 
+                    timeout=60
+                )
             firecrawl_response.raise_for_status()
             firecrawl_data = firecrawl_response.json()
             print(firecrawl_data)
@@ -96,6 +102,17 @@ class ExtractionService:
         return kb_doc
     
     async def poll_job_status(self, firecrawl_url, job_id):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            with span('firecrawl.poll', job_id=job_id):
+                result = await self._poll_until_done(firecrawl_url, job_id)
+            outcome = 'completed'
+            return result
+        finally:
+            FIRECRAWL_POLL_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+    async def _poll_until_done(self, firecrawl_url, job_id):
         async with httpx.AsyncClient() as client:
             while True:
                 status_response = await client.get(
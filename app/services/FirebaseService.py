@@ -1,8 +1,43 @@
-from firebase_admin import auth
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_firebase_app = None
+_firebase_lock = threading.Lock()
+
+def get_firebase_app():
+    """
+    Initializes the Firebase Admin app on first call and returns it. Kept out
+    of import time so startup doesn't load firebase_admin or read credentials.
+    """
+    global _firebase_app
+    if _firebase_app is None:
+        with _firebase_lock:
+            if _firebase_app is None:
+                import firebase_admin
+                from firebase_admin import credentials
+                try:
+                    _firebase_app = firebase_admin.get_app()
+                except ValueError:
+                    cred = credentials.Certificate(os.getenv('FIREBASE_ADMIN_SDK'))
+                    _firebase_app = firebase_admin.initialize_app(cred, {
+                        'projectId': 'paxxiumv1',
+                        'storageBucket': 'paxxiumv1.appspot.com'
+                    })
+                    logger.info("Firebase initialized successfully")
+    return _firebase_app
+
+def _auth():
+    get_firebase_app()
+    from firebase_admin import auth
+    return auth
 
 class FirebaseService:
     @staticmethod
     def verify_id_token(id_token):
+        auth = _auth()
         try:
             return auth.verify_id_token(id_token)
         except ValueError:
@@ -10,6 +45,7 @@ class FirebaseService:
 
     @staticmethod
     def get_user(uid):
+        auth = _auth()
         try:
             return auth.get_user(uid)
         except auth.UserNotFoundError:
@@ -19,7 +55,7 @@ class FirebaseService:
     def update_user_password(uid, new_password):
         try:
             # Update the user's password
-            user = auth.update_user(
+            user = _auth().update_user(
                 uid,
                 password=new_password
             )
@@ -27,4 +63,4 @@ class FirebaseService:
             return user
         except Exception as e:
             print(f"Error updating user password: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass(frozen=True)
+class CanonicalQuery:
+    """A hot query issued by a service; its plan must never be a collection scan."""
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: Optional[Tuple[Tuple[str, int], ...]] = None
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec('chats', (('uid', ASCENDING), ('updated_at', DESCENDING), ('_id', DESCENDING))),
+    IndexSpec('system_chats', (('uid', ASCENDING), ('updated_at', DESCENDING), ('_id', DESCENDING))),
+    IndexSpec('chat_messages', (('chat_id', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING))),
+    IndexSpec('system_chat_messages', (('chat_id', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING))),
+    IndexSpec('kb_docs', (('kb_id', ASCENDING),)),
+    IndexSpec('kb_docs', (('content.metadata.sourceURL', ASCENDING),)),
+    IndexSpec('newsArticles', (('uid', ASCENDING), ('url', ASCENDING))),
+    IndexSpec('insight', (('uid', ASCENDING),)),
+    IndexSpec('snapshots', (('momentId', ASCENDING),)),
+    IndexSpec('knowledge_bases', (('uid', ASCENDING),)),
+    IndexSpec('llm_cache', (('expires_at', ASCENDING),), {'expireAfterSeconds': 0}),
+    IndexSpec('embedding_jobs', (('state', ASCENDING), ('created_at', ASCENDING))),
+    IndexSpec('embedding_jobs', (('kb_id', ASCENDING), ('created_at', DESCENDING))),
+    IndexSpec('embedding_jobs', (('dedupe_key', ASCENDING),), {'unique': True, 'partialFilterExpression': {'state': 'queued'}}),
+]
+
+CANONICAL_QUERIES: List[CanonicalQuery] = [
+    CanonicalQuery('ChatService.get_all_chats', 'chats', {'uid': '<uid>'}, (('updated_at', DESCENDING), ('_id', DESCENDING))),
+    CanonicalQuery('ChatService.get_all_chats (system)', 'system_chats', {'uid': '<uid>'}, (('updated_at', DESCENDING), ('_id', DESCENDING))),
+    CanonicalQuery('ChatService.get_messages', 'chat_messages', {'chat_id': '<chat_id>'}, (('created_at', DESCENDING), ('_id', DESCENDING))),
+    CanonicalQuery('ChatService.get_messages (system)', 'system_chat_messages', {'chat_id': '<chat_id>'}, (('created_at', DESCENDING), ('_id', DESCENDING))),
+    CanonicalQuery('KbDocumentService.get_docs_by_kbId', 'kb_docs', {'kb_id': '<kb_id>'}),
+    CanonicalQuery('KbDocumentService by sourceURL', 'kb_docs', {'content.metadata.sourceURL': '<url>'}),
+    CanonicalQuery('NewsService.upload_news_data', 'newsArticles', {'url': '<url>', 'uid': '<uid>'}),
+    CanonicalQuery('NewsService.get_all_news_articles', 'newsArticles', {'uid': '<uid>'}),
+    CanonicalQuery('InsightService.get_user_insight', 'insight', {'uid': '<uid>'}),
+    CanonicalQuery('MomentService.get_previous_snapshot', 'snapshots', {'momentId': '<moment_id>'}),
+    CanonicalQuery('KnowledgeBaseService.get_kb_list', 'knowledge_bases', {'uid': '<uid>'}),
+    CanonicalQuery('EmbeddingJobQueue._claim', 'embedding_jobs', {'state': 'queued'}, (('created_at', ASCENDING),)),
+    CanonicalQuery('EmbeddingJobQueue.get_jobs', 'embedding_jobs', {'kb_id': '<kb_id>', 'uid': '<uid>'}, (('created_at', DESCENDING),)),
+]
+
+async def ensure_indexes(db) -> List[str]:
+    """
+    Creates every registered index. create_index is a no-op when an identical
+    index already exists, so this is safe to run on every startup.
+    """
+    created = []
+    for spec in INDEXES:
+        name = await db[spec.collection].create_index(list(spec.keys), **spec.options)
+        created.append(f"{spec.collection}.{name}")
+    logger.info("Ensured %d MongoDB indexes", len(created))
+    return created
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get('stage')]
+    if 'inputStage' in plan:
+        stages.extend(_plan_stages(plan['inputStage']))
+    for input_stage in plan.get('inputStages', []):
+        stages.extend(_plan_stages(input_stage))
+    return [stage for stage in stages if stage]
+
+async def verify_query_plans(db) -> List[Dict[str, Any]]:
+    """Runs explain() on each canonical query and reports the winning plan's stages."""
+    results = []
+    for query in CANONICAL_QUERIES:
+        cursor = db[query.collection].find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(list(query.sort))
+        explanation = await cursor.explain()
+        winning_plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+        # Newer servers nest the classic plan under queryPlan
+        stages = _plan_stages(winning_plan.get('queryPlan', winning_plan))
+        results.append({
+            'name': query.name,
+            'collection': query.collection,
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages,
+        })
+    return results
+
+async def _main(verify: bool) -> int:
+    from app.services.MongoDbClient import MongoDbClient
+    mongo_client = MongoDbClient('paxxium')
+    try:
+        await ensure_indexes(mongo_client.db)
+        if not verify:
+            return 0
+
+        results = await verify_query_plans(mongo_client.db)
+        for result in results:
+            status = 'COLLSCAN' if result['collscan'] else 'ok'
+            print(f"{status:<9} {result['name']:<45} {' <- '.join(result['stages'])}")
+        failures = [result for result in results if result['collscan']]
+        if failures:
+            print(f"{len(failures)} canonical queries do a collection scan")
+            return 1
+        return 0
+    finally:
+        mongo_client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply the MongoDB index registry and verify query plans.')
+    parser.add_argument('--verify', action='store_true', help='Run explain() on canonical queries and fail on any COLLSCAN')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(args.verify)))
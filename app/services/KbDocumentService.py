@@ -2,7 +2,10 @@ from bson import ObjectId
 from bson.errors import InvalidId
 from pymongo import UpdateOne
 import logging
-from app.utils.token_counter import token_counter
+from collections import Counter
+from app.services.KbRetriever import kb_retriever
+from app.utils.markdown_chunker import chunk_id, chunk_markdown
+from app.utils.token_counter import count_many
 
 class KbDocumentService:
     def __init__(self, db, kb_id, colbert_service=None, openai_client=None):
@@ -33,15 +36,16 @@ class KbDocumentService:
         try:
             doc = await self.db['kb_docs'].find_one({'_id': ObjectId(doc_id)})
             if doc:
-                embedded_sources = [
-                    url_doc['metadata']['sourceURL']
+                embedded_chunk_ids = [
+                    index_id
                     for url_doc in doc.get('content', [])
                     if url_doc.get('isEmbedded', False)
+                    for index_id in self.page_chunk_ids(url_doc)
                 ]
                 
                 await self.db['kb_docs'].delete_one({'_id': ObjectId(doc_id)})
                 
-                return embedded_sources
+                return embedded_chunk_ids
             else:
                 logging.warning(f"Document with id {doc_id} not found")
                 return []
@@ -53,11 +57,16 @@ class KbDocumentService:
             raise
 
     async def delete_page_by_source(self, doc_id, page_source):
+        """Removes the page and returns the index ids of its chunks if it was embedded."""
         try:
-            await self.db['kb_docs'].update_one(
-                {'_id': ObjectId(doc_id)},
-                {'$pull': {'content': {'metadata.sourceURL': page_source}}}
+            result = await self.db['kb_docs'].find_one_and_update(
+                {'_id': ObjectId(doc_id), 'content.metadata.sourceURL': page_source},
+                {'$pull': {'content': {'metadata.sourceURL': page_source}}},
+                projection={'content.$': 1}
             )
+            if result and result.get('content') and result['content'][0].get('isEmbedded', False):
+                return self.page_chunk_ids(result['content'][0])
+            return []
         except Exception as e:
             logging.error(f"Error deleting page by source: {str(e)}")
             raise
@@ -98,8 +107,8 @@ class KbDocumentService:
     async def save_documents(self, documents, doc_id):
         try:
             update_list = []
-            for page in documents:
-                new_token_count = token_counter(page['content'])
+            token_counts = count_many(page['content'] for page in documents)
+            for page, new_token_count in zip(documents, token_counts):
                 update_list.append({
                     'source': page['source'],
                     'update': {
@@ -125,49 +134,74 @@ class KbDocumentService:
             logging.error(f"Error saving documents: {str(e)}")
             raise
 
-    async def embed_document(self, doc_id, specific_sources=None):
-        if not self.colbert_service:
-            raise ValueError("ColbertService not initialized")
+    @staticmethod
+    def pages_to_embed(doc, specific_sources=None):
+        """Pages of `doc` that still need embedding, or only `specific_sources` when given."""
+        pages = []
+        for url_doc in doc.get('content', []):
+            if specific_sources is None:
+                # If no specific sources are provided, embed all non-embedded content
+                if not url_doc.get('isEmbedded', False):
+                    pages.append(url_doc)
+            elif url_doc['metadata']['sourceURL'] in specific_sources:
+                # If specific sources are provided, only embed those
+                pages.append(url_doc)
+        return pages
 
-        try:
-            doc = await self.db['kb_docs'].find_one({'_id': ObjectId(doc_id)})
-            if not doc:
-                raise ValueError(f"Document with id {doc_id} not found")
-
-            # Determine which content needs to be embedded
-            content_to_embed = []
-            for url_doc in doc['content']:
-                if specific_sources is None:
-                    # If no specific sources are provided, embed all non-embedded content
-                    if not url_doc.get('isEmbedded', False):
-                        content_to_embed.append(url_doc)
-                elif url_doc['metadata']['sourceURL'] in specific_sources:
-                    # If specific sources are provided, only embed those
-                    content_to_embed.append(url_doc)
-
-            if not content_to_embed:
-                return doc  # Nothing to embed
-        
-            prepared_documents = [{'content': doc['content'], 'id': doc['metadata']['sourceURL']} for doc in content_to_embed if 'content' in doc and 'metadata' in doc and 'sourceURL' in doc['metadata']]
-        
-            result = self.colbert_service.process_content(prepared_documents)
-            if 'index_path' in result:
-                await self.update_knowledge_base(index_path=result['index_path'])
-            else:
-                logging.info(f"Documents added to existing index: {result['message']}")
-            
-            # Update the isEmbedded field for processed content
-            update_list = [
-                {
-                    'source': url_doc['metadata']['sourceURL'],
-                    'update': {'content.$.isEmbedded': True}
-                }
-                for url_doc in content_to_embed
-            ]
-            return await self._bulk_update_document(doc_id, update_list)
-        except Exception as e:
-            logging.error(f"Error embedding document: {str(e)}")
-            raise
+    @staticmethod
+    def prepare_for_index(pages):
+        """
+        Splits pages into index documents: one per chunk, with the id
+        `sourceURL#chunk-n` and metadata pointing back at the page.
+        """
+        documents = []
+        for page in pages:
+            if 'content' not in page or 'metadata' not in page or 'sourceURL' not in page['metadata']:
+                continue
+            source = page['metadata']['sourceURL']
+            chunks = chunk_markdown(page['content'] or '')
+            for index, chunk in enumerate(chunks):
+                documents.append({
+                    'id': chunk_id(source, index),
+                    'content': chunk['content'],
+                    'metadata': {
+                        'sourceURL': source,
+                        'title': page['metadata'].get('title'),
+                        'headings': chunk['headings'],
+                        'chunk': index,
+                        'chunk_count': len(chunks),
+                    }
+                })
+        return documents
+
+    @staticmethod
+    def page_chunk_ids(page):
+        """Index ids of an embedded page; pages embedded before chunking were indexed whole, by sourceURL."""
+        source = page['metadata']['sourceURL']
+        if 'chunk_count' not in page:
+            return [source]
+        return [chunk_id(source, index) for index in range(page['chunk_count'])]
+
+    @classmethod
+    def stale_chunk_ids(cls, pages, documents):
+        """Ids left over from an earlier embedding of `pages` that `documents` no longer produce."""
+        new_ids = {document['id'] for document in documents}
+        return [
+            index_id
+            for page in pages
+            if page.get('isEmbedded', False)
+            for index_id in cls.page_chunk_ids(page)
+            if index_id not in new_ids
+        ]
+
+    async def mark_pages_embedded(self, doc_id, documents):
+        """Marks the pages that `documents` were chunked from as embedded and stores their chunk counts."""
+        chunk_counts = Counter(document['metadata']['sourceURL'] for document in documents)
+        update_list = [
+            {'source': source, 'update': {'content.$.isEmbedded': True, 'content.$.chunk_count': count}}
+            for source, count in chunk_counts.items()
+        ]
+        return await self._bulk_update_document(doc_id, update_list)
 
     async def generate_summaries(self, content):
         try:
@@ -230,6 +264,8 @@ class KbDocumentService:
             knowledge_base = await self.db['knowledge_bases'].find_one({'_id': ObjectId(self.kb_id)})
             if knowledge_base:
                 await self.db['knowledge_bases'].update_one({'_id': ObjectId(self.kb_id)}, {'$set': kwargs})
+                if 'index_path' in kwargs:
+                    kb_retriever.invalidate(self.kb_id)
                 return 'knowledge base updated'
             else:
                 return 'knowledge base not found'
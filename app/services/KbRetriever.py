@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.services.ColbertService import ColbertService
+from app.utils.metrics import KB_RETRIEVAL_SECONDS
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+class KbRetriever:
+    """
+    KB search for the chat hot path.
+
+    Each KB's index path is looked up once and kept, with its ColbertService,
+    for `path_ttl` seconds; the loaded models themselves live in the shared
+    ColbertRegistry, so a turn never loads an index that's already in
+    memory. Searches run on a small dedicated thread pool under a
+    `timeout` budget. When it runs out the turn goes on without that KB's
+    context; the search keeps running, so a cold index is loaded for the
+    next turn. Only one search per KB and user is in flight at a time:
+    turns arriving meanwhile (e.g. during a cold load) get no KB context
+    instead of queueing more threads behind it.
+    """
+    _instance: Optional['KbRetriever'] = None
+
+    def __init__(self, timeout: float = 1.5, k: int = 5, path_ttl: float = 60.0, max_threads: int = 4):
+        self.timeout = timeout
+        self.k = k
+        self.path_ttl = path_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='kb-search')
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # (uid, kb_id) -> (index_path, colbert_service, expires_at)
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[str], Optional[ColbertService], float]] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'KbRetriever':
+        if cls._instance is None:
+            cls._instance = cls(
+                timeout=float(os.getenv('KB_RETRIEVAL_TIMEOUT', '1.5')),
+                k=int(os.getenv('KB_RETRIEVAL_K', '5')),
+                path_ttl=float(os.getenv('KB_INDEX_PATH_TTL', '60')),
+                max_threads=int(os.getenv('KB_RETRIEVAL_THREADS', '4'))
+            )
+        return cls._instance
+
+    def invalidate(self, kb_id: str):
+        """Forgets a KB's index path, e.g. after an embed moved it."""
+        for key in [key for key in self._entries if key[1] == kb_id]:
+            self._entries.pop(key, None)
+
+    async def _colbert_service(self, db, uid: str, kb_id: str) -> Optional[ColbertService]:
+        key = (uid, kb_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > time.monotonic():
+            return entry[1]
+
+        try:
+            # Scoped to the uid so a chat can only search its owner's KBs
+            kb = await db['knowledge_bases'].find_one({'_id': ObjectId(kb_id), 'uid': uid}, {'index_path': 1})
+        except InvalidId:
+            logger.warning('Invalid knowledge base id in chat context: %s', kb_id)
+            return None
+        index_path = kb.get('index_path') if kb else None
+        colbert_service = ColbertService(index_path=index_path, uid=uid) if index_path else None
+        self._entries[key] = (index_path, colbert_service, time.monotonic() + self.path_ttl)
+        return colbert_service
+
+    async def search(self, db, uid: str, kb_id: str, query: str, k: Optional[int] = None) -> List[dict]:
+        """Top chunks of the KB for `query`, or [] if it has no index, fails, or runs over budget."""
+        started = time.perf_counter()
+        outcome = 'ok'
+        results = []
+        key = (uid, kb_id)
+        with span('kb.search', kb_id=kb_id) as search_span:
+            try:
+                colbert_service = await self._colbert_service(db, uid, kb_id)
+                if colbert_service is None:
+                    outcome = 'no_index'
+                elif not os.path.exists(colbert_service.index_path):
+                    outcome = 'no_index'
+                    self.invalidate(kb_id)
+                elif key in self._in_flight:
+                    outcome = 'busy'
+                else:
+                    search = asyncio.get_running_loop().run_in_executor(
+                        self._executor, colbert_service.search_index, query, k or self.k
+                    )
+                    self._in_flight[key] = search
+                    search.add_done_callback(lambda done: self._search_finished(key, done))
+                    # Shielded: on timeout the search keeps running and stays in flight
+                    results = await asyncio.wait_for(asyncio.shield(search), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                logger.warning('KB %s search went over the %.1fs budget; answering without it', kb_id, self.timeout)
+            except Exception as e:
+                outcome = 'error'
+                logger.error('KB %s search failed: %s', kb_id, str(e))
+            elapsed = time.perf_counter() - started
+            KB_RETRIEVAL_SECONDS.observe(elapsed, outcome=outcome)
+            search_span.set_attribute('outcome', outcome)
+            search_span.set_attribute('results', len(results))
+            search_span.set_attribute('retrieval_ms', round(elapsed * 1000, 1))
+        return results
+
+    def _search_finished(self, key: Tuple[str, str], search: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not search.cancelled() and search.exception() is not None:
+            # Also marks the error retrieved when the turn stopped waiting at the timeout
+            logger.debug('KB search for %s finished with an error: %s', key[1], search.exception())
+
+kb_retriever = KbRetriever.get_instance()
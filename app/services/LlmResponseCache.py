@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LlmResponseCache:
+    """
+    Content-addressed cache for LLM calls that are pure functions of their input.
+
+    Entries are keyed by sha256(model, signature, inputs). Lookups hit an
+    in-process LRU first, then the `llm_cache` Mongo collection (expired by a
+    TTL index on `expires_at`). Mongo is optional: until `configure` is called
+    with a database the cache is memory-only. Pass `bypass=True` to skip the
+    cache for a single call; the fresh result is still stored.
+    """
+    _instance: Optional['LlmResponseCache'] = None
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection = None
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.stats = {'memory_hits': 0, 'mongo_hits': 0, 'misses': 0, 'bypassed': 0, 'errors': 0}
+
+    @classmethod
+    def get_instance(cls) -> 'LlmResponseCache':
+        if cls._instance is None:
+            cls._instance = cls(
+                max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024')),
+                ttl_seconds=int(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+            )
+        return cls._instance
+
+    def configure(self, db):
+        self.collection = db['llm_cache']
+
+    @staticmethod
+    def make_key(model: str, signature: str, inputs: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {'model': model, 'signature': signature, 'inputs': inputs},
+            sort_keys=True,
+            default=str,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def get_or_compute(self, model: str, signature: str, inputs: Dict[str, Any], compute: Callable[[], Any], bypass: bool = False) -> Any:
+        """
+        Returns the cached result for (model, signature, inputs) or computes and
+        stores it. `compute` may be async or sync; sync callables run in a
+        worker thread so blocking SDK calls don't stall the event loop.
+        """
+        key = self.make_key(model, signature, inputs)
+
+        if bypass:
+            self.stats['bypassed'] += 1
+        else:
+            found, value = await self._get(key)
+            if found:
+                return value
+            self.stats['misses'] += 1
+
+        value = await self._compute(compute)
+        await self._set(key, value, model, signature)
+        return value
+
+    def hit_ratio(self) -> float:
+        hits = self.stats['memory_hits'] + self.stats['mongo_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+    async def _compute(self, compute: Callable[[], Any]) -> Any:
+        if inspect.iscoroutinefunction(compute):
+            return await compute()
+        result = await asyncio.to_thread(compute)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return True, value
+            del self._entries[key]
+
+        if self.collection is None:
+            return False, None
+
+        try:
+            doc = await self.collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.now(timezone.utc)}})
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning('LLM cache lookup failed: %s', str(e))
+            return False, None
+
+        if doc is None:
+            return False, None
+        self.stats['mongo_hits'] += 1
+        self._remember(key, doc['value'])
+        return True, doc['value']
+
+    async def _set(self, key: str, value: Any, model: str, signature: str):
+        self._remember(key, value)
+        if self.collection is None:
+            return
+
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {'_id': key},
+                {'$set': {
+                    'value': value,
+                    'model': model,
+                    'signature': signature,
+                    'created_at': now,
+                    'expires_at': now + timedelta(seconds=self.ttl_seconds)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning('LLM cache write failed: %s', str(e))
+
+    def _remember(self, key: str, value: Any):
+        self._entries[key] = (time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+llm_response_cache = LlmResponseCache.get_instance()
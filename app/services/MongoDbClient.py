@@ -1,7 +1,39 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from dotenv import load_dotenv
 import os
 import logging
+from app.utils.metrics import MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES
+
+# Handshake and session housekeeping commands that aren't interesting as latency
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'buildInfo'}
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records MongoDB command latency per collection and command name."""
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        else:
+            collection = event.command.get(event.command_name)
+        self._collections[(event.request_id, event.connection_id)] = collection if isinstance(collection, str) else event.database_name
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), None)
+        if collection is not None:
+            MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), None)
+        if collection is not None:
+            MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+            MONGO_COMMAND_FAILURES.inc(collection=collection, command=event.command_name)
+
+command_metrics_listener = CommandMetricsListener()
 
 class MongoDbClient:
     def __init__(self, db_name):
@@ -22,7 +54,7 @@ class MongoDbClient:
         if not self._client:
             self.logger.info("Attempting to connect to MongoDB at %s", self.mongo_uri)
             try:
-                self._client = AsyncIOMotorClient(self.mongo_uri)
+                self._client = AsyncIOMotorClient(self.mongo_uri, event_listeners=[command_metrics_listener])
                 self._db = self._client[self.db_name]
                 self.logger.info("Successfully connected to MongoDB database: %s", self.db_name)
             except Exception as e:
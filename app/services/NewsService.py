@@ -1,11 +1,13 @@
+import asyncio
+from functools import partial
 import os
 from dotenv import load_dotenv
 import requests
-from newspaper import Article
 import http.client
 import json
 from bson.objectid import ObjectId
 from ..agents.OpenAiClient import OpenAiClient
+from .LlmResponseCache import llm_response_cache
 
 load_dotenv()
 
@@ -16,8 +18,17 @@ class NewsService:
         self.client = OpenAiClient(db, uid)
         self.apikey = os.getenv('GNEWS_API_KEY')
 
-    def pass_to_news_agent(self, article_to_summarize, model='gpt-4o-mini'):
-        response = self.client.generate_chat_completion(
+    async def pass_to_news_agent(self, article_to_summarize, model='gpt-4o-mini', bypass_cache=False):
+        return await llm_response_cache.get_or_compute(
+            model,
+            'news_summary',
+            {'article': article_to_summarize},
+            partial(self._summarize_article, article_to_summarize, model),
+            bypass=bypass_cache
+        )
+
+    async def _summarize_article(self, article_to_summarize, model):
+        response = await self.client.generate_chat_completion(
             model=model,
             messages=[
                 {
@@ -27,7 +38,7 @@ class NewsService:
             ],
         )
         
-        return response
+        return response.content
     
     def get_article_urls(self, query):
         conn = http.client.HTTPSConnection("google.serper.dev")
@@ -43,7 +54,15 @@ class NewsService:
         urls = [item['link'] for item in data.get('organic', [])]
         return urls
 
-    def summarize_articles(self, article_urls):
+    def _fetch_article(self, session, article_url, headers):
+        from newspaper import Article
+        response = session.get(article_url, headers=headers, timeout=10)
+        article = Article(article_url)
+        article.download()
+        article.parse()
+        return response, article
+
+    async def summarize_articles(self, article_urls, bypass_cache=False):
         summarized_articles = []
 
         headers = {
@@ -54,10 +73,7 @@ class NewsService:
 
         for article_url in article_urls:
             try:
-                response = session.get(article_url, headers=headers, timeout=10)
-                article = Article(article_url)
-                article.download()
-                article.parse()
+                response, article = await asyncio.to_thread(self._fetch_article, session, article_url, headers)
             except Exception as exception:
                 print(f"Error occurred while fetching article at {article_url}: {exception}")
                 continue
@@ -84,7 +100,7 @@ class NewsService:
             Write a summary of the previous article.
             """
             
-            summary = self.pass_to_news_agent(template)
+            summary = await self.pass_to_news_agent(template, bypass_cache=bypass_cache)
 
             # Create article dictionary
             article_dict = {
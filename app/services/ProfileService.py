@@ -1,3 +1,7 @@
+from app.agents.client_registry import client_registry
+
+API_KEY_FIELDS = ('open_key', 'anthropic_key')
+
 class ProfileService:
     def __init__(self, db=None, uid=None):
         self.db = db
@@ -16,6 +20,7 @@ class ProfileService:
     
     async def update_user_profile(self, uid, updates):
         users_collection = self.db['users']
+        key_changed = any(field in updates for field in API_KEY_FIELDS)
        
         if 'topics' in updates:
             topics_list = [topic.lower().strip() for topic in updates['topics']]
@@ -39,4 +44,8 @@ class ProfileService:
         else:
             # Create new user
             updates['_id'] = uid  # Ensure the document has the UID as its _id
-            await users_collection.insert_one(updates)
\ No newline at end of file
+            await users_collection.insert_one(updates)
+
+        if key_changed:
+            # Cached SDK clients were built with the old key
+            client_registry.invalidate(uid)
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import pickle
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+from bson.binary import Binary
+from bson.objectid import ObjectId
+from bson.timestamp import Timestamp
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process so subscribers can skip their own messages
+WORKER_ID = uuid.uuid4().hex
+
+class Broker(ABC):
+    """Minimal pub/sub used to fan events out across worker processes."""
+
+    @abstractmethod
+    async def publish(self, channel: str, data: Any):
+        pass
+
+    @abstractmethod
+    def listen(self, channel: str) -> AsyncIterator[Any]:
+        """Async iterator over messages published to `channel` after the call."""
+        pass
+
+    async def close(self):
+        pass
+
+class LocalBroker(Broker):
+    """
+    In-process broker. Every subscriber gets its own queue, so several
+    managers in one process behave like separate workers; useful for
+    single-process deployments and local testing.
+    """
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def publish(self, channel: str, data: Any):
+        for queue in self._subscribers.get(channel, []):
+            queue.put_nowait(data)
+
+    async def listen(self, channel: str) -> AsyncIterator[Any]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].remove(queue)
+
+class MongoBroker(Broker):
+    """
+    Broker backed by a capped collection. Publishers insert documents and
+    each subscriber follows the collection with a tailable cursor, so it
+    needs no infrastructure beyond the MongoDB deployment we already use.
+    Payloads are pickled, as python-socketio's own pub/sub managers do.
+
+    Documents carry a server-assigned `ts` timestamp, which increases in
+    insertion order across all workers (ObjectIds from different processes
+    don't), so a restarted cursor can resume with `ts > last_ts`.
+    """
+    def __init__(self, db, collection: str = 'pubsub', size_bytes: int = 16 * 1024 * 1024, poll_interval: float = 0.5):
+        self.db = db
+        self.collection_name = collection
+        self.size_bytes = size_bytes
+        self.poll_interval = poll_interval
+        self._ready = False
+        self._ready_lock = asyncio.Lock()
+
+    async def _ensure_collection(self):
+        if self._ready:
+            return
+        async with self._ready_lock:
+            if self._ready:
+                return
+            try:
+                await self.db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+            except CollectionInvalid:
+                pass  # already created by another worker
+            collection = self.db[self.collection_name]
+            if await collection.estimated_document_count() == 0:
+                # A tailable cursor on an empty capped collection dies immediately
+                await self._insert(None, None)
+            self._ready = True
+
+    async def _insert(self, channel: Optional[str], payload: Optional[Binary]):
+        # Upsert so the server stamps `ts`; plain inserts can't use $currentDate
+        await self.db[self.collection_name].update_one(
+            {'_id': ObjectId()},
+            {
+                '$set': {'channel': channel, 'payload': payload, 'created_at': datetime.now(timezone.utc)},
+                '$currentDate': {'ts': {'$type': 'timestamp'}}
+            },
+            upsert=True
+        )
+
+    async def publish(self, channel: str, data: Any):
+        await self._ensure_collection()
+        await self._insert(channel, Binary(pickle.dumps(data)))
+
+    async def listen(self, channel: str) -> AsyncIterator[Any]:
+        await self._ensure_collection()
+        collection = self.db[self.collection_name]
+        # Start after the newest document so earlier messages aren't replayed
+        last = await collection.find_one({}, sort=[('$natural', -1)], projection={'ts': 1})
+        last_ts = last.get('ts', Timestamp(0, 0)) if last else Timestamp(0, 0)
+
+        while True:
+            cursor = collection.find({'ts': {'$gt': last_ts}}, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive:
+                    async for document in cursor:
+                        last_ts = document['ts']
+                        if document.get('channel') != channel:
+                            continue
+                        try:
+                            yield pickle.loads(document['payload'])
+                        except Exception as e:
+                            logger.warning('Dropping undecodable pub/sub message: %s', str(e))
+            except Exception as e:
+                logger.warning('Pub/sub cursor on %s failed: %s', self.collection_name, str(e))
+            finally:
+                await cursor.close()
+            # The cursor dies if the capped collection rolled over past it
+            await asyncio.sleep(self.poll_interval)
+
+_broker: Optional[Broker] = None
+
+def get_broker() -> Optional[Broker]:
+    """
+    Returns the process-wide broker selected by PUBSUB_BACKEND: 'mongo' for
+    multi-worker deployments, 'local' for a single process. Unset means
+    no fan-out, which is only correct with a single worker.
+    """
+    global _broker
+    if _broker is None:
+        backend = os.getenv('PUBSUB_BACKEND', '').lower()
+        if backend == 'mongo':
+            from app.services.MongoDbClient import MongoDbClient
+            _broker = MongoBroker(MongoDbClient('paxxium').db, os.getenv('PUBSUB_COLLECTION', 'pubsub'))
+        elif backend == 'local':
+            _broker = LocalBroker()
+        elif backend:
+            logger.warning('Unknown PUBSUB_BACKEND %r, running without pub/sub', backend)
+    return _broker
@@ -0,0 +1,227 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+BASE = 'base'
+
+# builder(index_name, documents) -> path of a new ColBERT index holding `documents`
+Builder = Callable[[str, List[dict]], str]
+# searcher(index_path, query, k) -> ragatouille search results
+Searcher = Callable[[str, str, int], List[dict]]
+
+class SegmentedIndex:
+    """
+    A KB index made of several ColBERT indexes, tracked by a manifest.
+
+    The first segment is the base; new pages go into small delta segments,
+    so adding ten pages costs a ten-page index build instead of a PLAID
+    rebuild of the whole KB. `live` maps each document id to the segment
+    holding its current copy; search results from any other segment are
+    dropped, which is how re-embedded pages shadow their old copy. Deleting
+    only drops ids from `live` and records them as tombstones (copies that
+    still exist on disk), so a delete is one manifest write.
+
+    When segments, tombstones or delta size pass the thresholds,
+    `needs_compaction` turns true and `compact` rebuilds a single base from
+    the live documents. Manifest writes are atomic and serialized with a
+    file lock, since the compactor runs in another process.
+
+    Indexes created before this layout are adopted as an untracked base:
+    their document ids aren't known, so anything not in `live` or in the
+    tombstones counts as live in the base.
+    """
+    max_segments = int(os.getenv('COLBERT_COMPACT_MAX_SEGMENTS', '8'))
+    max_dead_ratio = float(os.getenv('COLBERT_COMPACT_DEAD_RATIO', '0.2'))
+    max_delta_ratio = float(os.getenv('COLBERT_COMPACT_DELTA_RATIO', '0.5'))
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+
+    @staticmethod
+    def is_segmented(path: Optional[str]) -> bool:
+        return bool(path) and os.path.isfile(os.path.join(path, MANIFEST))
+
+    @classmethod
+    def create(cls, path: str, documents: List[dict], builder: Builder) -> 'SegmentedIndex':
+        index = cls(path)
+        os.makedirs(path, exist_ok=True)
+        segment_path = builder(f'{index.name}-{BASE}-1', documents)
+        index._write({
+            'generation': 1,
+            'untracked_base': False,
+            'segments': [index._segment(f'{BASE}-1', segment_path, len(documents))],
+            'live': {document['id']: f'{BASE}-1' for document in documents},
+            'tombstones': [],
+        })
+        return index
+
+    @classmethod
+    def adopt(cls, path: str, legacy_index_path: str, document_count: int = 0) -> 'SegmentedIndex':
+        """Wraps an existing single ColBERT index as the base of a new segmented index."""
+        index = cls(path)
+        os.makedirs(path, exist_ok=True)
+        index._write({
+            'generation': 1,
+            'untracked_base': True,
+            'segments': [index._segment(f'{BASE}-0', legacy_index_path, document_count)],
+            'live': {},
+            'tombstones': [],
+        })
+        return index
+
+    @staticmethod
+    def _segment(name: str, path: str, doc_count: int) -> dict:
+        return {'name': name, 'path': path, 'doc_count': doc_count, 'created_at': datetime.now(timezone.utc).isoformat()}
+
+    def manifest(self) -> dict:
+        with open(os.path.join(self.path, MANIFEST), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+
+    def _write(self, manifest: dict):
+        target = os.path.join(self.path, MANIFEST)
+        temporary = f'{target}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(temporary, target)
+
+    @contextmanager
+    def _locked(self):
+        """Yields the current manifest for read-modify-write; it's saved on exit."""
+        with open(os.path.join(self.path, 'manifest.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                manifest = self.manifest()
+                yield manifest
+                manifest['generation'] += 1
+                self._write(manifest)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, documents: List[dict], builder: Builder, stale_ids: Iterable[str] = ()) -> str:
+        """
+        Indexes `documents` into a new delta segment and returns the segment
+        name. `stale_ids` (e.g. the trailing chunks of a page that got
+        shorter) are tombstoned in the same manifest write.
+        """
+        generation = self.manifest()['generation'] + 1
+        name = f'seg-{generation}'
+        # Build outside the lock: it's the slow part, and deletes shouldn't wait for it
+        segment_path = builder(f'{self.name}-{name}', documents)
+        with self._locked() as manifest:
+            for document in documents:
+                previous = manifest['live'].get(document['id'])
+                if previous is not None or manifest['untracked_base']:
+                    # The older copy stays on disk until compaction
+                    manifest['tombstones'].append(document['id'])
+                manifest['live'][document['id']] = name
+            for doc_id in stale_ids:
+                manifest['live'].pop(doc_id, None)
+                manifest['tombstones'].append(doc_id)
+            manifest['segments'].append(self._segment(name, segment_path, len(documents)))
+            manifest['tombstones'] = sorted(set(manifest['tombstones']))
+        logger.info('Added %d documents to %s as %s', len(documents), self.path, name)
+        return name
+
+    def delete(self, doc_ids: List[str]) -> int:
+        """Tombstones `doc_ids`; returns how many were live."""
+        removed = 0
+        with self._locked() as manifest:
+            for doc_id in doc_ids:
+                if manifest['live'].pop(doc_id, None) is not None or manifest['untracked_base']:
+                    removed += 1
+            manifest['tombstones'] = sorted(set(manifest['tombstones']) | set(doc_ids))
+        return removed
+
+    @staticmethod
+    def _is_live(manifest: dict, tombstones: set, segment: str, doc_id: str) -> bool:
+        owner = manifest['live'].get(doc_id)
+        if owner is not None:
+            return owner == segment
+        return manifest['untracked_base'] and segment == manifest['segments'][0]['name'] and doc_id not in tombstones
+
+    def search(self, query: str, k: int, searcher: Searcher) -> List[dict]:
+        manifest = self.manifest()
+        tombstones = set(manifest['tombstones'])
+        # Ask for extra hits so dropping shadowed copies still leaves k
+        wanted = k + min(len(tombstones), 4 * k)
+        results = []
+        for segment in manifest['segments']:
+            segment_k = min(segment['doc_count'], wanted) if segment['doc_count'] > 0 else wanted
+            for result in searcher(segment['path'], query, segment_k) or []:
+                if self._is_live(manifest, tombstones, segment['name'], result.get('document_id')):
+                    results.append(result)
+        results.sort(key=lambda result: result['score'], reverse=True)
+        merged = results[:k]
+        for rank, result in enumerate(merged, start=1):
+            result['rank'] = rank
+        return merged
+
+    def needs_compaction(self) -> bool:
+        manifest = self.manifest()
+        segments = manifest['segments']
+        base_count = max(segments[0]['doc_count'], 1)
+        delta_count = sum(segment['doc_count'] for segment in segments[1:])
+        total = base_count + delta_count
+        return (
+            len(segments) > self.max_segments
+            or len(manifest['tombstones']) / total > self.max_dead_ratio
+            or delta_count / base_count > self.max_delta_ratio
+        )
+
+    def compact(self, documents: List[dict], builder: Builder) -> List[str]:
+        """
+        Rebuilds the base from `documents` (every live document, read from
+        the source of truth) and drops the segments it replaces. Segments
+        added or ids deleted while the build ran are carried over. Returns
+        the paths of the replaced segments.
+        """
+        snapshot = self.manifest()
+        replaced = {segment['name'] for segment in snapshot['segments']}
+        name = f"{BASE}-{snapshot['generation'] + 1}"
+        base_path = builder(f'{self.name}-{name}', documents)
+        compacted = {document['id'] for document in documents}
+
+        with self._locked() as manifest:
+            kept = [segment for segment in manifest['segments'] if segment['name'] not in replaced]
+            live = {}
+            for doc_id, owner in manifest['live'].items():
+                if owner not in replaced:
+                    live[doc_id] = owner
+                elif doc_id in compacted:
+                    live[doc_id] = name
+            # Ids new to the manifest: an adopted base's documents, only known
+            # now, or pages indexed whole before chunking that now come as chunks
+            for doc_id in compacted - set(manifest['tombstones']):
+                live.setdefault(doc_id, name)
+            old_paths = [segment['path'] for segment in manifest['segments'] if segment['name'] in replaced]
+            manifest['segments'] = [self._segment(name, base_path, len(documents))] + kept
+            manifest['live'] = live
+            # Deleted during the build, or superseded by a kept segment: copies still in the new base
+            manifest['tombstones'] = sorted(doc_id for doc_id in compacted if live.get(doc_id) != name)
+            manifest['untracked_base'] = False
+
+        for path in old_paths:
+            shutil.rmtree(path, ignore_errors=True)
+        logger.info('Compacted %s into %s (%d documents, %d segments kept)', self.path, name, len(documents), len(kept))
+        return old_paths
+
+    def segment_paths(self) -> List[str]:
+        return [segment['path'] for segment in self.manifest()['segments']]
+
+    def destroy(self) -> List[str]:
+        paths = self.segment_paths()
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+        shutil.rmtree(self.path, ignore_errors=True)
+        return paths
@@ -1,4 +1,31 @@
 import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from app.services.PubSubBroker import Broker, get_broker
+from app.utils.metrics import SOCKET_EMITS
+
+class BrokerClientManager(AsyncPubSubManager):
+    """
+    Socket.IO client manager that relays emits, room changes and
+    disconnects to the other workers through a pub/sub Broker.
+    """
+    name = 'broker'
+
+    def __init__(self, broker: Broker, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.broker = broker
+
+    async def _publish(self, data):
+        await self.broker.publish(self.channel, data)
+
+    async def _listen(self):
+        async for message in self.broker.listen(self.channel):
+            yield message
+
+class InstrumentedAsyncServer(socketio.AsyncServer):
+    """AsyncServer that counts emits per event name for /metrics."""
+    async def emit(self, event, *args, **kwargs):
+        SOCKET_EMITS.inc(event=event)
+        return await super().emit(event, *args, **kwargs)
 
 class SocketClient:
     _instance = None
@@ -6,7 +33,14 @@ class SocketClient:
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', max_http_buffer_size=1e8)
+            broker = get_broker()
+            client_manager = BrokerClientManager(broker) if broker else None
+            cls._instance = InstrumentedAsyncServer(
+                async_mode='asgi',
+                cors_allowed_origins='*',
+                max_http_buffer_size=1e8,
+                client_manager=client_manager
+            )
         return cls._instance
 
-socket_client = SocketClient.get_instance()
\ No newline at end of file
+socket_client = SocketClient.get_instance()
@@ -1,5 +1,4 @@
 import os
-import paramiko
 
 class SSHManager:
     def __init__(self, is_dev_mode, logger):
@@ -9,6 +8,7 @@ class SSHManager:
 
     def _get_ssh_client(self):
         try:
+            import paramiko
             ssh = paramiko.SSHClient()
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             ssh_key_path = os.path.expanduser('~/.ssh/abyssus')
@@ -4,11 +4,14 @@ import asyncio
 import logging
 import os
 from dotenv import load_dotenv
-from app.utils.token_counter import token_counter
+from app.utils.token_counter import count_many
 from app.services.System.SSHManager import SSHManager
 from app.services.System.ConfigFileManager import ConfigFileManager
 from app.services.System.ServiceValidator import ServiceValidator
 from app.services.System.SystemConfigDatabase import SystemConfigDatabase
+from app.services.PubSubBroker import WORKER_ID, get_broker
+
+STATE_CHANNEL = 'system_state'
 
 load_dotenv(override=True)
 
@@ -30,6 +33,8 @@ class SystemStateManager:
         self.ssh_manager = SSHManager(self.is_dev_mode, self.logger)
         self.config_file_manager = ConfigFileManager(self.is_dev_mode, self.logger)
         self.service_validator = None  # Will be initialized after loading config
+        self.worker_id = WORKER_ID
+        self._sync_task: Optional[asyncio.Task] = None
 
     @classmethod
     async def get_instance(cls, db) -> 'SystemStateManager':
@@ -38,8 +43,37 @@ class SystemStateManager:
                 if not cls._instance:
                     cls._instance = cls(db)
                     await cls._instance.initialize()
+                    cls._instance.start_state_sync()
         return cls._instance
 
+    def start_state_sync(self):
+        """Reload state whenever another worker reports a change (multi-worker mode only)"""
+        broker = get_broker()
+        if broker and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._listen_for_state_changes(broker))
+
+    async def _listen_for_state_changes(self, broker):
+        while True:
+            try:
+                async for message in broker.listen(STATE_CHANNEL):
+                    if message.get('worker') == self.worker_id:
+                        continue
+                    self.logger.info("Reloading system state after change on worker %s", message.get('worker'))
+                    await self.initialize()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error("System state sync failed: %s", str(e))
+                await asyncio.sleep(1)
+
+    async def _notify_state_changed(self):
+        broker = get_broker()
+        if broker:
+            try:
+                await broker.publish(STATE_CHANNEL, {'worker': self.worker_id})
+            except Exception as e:
+                self.logger.error("Failed to publish system state change: %s", str(e))
+
     async def initialize(self):
         """Load initial configuration from database"""
         # Find all documents in the collection
@@ -67,6 +101,7 @@ class SystemStateManager:
                 self.config_files[file_obj['path']]['restart_command'] = file_obj['restart_command']
             if 'test_command' in file_obj:
                 self.config_files[file_obj['path']]['test_command'] = file_obj['test_command']
+        await self._notify_state_changed()
 
     async def get_config_files(self):
         """Fetch config files from database"""
@@ -114,13 +149,14 @@ class SystemStateManager:
                 category_contents[category] += f"{path}\n{content}\n\n"
 
             # Create combined files collection
+            token_counts = count_many(category_contents.values())
             combined_files = [
                 {
                     "category": category,
                     "content": content,
-                    "token_count": token_counter(content)
+                    "token_count": token_count
                 }
-                for category, content in category_contents.items()
+                for (category, content), token_count in zip(category_contents.items(), token_counts)
             ]
 
             # Update database
@@ -152,6 +188,7 @@ class SystemStateManager:
                     "restart_command": file_obj.get('restart_command'),
                     "test_command": file_obj.get('test_command')
                 }
+                await self._notify_state_changed()
                 
                 self.logger.info(f"Database update result: matched={update_result.matched_count}, modified={update_result.modified_count}")
                 
@@ -208,6 +245,7 @@ class SystemStateManager:
         ssh_client = self.ssh_manager.get_client() if self.is_dev_mode else None
         try:
             await self.config_db.update_or_insert_file(path, content, category)
+            await self._notify_state_changed()
             return await self.config_file_manager.create_file(path, ssh_client)
         finally:
             if ssh_client:
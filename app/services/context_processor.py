@@ -1,7 +1,9 @@
-from app.services.providers import ChatExtractionProvider, ChatSettingsProvider
+from app.services.providers import ChatExtractionProvider, ChatSettingsProvider, ChatKnowledgeBaseProvider
 from app.services.ExtractionService import ExtractionService
 from app.services.ContextManagerService import ContextManagerService
+from app.utils.tracing import traced
 
+@traced('process_chat_context')
 async def process_chat_context(db, uid, chat_id, context, user_message, chat_service, chat_settings, agent):
     if not context:
         return
@@ -13,7 +15,8 @@ async def process_chat_context(db, uid, chat_id, context, user_message, chat_ser
     
     context_manager = ContextManagerService(
         extraction_provider=extraction_provider,
-        settings_provider=settings_provider
+        settings_provider=settings_provider,
+        kb_provider=ChatKnowledgeBaseProvider(db, uid)
     )
     
     context_results = await context_manager.process_context(context, user_message)
@@ -13,4 +13,9 @@ class ExtractionProvider(ABC):
 class SettingsProvider(ABC):
     @abstractmethod
     async def update_settings(self, **kwargs) -> None:
-        pass
\ No newline at end of file
+        pass
+
+class KnowledgeBaseProvider(ABC):
+    @abstractmethod
+    async def search(self, kb_id: str, query: str) -> List[Dict]:
+        pass
@@ -1,7 +1,8 @@
 from typing import List, Dict
-from app.services.interfaces import ExtractionProvider, SettingsProvider
+from app.services.interfaces import ExtractionProvider, SettingsProvider, KnowledgeBaseProvider
 from app.services.ExtractionService import ExtractionService
 from app.services.ChatService import ChatService
+from app.services.KbRetriever import kb_retriever
 
 class ChatExtractionProvider(ExtractionProvider):
     def __init__(self, extraction_service: ExtractionService):
@@ -19,4 +20,12 @@ class ChatSettingsProvider(SettingsProvider):
         self.chat_id = chat_id
     
     async def update_settings(self, **kwargs) -> None:
-        await self.chat_service.update_settings(self.chat_id, **kwargs)
\ No newline at end of file
+        await self.chat_service.update_settings(self.chat_id, **kwargs)
+
+class ChatKnowledgeBaseProvider(KnowledgeBaseProvider):
+    def __init__(self, db, uid: str):
+        self.db = db
+        self.uid = uid
+
+    async def search(self, kb_id: str, query: str) -> List[Dict]:
+        return await kb_retriever.search(self.db, self.uid, kb_id, query)
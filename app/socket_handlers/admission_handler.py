@@ -0,0 +1,32 @@
+import time
+from contextlib import asynccontextmanager
+from app.agents.admission_controller import admission_controller, AdmissionRejected
+from app.utils.tracing import span
+
+@asynccontextmanager
+async def generation_slot(sio, sid, boss_agent, uid, chat_id):
+    """
+    Holds an admission slot for the agent's provider/model while a reply is
+    generated, telling the requesting socket its place in the queue.
+    """
+    async def notify_position(position, estimated_wait):
+        await sio.emit('queue_position', {
+            'chatId': chat_id,
+            'position': position,
+            'estimated_wait': round(estimated_wait, 1)
+        }, room=sid)
+
+    provider = getattr(boss_agent.ai_client, 'provider', 'unknown')
+    with span('admission.slot', provider=provider, model=boss_agent.model) as slot_span:
+        requested_at = time.perf_counter()
+        async with admission_controller.slot(provider, boss_agent.model, uid, on_position=notify_position):
+            slot_span.set_attribute('queue_wait_ms', round((time.perf_counter() - requested_at) * 1000, 1))
+            yield
+
+async def emit_rejection(sio, sid, chat_id, rejection: AdmissionRejected):
+    await sio.emit('error', {
+        'error': rejection.reason,
+        'type': 'server_busy',
+        'chatId': chat_id,
+        'retry_after': round(rejection.retry_after, 1)
+    }, room=sid)
@@ -4,16 +4,31 @@ import traceback
 from app.services.ChatService import ChatService
 from app.services.ProfileService import ProfileService
 from app.agents.BossAgent import BossAgent, BossAgentConfig
+from app.agents.chat_history_manager import DefaultChatHistoryManager, SummarizingChatHistoryManager, create_llm_summarizer
 from app.agents.AnthropicClient import AnthropicClient
 from app.agents.OpenAiClient import OpenAiClient
 from app.services.context_processor import process_chat_context
+from app.socket_handlers.room_handler import subscribe_to_chat
+from app.socket_handlers.admission_handler import generation_slot, emit_rejection
+from app.agents.admission_controller import AdmissionRejected
+from app.agents.generation_registry import generation_registry
+from app.utils.tracing import span, current_trace_id
 
 def initialize_services(db, uid):
     chat_service = ChatService(db)
     profile_service = ProfileService(db, uid)
     return chat_service, profile_service
 
-def create_boss_agent(chat_settings, sio, db, uid, profile_service):
+def create_chat_history_manager(chat_settings, chat_service, db, uid):
+    if not chat_settings.get('summarize_history'):
+        return None
+    return SummarizingChatHistoryManager(
+        create_llm_summarizer(OpenAiClient(db, uid)),
+        DefaultChatHistoryManager(),
+        summary_store=chat_service
+    )
+
+def create_boss_agent(chat_settings, sio, db, uid, profile_service, chat_history_manager=None):
     if not chat_settings:
         return None
 
@@ -33,7 +48,7 @@ def create_boss_agent(chat_settings, sio, db, uid, profile_service):
         model=model,
         system_message=system_message,
         user_analysis=user_analysis,
-    ))
+    ), chat_history_manager)
 
     return boss_agent
 
@@ -41,7 +56,7 @@ async def handle_chat(sio, sid, data, mongo_client):
     try:
         chat_settings = data.get('selectedChat', None)
         if not chat_settings:
-            await sio.emit('error', {"error": "Chat settings are missing"})
+            await sio.emit('error', {"error": "Chat settings are missing"}, room=sid)
             return
 
         uid = chat_settings.get('uid')
@@ -49,26 +64,33 @@ async def handle_chat(sio, sid, data, mongo_client):
         messages = chat_settings.get('messages', [])
         context = chat_settings.get('context', [])
         if not uid or not chat_id or not messages:
-            await sio.emit('error', {"error": "Missing required chat parameters"})
+            await sio.emit('error', {"error": "Missing required chat parameters"}, room=sid)
             return
         
         user_message = messages[-1] if messages else None
         if not user_message:
-            await sio.emit('error', {"error": "Message content is missing"})
+            await sio.emit('error', {"error": "Message content is missing"}, room=sid)
             return
 
+        room = await subscribe_to_chat(sio, sid, uid, chat_id)
         db = mongo_client.db
         chat_service, profile_service = initialize_services(db, uid)
-        boss_agent = create_boss_agent(chat_settings, sio, db, uid, profile_service)
+        chat_history_manager = create_chat_history_manager(chat_settings, chat_service, db, uid)
+        boss_agent = create_boss_agent(chat_settings, sio, db, uid, profile_service, chat_history_manager)
 
-        await chat_service.create_message(chat_id, 'user', user_message.get('content'))
+        stored_message = await chat_service.create_message(chat_id, 'user', user_message.get('content'))
+        user_message.setdefault('token_count', stored_message['token_count'])
         
         async def save_agent_message(chat_id, message):
             await chat_service.create_message(chat_id, 'agent', message)
 
-        await process_chat_context(db, uid, chat_id, context, user_message, chat_service, chat_settings, boss_agent)
-        await boss_agent.process_message(chat_settings['messages'], chat_id, save_agent_message)
+        with generation_registry.track(chat_id, uid):
+            await process_chat_context(db, uid, chat_id, context, user_message, chat_service, chat_settings, boss_agent)
+            async with generation_slot(sio, sid, boss_agent, uid, chat_id):
+                await boss_agent.process_message(chat_settings['messages'], chat_id, save_agent_message, room=room)
 
+    except AdmissionRejected as rejection:
+        await emit_rejection(sio, sid, chat_id, rejection)
     except Exception as e:
         # Get the full stack trace
         exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -78,12 +100,14 @@ async def handle_chat(sio, sid, data, mongo_client):
             "error": str(e),
             "type": exc_type.__name__,
             "stack_trace": stack_trace,
-            "location": "handle_chat"
+            "location": "handle_chat",
+            "trace_id": current_trace_id()
         }
         print(f"Error details: {json.dumps(error_details, indent=2)}")
-        await sio.emit('error', error_details)
+        await sio.emit('error', error_details, room=sid)
 
 def setup_chat_handlers(sio, mongo_client):
     @sio.on('chat_response')
     async def chat_handler(sid, data):
-        await handle_chat(sio, sid, data, mongo_client)
\ No newline at end of file
+        with span('socket.chat_response', sid=sid):
+            await handle_chat(sio, sid, data, mongo_client)
\ No newline at end of file
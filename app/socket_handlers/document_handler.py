@@ -1,7 +1,6 @@
-from uuid import uuid4
-from app.services.KnowledgeBaseService import KnowledgeBaseService
 from app.services.KbDocumentService import KbDocumentService
-from app.services.ColbertService import ColbertService
+from app.services.EmbeddingJobQueue import embedding_job_queue
+from app.socket_handlers.room_handler import user_room
 
 
 async def process_document(sio, sid, data, mongo_client):
@@ -12,7 +11,6 @@ async def process_document(sio, sid, data, mongo_client):
         operation = data.get('operation', 'embed')
 
         db = mongo_client.db
-        kb_service = KnowledgeBaseService(db, uid, kb_id)
         kb_document_service = KbDocumentService(db, kb_id)
 
         if operation == 'save':
@@ -23,20 +21,17 @@ async def process_document(sio, sid, data, mongo_client):
             result = await save_document(kb_document_service, documents_to_change, doc_id)
             await sio.emit('save_complete', {"status": "success", "result": result}, room=sid)
         elif operation == 'embed':
-            process_id = str(uuid4())
-            index_path = kb_service.get_index_path()
-            colbert_service = ColbertService(index_path=index_path, uid=uid)
-            kb_document_service.set_colbert_service(colbert_service)
-
-            sio.start_background_task(
-                process_and_update_client,
-                sio,
-                sid,
-                process_id,
-                kb_document_service,
-                doc_id
-            )
-            await sio.emit('process_started', {"process_id": process_id}, room=sid)
+            if not doc_id or not uid:
+                await sio.emit('error', {"error": "UID and Doc ID are required for embed operation"}, room=sid)
+                return
+            # Progress is sent to the user's room, so it survives reconnects and reaches other tabs
+            await sio.enter_room(sid, user_room(uid))
+            job, created = await embedding_job_queue.enqueue(uid, kb_id, doc_id, data.get('sources'))
+            await sio.emit('process_started', {
+                "process_id": job['id'],
+                "status": job['state'],
+                "deduplicated": not created
+            }, room=sid)
         else:
             await sio.emit('error', {"error": f"Invalid operation: {operation}"}, room=sid)
 
@@ -44,23 +39,9 @@ async def process_document(sio, sid, data, mongo_client):
         await sio.emit('error', {"error": str(e)}, room=sid)
 
 async def save_document(kb_document_service, content, doc_id):
-    return kb_document_service.save_documents(content, doc_id)
-
-async def process_and_update_client(
-    sio,
-    sid,
-    process_id,
-    kb_document_service,
-    doc_id
-):
-    try:
-        await sio.emit('process_started', {"process_id": process_id, "status": "Processing started"}, room=sid)
-        kb_doc = kb_document_service.embed_document(doc_id)
-        await sio.emit('process_complete', {"process_id": process_id, "status": "success", "kb_doc": kb_doc}, room=sid)
-    except Exception as e:
-        await sio.emit('process_error', {"process_id": process_id, "status": "error", "message": str(e)}, room=sid)
+    return await kb_document_service.save_documents(content, doc_id)
 
 def setup_document_handlers(sio, mongo_client):
     @sio.on('process_document')
     async def process_document_handler(sid, data):
-        await process_document(sio, sid, data, mongo_client)
\ No newline at end of file
+        await process_document(sio, sid, data, mongo_client)
@@ -1,8 +1,12 @@
 import asyncio
 from app.services.System.SystemService import SystemService
-from app.agents.CategoryAgent import CategoryAgent
 
 
+def get_category_agent():
+    # CategoryAgent needs dspy; import it on the first file check instead of at startup
+    from app.agents.CategoryAgent import CategoryAgent
+    return CategoryAgent()
+
 async def get_system_service(data, system_state_manager) -> SystemService:
     uid = data.get('uid')
     service = SystemService(system_state_manager, uid)
@@ -13,7 +17,7 @@ async def setup_file_system(sio, sid, data, system_state_manager):
     system_service = await get_system_service(data, system_state_manager)
     filename = data.get('filename')
     categories = system_service.system_manager.config_categories
-    category_agent = CategoryAgent()
+    category_agent = get_category_agent()
 
     try:
         await sio.emit('file_check_update', {'message': 'Checking if file exists...'}, room=sid)
@@ -24,7 +28,7 @@ async def setup_file_system(sio, sid, data, system_state_manager):
         await sio.emit('file_check_update', {'message': f'File exists: {does_exist}'}, room=sid)
         await asyncio.sleep(0.01)
 
-        category, is_new_category = determine_category(category_agent, filename, categories)
+        category, is_new_category = await determine_category(category_agent, filename, categories)
 
         if does_exist:
             await sio.emit('file_check_update', {'message': 'Reading file content...'}, room=sid)
@@ -43,13 +47,13 @@ async def setup_file_system(sio, sid, data, system_state_manager):
     except Exception as e:
         await sio.emit('file_check_error', {'error': f"An error occurred: {str(e)}"}, room=sid)
 
-def determine_category(category_agent, filename, categories):
-    result_obj = category_agent.does_file_belong_in_category(filename, categories)
+async def determine_category(category_agent, filename, categories):
+    result_obj = await category_agent.does_file_belong_in_category(filename, categories)
     
     if result_obj["belongs"]:
         return result_obj["category"], False
     else:
-        new_category = category_agent.create_new_category(filename)
+        new_category = await category_agent.create_new_category(filename)
         return new_category, True
 
 def setup_file_system_handlers(sio, system_state_manager):
@@ -0,0 +1,33 @@
+import logging
+from app.agents.generation_registry import generation_registry
+from app.socket_handlers.room_handler import chat_room, user_room
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_CHAT_ID = 'insight'
+
+def generation_key(chat_id: str, uid: str) -> str:
+    # Every user's insight chat has the same id, so qualify it with the uid
+    if chat_id == INSIGHT_CHAT_ID:
+        return f'{INSIGHT_CHAT_ID}:{uid}'
+    return chat_id
+
+def setup_generation_handlers(sio):
+    @sio.on('stop_generation')
+    async def stop_generation_handler(sid, data):
+        chat_id = data.get('chatId')
+        if not chat_id:
+            await sio.emit('error', {"error": "Chat ID is required to stop a generation"}, room=sid)
+            return
+
+        # Only the uid the socket connected with; a payload uid could stop someone else's generation
+        session = await sio.get_session(sid)
+        uid = session.get('uid')
+        if not uid:
+            await sio.emit('error', {"error": "Connect with a uid to stop a generation"}, room=sid)
+            return
+        stopped = generation_registry.stop(generation_key(chat_id, uid), uid)
+        logger.debug('stop_generation for %s from %s: %s', chat_id, sid, stopped)
+
+        room = user_room(uid) if chat_id == INSIGHT_CHAT_ID else chat_room(chat_id)
+        await sio.emit('generation_stopped', {'chatId': chat_id, 'stopped': stopped}, room=room)
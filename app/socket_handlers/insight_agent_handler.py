@@ -1,7 +1,12 @@
 import logging
 from app.agents.BossAgent import  BossAgentConfig, BossAgent
 from app.agents.OpenAiClient import OpenAiClient
-from app.agents.insight.InsightAgent import InsightAgent
+from app.socket_handlers.room_handler import user_room
+from app.socket_handlers.admission_handler import generation_slot, emit_rejection
+from app.agents.admission_controller import AdmissionRejected
+from app.agents.generation_registry import generation_registry
+from app.utils.tracing import span
+from app.socket_handlers.generation_handler import generation_key, INSIGHT_CHAT_ID
 
 async def get_insight_tools():
     return [{
@@ -63,6 +68,7 @@ async def create_dspy_agent(sio, db, uid):
     '''
     config = BossAgentConfig(ai_client, sio, event_name='insight_chat_response', system_message=system_message, model='gpt-4o')
     boss_agent = BossAgent(config)
+    from app.agents.insight.InsightAgent import InsightAgent  # dspy loads on first use
     insight_agent = InsightAgent(db, uid, sio)
     return boss_agent, insight_agent
 
@@ -77,17 +83,24 @@ async def run_insight_agent(sio, sid, data, mongo_client):
         # Get and validate settings
         chat_object = validate_chat_settings(data)
         uid = chat_object.get('uid')
+        # Insight chats share the 'insight' id, so stream to the user's own room
+        await sio.enter_room(sid, user_room(uid))
         db = mongo_client.db
         boss_agent, insight_agent = await create_dspy_agent(sio, db, uid)
         messages = chat_object.get('messages')
 
-        await boss_agent.process_message(
-            messages,
-            'insight',
-            lambda cid, msg: insight_agent.insight_db_manager.create_message('agent', msg)
-        )
-        await insight_agent.handle_user_input(messages)
+        with generation_registry.track(generation_key(INSIGHT_CHAT_ID, uid), uid):
+            async with generation_slot(sio, sid, boss_agent, uid, INSIGHT_CHAT_ID):
+                await boss_agent.process_message(
+                    messages,
+                    INSIGHT_CHAT_ID,
+                    lambda cid, msg: insight_agent.insight_db_manager.create_message('agent', msg),
+                    room=user_room(uid)
+                )
+                await insight_agent.handle_user_input(messages)
 
+    except AdmissionRejected as rejection:
+        await emit_rejection(sio, sid, INSIGHT_CHAT_ID, rejection)
     except Exception as e:
         logging.error('Error in run_insight_agent: %s', str(e))
         await sio.emit('error', {'message': f"Error processing request: {str(e)}"}, room=sid)
@@ -95,4 +108,5 @@ async def run_insight_agent(sio, sid, data, mongo_client):
 def setup_insight_agent_handlers(sio, mongo_client):
     @sio.on('insight_chat_response')
     async def get_agent_response_handler(sid, data):
-        await run_insight_agent(sio, sid, data, mongo_client)
+        with span('socket.insight_chat_response', sid=sid):
+            await run_insight_agent(sio, sid, data, mongo_client)
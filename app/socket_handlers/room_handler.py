@@ -0,0 +1,56 @@
+import logging
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+def chat_room(chat_id: str) -> str:
+    return f'chat:{chat_id}'
+
+def user_room(uid: str) -> str:
+    return f'user:{uid}'
+
+def _get_uid_from_connect(environ, auth):
+    if isinstance(auth, dict) and auth.get('uid'):
+        return auth['uid']
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    return query.get('uid', [None])[0]
+
+async def subscribe_to_chat(sio, sid, uid, chat_id):
+    """
+    Adds the requesting socket to the chat room, along with every other
+    connection (tab) of the same user, so they all share one stream.
+    """
+    room = chat_room(chat_id)
+    await sio.enter_room(sid, room)
+    if not uid:
+        return room
+
+    for participant in sio.manager.get_participants('/', user_room(uid)):
+        participant_sid = participant[0] if isinstance(participant, tuple) else participant
+        if participant_sid != sid:
+            await sio.enter_room(participant_sid, room)
+    return room
+
+def setup_room_handlers(sio):
+    @sio.on('connect')
+    async def connect_handler(sid, environ, auth=None):
+        uid = _get_uid_from_connect(environ, auth)
+        if uid:
+            await sio.save_session(sid, {'uid': uid})
+            await sio.enter_room(sid, user_room(uid))
+            logger.debug('Socket %s joined room %s', sid, user_room(uid))
+
+    @sio.on('join_chat')
+    async def join_chat_handler(sid, data):
+        chat_id = data.get('chatId')
+        if not chat_id:
+            await sio.emit('error', {"error": "Chat ID is required to join a chat"}, room=sid)
+            return
+        session = await sio.get_session(sid)
+        await subscribe_to_chat(sio, sid, session.get('uid'), chat_id)
+
+    @sio.on('leave_chat')
+    async def leave_chat_handler(sid, data):
+        chat_id = data.get('chatId')
+        if chat_id:
+            await sio.leave_room(sid, chat_room(chat_id))
@@ -1,10 +1,19 @@
 import logging
 from app.services.ChatService import ChatService
-from app.agents.SystemAgent import SystemAgent
 from app.agents.BossAgent import BossAgent, BossAgentConfig
 from app.agents.OpenAiClient import OpenAiClient
 from app.services.System.SystemService import SystemService
 from app.services.context_processor import process_chat_context
+from app.socket_handlers.room_handler import subscribe_to_chat
+from app.socket_handlers.admission_handler import generation_slot, emit_rejection
+from app.agents.admission_controller import AdmissionRejected
+from app.agents.generation_registry import generation_registry
+from app.utils.tracing import span
+
+def get_system_agent():
+    # SystemAgent needs dspy; import it on the first routed query instead of at startup
+    from app.agents.SystemAgent import SystemAgent
+    return SystemAgent()
 
 def create_system_agent(sio, db, uid):
     ai_client = OpenAiClient(db, uid)
@@ -13,9 +22,9 @@ def create_system_agent(sio, db, uid):
 
 async def handle_file_routing(sio, sid, query, uid, system_state_manager):
     system_service = SystemService(system_state_manager, uid)
-    system_agent = SystemAgent()
+    system_agent = get_system_agent()
     category_list = await system_service.get_config_categories()
-    categories = system_agent.category_routing(query, ', '.join(category_list))
+    categories = await system_agent.category_routing(query, ', '.join(category_list))
     
     relevant_files = []
     for category in categories:
@@ -23,7 +32,7 @@ async def handle_file_routing(sio, sid, query, uid, system_state_manager):
         relevant_files.extend(category_files)
     
     relevant_file_paths = ', '.join([file['path'] for file in relevant_files])
-    relevant_file_paths = system_agent.file_routing(query, relevant_file_paths)
+    relevant_file_paths = await system_agent.file_routing(query, relevant_file_paths)
     return [file for file in relevant_files if file['path'] in relevant_file_paths]
 
 def validate_chat_settings(data):
@@ -38,6 +47,7 @@ async def run_system_agent(sio, sid, data, system_state_manager, mongo_client):
         chat_settings = validate_chat_settings(data)
         uid, chat_id, context = chat_settings.get('uid'), chat_settings.get('chatId'), chat_settings.get('context', [])
         user_message = chat_settings.get('messages', [])[-1] if chat_settings.get('messages') else None
+        room = await subscribe_to_chat(sio, sid, uid, chat_id)
         # Initialize services and get relevant files
         db = mongo_client.db
         chat_service = ChatService(db, chat_type='system')
@@ -56,13 +66,18 @@ async def run_system_agent(sio, sid, data, system_state_manager, mongo_client):
 
         # Process message with system agent
         system_agent = create_system_agent(sio, db, uid)
-        await process_chat_context(db, uid, chat_id, context, user_message, chat_service, chat_settings, system_agent)
-        await system_agent.process_message(
-            chat_settings['messages'], 
-            chat_id, 
-            lambda cid, msg: chat_service.create_message(cid, 'agent', msg)
-        )
+        with generation_registry.track(chat_id, uid):
+            await process_chat_context(db, uid, chat_id, context, user_message, chat_service, chat_settings, system_agent)
+            async with generation_slot(sio, sid, system_agent, uid, chat_id):
+                await system_agent.process_message(
+                    chat_settings['messages'], 
+                    chat_id, 
+                    lambda cid, msg: chat_service.create_message(cid, 'agent', msg),
+                    room=room
+                )
 
+    except AdmissionRejected as rejection:
+        await emit_rejection(sio, sid, chat_id, rejection)
     except Exception as e:
         logging.error('Error in run_system_agent: %s', str(e))
         await sio.emit('error', {'message': f"Error processing request: {str(e)}"}, room=sid)
@@ -70,4 +85,5 @@ async def run_system_agent(sio, sid, data, system_state_manager, mongo_client):
 def setup_system_agent_handlers(sio, system_state_manager, mongo_client):
     @sio.on('system_chat_response')
     async def get_agent_response_handler(sid, data):
-        await run_system_agent(sio, sid, data, system_state_manager, mongo_client)
+        with span('socket.system_chat_response', sid=sid):
+            await run_system_agent(sio, sid, data, system_state_manager, mongo_client)
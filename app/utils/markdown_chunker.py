@@ -0,0 +1,112 @@
+import os
+import re
+from typing import List, Tuple
+from app.utils.token_counter import get_encoding
+
+# Sized in cl100k tokens to stay under ColBERT's 256 word-piece document length
+CHUNK_TOKENS = int(os.getenv('KB_CHUNK_TOKENS', '180'))
+CHUNK_OVERLAP = int(os.getenv('KB_CHUNK_OVERLAP', '30'))
+
+HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+FENCE = re.compile(r'^\s*(```|~~~)')
+SEPARATOR = '\n\n'
+
+def chunk_id(source: str, index: int) -> str:
+    """Stable id of the `index`th chunk of the page at `source`."""
+    return f'{source}#chunk-{index}'
+
+def _sections(text: str) -> List[Tuple[List[str], List[str]]]:
+    """
+    Splits markdown at ATX headings into (heading path, blocks) pairs.
+    Blocks are paragraphs separated by blank lines; fenced code is kept in
+    one block and headings inside it are ignored.
+    """
+    sections = []
+    path: List[Tuple[int, str]] = []
+    blocks: List[str] = []
+    lines: List[str] = []
+    in_fence = False
+
+    def end_block():
+        if lines:
+            blocks.append('\n'.join(lines).strip('\n'))
+            lines.clear()
+
+    def end_section():
+        end_block()
+        if blocks:
+            sections.append(([title for _, title in path], list(blocks)))
+            blocks.clear()
+
+    for line in text.splitlines():
+        if FENCE.match(line):
+            in_fence = not in_fence
+            lines.append(line)
+            continue
+        heading = None if in_fence else HEADING.match(line)
+        if heading:
+            end_section()
+            level = len(heading.group(1))
+            path = [entry for entry in path if entry[0] < level] + [(level, heading.group(2))]
+            blocks.append(line.strip())
+        elif not in_fence and not line.strip():
+            end_block()
+        else:
+            lines.append(line)
+    end_section()
+    return sections
+
+def _decode(encoding, tokens: List[int]) -> str:
+    # Window edges can split a multi-byte character; drop the fragment
+    return encoding.decode_bytes(tokens).decode('utf-8', errors='ignore').strip()
+
+def chunk_markdown(text: str, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP) -> List[dict]:
+    """
+    Splits a markdown page into chunks of at most about `max_tokens` tokens.
+
+    Chunks break at headings: a new section starts a new chunk unless the
+    open one is still small and the whole section fits in it. Inside a
+    section, chunks break between paragraphs, and a paragraph or code block
+    longer than `max_tokens` is cut into token windows. Consecutive chunks
+    of the same section share `overlap_tokens` tokens so a passage cut at a
+    boundary is still whole in one of them. Each chunk is
+    {'content': str, 'headings': [outermost, ..., innermost]}.
+    """
+    encoding = get_encoding()
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    chunks: List[dict] = []
+    current: List[int] = []
+    headings: List[str] = []
+
+    def flush(carry_overlap: bool):
+        nonlocal current
+        content = _decode(encoding, current)
+        if content:
+            chunks.append({'content': content, 'headings': headings})
+        current = current[-overlap_tokens:] if carry_overlap and overlap_tokens else []
+
+    separator = encoding.encode(SEPARATOR)
+    for section_headings, blocks in _sections(text):
+        encoded = [encoding.encode(block) for block in blocks]
+        section_tokens = sum(len(tokens) + len(separator) for tokens in encoded)
+        if current and not (len(current) < max_tokens // 4 and len(current) + section_tokens <= max_tokens):
+            flush(carry_overlap=False)
+        if not current:
+            headings = section_headings
+
+        for tokens in encoded:
+            if current:
+                tokens = separator + tokens
+            if current and len(current) + len(tokens) > max_tokens and len(tokens) <= max_tokens:
+                flush(carry_overlap=True)
+                if len(current) + len(tokens) > max_tokens:
+                    current = []  # the overlap would push a block that fits on its own into a cut
+            current = current + tokens
+            # An oversized block fills up the open chunk and continues in windows
+            while len(current) > max_tokens:
+                remainder = current[max_tokens:]
+                current = current[:max_tokens]
+                flush(carry_overlap=True)
+                current = current + remainder
+    flush(carry_overlap=False)
+    return chunks
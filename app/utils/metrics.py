@@ -0,0 +1,206 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Label values beyond this many distinct series per metric collapse into OVERFLOW_VALUE
+MAX_SERIES = 50
+OVERFLOW_VALUE = 'other'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), max_series: int = MAX_SERIES):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        if key in self._series or len(self._series) < self.max_series:
+            return key
+        # Keep cardinality bounded no matter what callers pass in
+        return tuple(OVERFLOW_VALUE for _ in self.labelnames)
+
+    def _get_series(self, labels: Dict[str, str]):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for key, series in list(self._series.items()):
+            lines.extend(self._render_series(key, series))
+        return lines
+
+    def _render_series(self, key, series) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """A counter incremented with `inc`, or read from `callback` at scrape time for totals kept elsewhere."""
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_series(self):
+        return [0.0]
+
+    def inc(self, amount: float = 1.0, **labels):
+        self._get_series(labels)[0] += amount
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            for key, value in self.callback():
+                self._get_series(dict(zip(self.labelnames, key)))[0] = value
+        return super().render()
+
+    def _render_series(self, key, series):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(series[0])}']
+
+class Gauge(_Metric):
+    """A gauge whose values are read from `callback` at scrape time."""
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_series(self):
+        return [0.0]
+
+    def set(self, value: float, **labels):
+        self._get_series(labels)[0] = value
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            for key, value in self.callback():
+                self.set(value, **dict(zip(self.labelnames, key)))
+        return super().render()
+
+    def _render_series(self, key, series):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(series[0])}']
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_series(self):
+        return _HistogramSeries(len(self.buckets))
+
+    def observe(self, value: float, **labels):
+        series = self._get_series(labels)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series.counts[index] += 1
+                break
+        series.sum += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, series.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(series.sum)}')
+        lines.append(f'{self.name}_count{labels} {series.count}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=(), callback=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+# Chat pipeline metrics. Labels are limited to models, context types,
+# collections, operations and event names; never uids or chat ids.
+LLM_TIME_TO_FIRST_TOKEN = registry.histogram(
+    'llm_time_to_first_token_seconds', 'Time from request to the first streamed token', ('model',))
+LLM_TOKENS_PER_SECOND = registry.histogram(
+    'llm_stream_tokens_per_second', 'Streamed deltas per second after the first token', ('model',),
+    buckets=(5, 10, 20, 40, 60, 80, 100, 150, 200, 400))
+CONTEXT_PROCESSING_SECONDS = registry.histogram(
+    'context_processing_seconds', 'ContextManagerService.process_context duration by context type', ('context_type',))
+MONGO_COMMAND_SECONDS = registry.histogram(
+    'mongo_command_seconds', 'MongoDB command latency', ('collection', 'command'),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+MONGO_COMMAND_FAILURES = registry.counter(
+    'mongo_command_failures_total', 'Failed MongoDB commands', ('collection', 'command'))
+FIRECRAWL_REQUEST_SECONDS = registry.histogram(
+    'firecrawl_request_seconds', 'Firecrawl extraction request time', ('endpoint',))
+FIRECRAWL_POLL_SECONDS = registry.histogram(
+    'firecrawl_poll_seconds', 'Time spent polling a Firecrawl crawl job until it finished', ('outcome',),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600))
+COLBERT_SECONDS = registry.histogram(
+    'colbert_operation_seconds', 'ColBERT search and indexing time', ('operation',))
+KB_RETRIEVAL_SECONDS = registry.histogram(
+    'kb_retrieval_seconds', 'KB search time for chat context, including index lookup', ('outcome',))
+SOCKET_EMITS = registry.counter(
+    'socket_emits_total', 'Socket.IO emits by event name', ('event',))
@@ -0,0 +1,36 @@
+import json
+from typing import Any
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from app.utils.custom_json_encoder import CustomJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+def _orjson_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_mongo(content: Any) -> bytes:
+    """
+    Serialize Mongo documents to JSON bytes in a single pass. ObjectId and
+    datetime values are handled by the encoder itself, so callers don't need
+    to walk the document first. Uses orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        cls=CustomJSONEncoder,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+class MongoJSONResponse(JSONResponse):
+    """JSONResponse that accepts raw Mongo documents (ObjectId, datetime)."""
+    def render(self, content: Any) -> bytes:
+        return dumps_mongo(content)
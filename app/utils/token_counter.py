@@ -1,16 +1,39 @@
+from functools import lru_cache
+from typing import Iterable, List
+import os
 import tiktoken
 
-def token_counter(message):
+ENCODING_NAME = "cl100k_base"
+# Per-message overhead plus the <|im_start|>assistant<|im_sep|> reply primer
+MESSAGE_OVERHEAD = 6
+# Rough average for English text with cl100k_base, used by the fast estimate
+CHARS_PER_TOKEN = 4
+BATCH_THREADS = int(os.getenv('TOKEN_COUNTER_THREADS', '8'))
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = ENCODING_NAME):
+    """Return the process-wide cached tiktoken encoder."""
+    return tiktoken.get_encoding(encoding_name)
+
+def estimate_tokens(message: str) -> int:
+    """Fast length-based estimate for budget checks that don't need exact counts."""
+    return MESSAGE_OVERHEAD + (len(message) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def token_counter(message, estimate=False):
     """Return the number of tokens in a string."""
-    try:
-        encoding = tiktoken.encoding_for_model("cl100k_base")
-    except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    
-    tokens_per_message = 3
-    num_tokens = 0
-    num_tokens += tokens_per_message
-    num_tokens += len(encoding.encode(message))
-    num_tokens += 3  # every reply is primed with <|im_start|>assistant<|im_sep|>
-    return num_tokens
\ No newline at end of file
+    if estimate:
+        return estimate_tokens(message)
+    return MESSAGE_OVERHEAD + len(get_encoding().encode(message))
+
+def count_many(messages: Iterable[str], estimate=False) -> List[int]:
+    """
+    Return token counts for many strings at once. Exact counts use tiktoken's
+    multi-threaded batch encoder, which releases the GIL while encoding.
+    """
+    messages = list(messages)
+    if estimate:
+        return [estimate_tokens(message) for message in messages]
+    if not messages:
+        return []
+    encoded = get_encoding().encode_batch(messages, num_threads=BATCH_THREADS)
+    return [MESSAGE_OVERHEAD + len(tokens) for tokens in encoded]
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+class Span:
+    """
+    A timed operation within a trace. Use as a context manager (sync or
+    async); spans opened inside it, in the same task or in tasks it
+    creates, become its children.
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'status', '_token', '_tracer')
+
+    def __init__(self, tracer: 'Tracer', name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = 0
+        self.end_ns = 0
+        self.status = 'ok'
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self) -> 'Span':
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.status = 'cancelled' if exc_type is asyncio.CancelledError else 'error'
+            self.attributes['error'] = repr(exc) if exc is not None else exc_type.__name__
+        _current_span.reset(self._token)
+        self._tracer.finish(self)
+        return False
+
+    async def __aenter__(self) -> 'Span':
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+class _NoopSpan:
+    """Returned when tracing is disabled so instrumented code costs almost nothing."""
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class JsonlExporter:
+    """Appends one JSON object per finished span to a local file."""
+    def __init__(self, path: str):
+        self.path = path
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._buffer.append(json.dumps(span.to_dict(), default=str))
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as trace_file:
+                trace_file.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.warning('Failed to write traces to %s: %s', self.path, str(e))
+
+class OtlpHttpExporter:
+    """
+    Posts finished traces as OTLP/JSON to a collector's /v1/traces endpoint
+    (an OpenTelemetry collector, Jaeger, Tempo, or a local stand-in).
+    """
+    def __init__(self, endpoint: str, service_name: str = 'paxxium'):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._buffer: List[Span] = []
+        self._tasks = set()
+
+    def export(self, span: Span):
+        self._buffer.append(span)
+
+    def flush(self):
+        spans, self._buffer = self._buffer, []
+        if not spans:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._post(spans))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'app.utils.tracing'},
+                'spans': [{
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': [{'key': key, 'value': {'stringValue': str(value)}} for key, value in span.attributes.items()],
+                    'status': {'code': 2 if span.status == 'error' else 1},
+                } for span in spans]
+            }]
+        }]}
+
+    async def _post(self, spans: List[Span]):
+        import httpx
+        try:
+            async with httpx.AsyncClient(timeout=5) as client:
+                await client.post(self.endpoint, json=self._payload(spans))
+        except Exception as e:
+            logger.debug('Failed to export %d spans: %s', len(spans), str(e))
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, **attributes):
+        if self.exporter is None:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def finish(self, span: Span):
+        self.exporter.export(span)
+        if span.parent_id is None:
+            # Root span closed: the trace is complete, write it out together
+            self.exporter.flush()
+
+def _exporter_from_env():
+    exporter = os.getenv('TRACING_EXPORTER', '').lower()
+    if exporter == 'jsonl':
+        return JsonlExporter(os.getenv('TRACING_JSONL_PATH', 'traces.jsonl'))
+    if exporter == 'otlp':
+        return OtlpHttpExporter(os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'))
+    return None
+
+tracer = Tracer(_exporter_from_env())
+
+def span(name: str, **attributes):
+    """Opens a span under the current one, or a new trace if there is none."""
+    return tracer.span(name, **attributes)
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+def traced(name: Optional[str] = None):
+    """Decorator that wraps an async function in a span named after it."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def print_waterfall(path: str, trace_id: Optional[str] = None):
+    """Prints the span tree of one trace (default: the slowest root span) from a JSONL file."""
+    with open(path, encoding='utf-8') as trace_file:
+        spans = [json.loads(line) for line in trace_file if line.strip()]
+    roots = [s for s in spans if s['parent_id'] is None and (trace_id is None or s['trace_id'] == trace_id)]
+    if not roots:
+        print('No matching trace found')
+        return
+    root = max(roots, key=lambda s: s['duration_ms'])
+    trace_spans = [s for s in spans if s['trace_id'] == root['trace_id']]
+    children: Dict[Optional[str], List[Dict]] = {}
+    for trace_span in trace_spans:
+        children.setdefault(trace_span['parent_id'], []).append(trace_span)
+
+    print(f"trace {root['trace_id']}  {root['duration_ms']:.1f} ms")
+    def walk(node, depth):
+        offset = (node['start_ns'] - root['start_ns']) / 1e6
+        status = '' if node['status'] == 'ok' else f"  [{node['status']}]"
+        print(f"{offset:9.1f} ms  {'  ' * depth}{node['name']}  {node['duration_ms']:.1f} ms{status}")
+        for child in sorted(children.get(node['span_id'], []), key=lambda s: s['start_ns']):
+            walk(child, depth + 1)
+    walk(root, 0)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show the span waterfall of a traced request.')
+    parser.add_argument('path', nargs='?', default=os.getenv('TRACING_JSONL_PATH', 'traces.jsonl'))
+    parser.add_argument('--trace-id', help='Trace to show; defaults to the slowest one in the file')
+    args = parser.parse_args()
+    print_waterfall(args.path, args.trace_id)
@@ -0,0 +1,90 @@
+"""
+Before/after benchmark for serializing a large chat list.
+
+Builds a synthetic ~5 MB chat list (ObjectIds, datetimes, nested messages
+and context) and compares the previous chat route pipeline
+(convert_objectid -> jsonable_encoder -> json.dumps -> json.loads ->
+JSONResponse) with MongoJSONResponse's single pass.
+
+Run from the project root:
+    python -m benchmarks.bench_json_response [--target-mb 5]
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.utils.custom_json_encoder import CustomJSONEncoder
+from app.utils.mongo_json_response import MongoJSONResponse, orjson
+
+def build_chat_list(target_bytes):
+    chats = []
+    size = 0
+    while size < target_bytes:
+        messages = [{
+            '_id': ObjectId(),
+            'message_from': 'user' if i % 2 == 0 else 'agent',
+            'content': 'How do I configure the index for this query? ' * 8,
+            'type': 'database',
+            'current_time': datetime.now(timezone.utc).isoformat(),
+            'created_at': datetime.now(timezone.utc),
+            'token_count': 96,
+        } for i in range(40)]
+        chat = {
+            '_id': ObjectId(),
+            'uid': 'benchmark-user',
+            'chat_name': 'Benchmark chat',
+            'agent_model': 'gpt-4o-mini',
+            'system_message': '',
+            'context': [{'type': 'url', 'source': 'example.com', 'content': 'x' * 512}],
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+            'messages': messages,
+        }
+        chats.append(chat)
+        size += len(json.dumps(chat, cls=CustomJSONEncoder))
+    return chats, size
+
+def legacy_render(chats):
+    def convert_objectid(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        elif isinstance(obj, list):
+            return [convert_objectid(item) for item in obj]
+        elif isinstance(obj, dict):
+            return {k: convert_objectid(v) for k, v in obj.items()}
+        return obj
+
+    converted = [convert_objectid(chat) for chat in chats]
+    json_chats = jsonable_encoder(converted)
+    json_str = json.dumps(json_chats, cls=CustomJSONEncoder)
+    return JSONResponse(content=json.loads(json_str)).body
+
+def fast_render(chats):
+    return MongoJSONResponse(content=chats).body
+
+def measure(label, func, chats, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func(chats)
+        timings.append(time.perf_counter() - started)
+    print(f'{label:<22} best {min(timings) * 1000:9.1f} ms   body {len(body) / 1e6:6.2f} MB')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-mb', type=float, default=5.0)
+    args = parser.parse_args()
+
+    chats, size = build_chat_list(int(args.target_mb * 1e6))
+    print(f'{len(chats)} chats, {size / 1e6:.2f} MB, backend: {"orjson" if orjson else "json"}')
+    measure('legacy 4-pass', legacy_render, chats)
+    measure('MongoJSONResponse', fast_render, chats)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Benchmark of ColBERT add latency against KB size: in-place `add_to_index`
+on a single PLAID index versus a delta segment of a SegmentedIndex.
+
+For each KB size a base index of synthetic pages is built once (slow; not
+timed), then `--new` pages are added both ways and search latency over the
+result is measured. Needs ragatouille and the ColBERT checkpoint
+(COLBERT_CHECKPOINT may point at a local copy); a GPU is optional.
+
+Run from the project root:
+    python -m benchmarks.bench_segmented_index [--sizes 200 1000 5000] [--new 10]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from app.services.SegmentedIndex import SegmentedIndex
+
+WORDS = ('index', 'segment', 'query', 'token', 'vector', 'crawl', 'page', 'model', 'search', 'latency',
+         'document', 'knowledge', 'embedding', 'cluster', 'centroid', 'residual', 'passage', 'score')
+
+def synthetic_pages(count, start=0, words_per_page=300, seed=7):
+    rng = random.Random(seed + start)
+    return [
+        {'id': f'https://example.com/page-{start + i}', 'content': ' '.join(rng.choice(WORDS) for _ in range(words_per_page)), 'metadata': {}}
+        for i in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='ColBERT add latency: in-place add_to_index vs delta segments.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 1000, 5000], help='KB sizes in pages')
+    parser.add_argument('--new', type=int, default=10, help='pages added per measurement')
+    parser.add_argument('--queries', type=int, default=20, help='searches timed per layout')
+    args = parser.parse_args()
+
+    from ragatouille import RAGPretrainedModel
+    checkpoint = os.getenv('COLBERT_CHECKPOINT', 'colbert-ir/colbertv2.0')
+    root = tempfile.mkdtemp(prefix='bench_colbert_')
+    pretrained = RAGPretrainedModel.from_pretrained(checkpoint, index_root=root, verbose=0)
+
+    def builder(index_name, documents):
+        return pretrained.index(
+            index_name=index_name,
+            collection=[document['content'] for document in documents],
+            document_ids=[document['id'] for document in documents],
+            document_metadatas=[document['metadata'] for document in documents],
+        )
+
+    loaded = {}
+    def searcher(index_path, query, k):
+        if index_path not in loaded:
+            loaded[index_path] = RAGPretrainedModel.from_index(index_path, verbose=0)
+        return loaded[index_path].search(query, k=k)
+
+    print(f"{'pages':>7}  {'in-place add':>13}  {'segment add':>12}  {'speedup':>8}  {'search (single)':>16}  {'search (segmented)':>19}")
+    try:
+        for size in args.sizes:
+            base_pages = synthetic_pages(size)
+            new_pages = synthetic_pages(args.new, start=size)
+            queries = [' '.join(random.sample(WORDS, 3)) for _ in range(args.queries)]
+
+            # In-place: one index, new pages appended with add_to_index
+            single_path = builder(f'single-{size}', base_pages)
+            single = RAGPretrainedModel.from_index(single_path, verbose=0)
+            started = time.perf_counter()
+            single.add_to_index(
+                new_collection=[page['content'] for page in new_pages],
+                new_document_ids=[page['id'] for page in new_pages],
+                new_document_metadatas=[page['metadata'] for page in new_pages],
+            )
+            in_place = time.perf_counter() - started
+            started = time.perf_counter()
+            for query in queries:
+                single.search(query, k=10)
+            single_search = (time.perf_counter() - started) / len(queries)
+
+            # Segmented: same base, new pages land in a delta segment
+            segmented = SegmentedIndex.create(os.path.join(root, 'segmented', f'kb-{size}'), base_pages, builder)
+            started = time.perf_counter()
+            segmented.add(new_pages, builder)
+            segment_add = time.perf_counter() - started
+            for query in queries[:1]:
+                segmented.search(query, 10, searcher)  # load the segments before timing
+            started = time.perf_counter()
+            for query in queries:
+                segmented.search(query, 10, searcher)
+            segmented_search = (time.perf_counter() - started) / len(queries)
+
+            print(f'{size:>7}  {in_place:>12.2f}s  {segment_add:>11.2f}s  {in_place / segment_add:>7.1f}x  '
+                  f'{single_search * 1000:>14.1f}ms  {segmented_search * 1000:>17.1f}ms')
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+Socket.IO load test for the chat pipeline.
+
+Runs the chat socket handlers in-process on a local port, points the
+OpenAI and Anthropic SDKs at a fake streaming provider (OpenAI and
+Anthropic SSE formats, configurable first-token latency, token rate and
+chunk size), backs ChatService with an in-memory database stand-in, and
+drives N Socket.IO clients that each send `chat_response` turns.
+
+Reports p50/p95/p99 time-to-first-token (first frame seen by the client),
+inter-frame gap and total turn time, plus the server event loop's lag.
+Everything binds to 127.0.0.1, so no network access is needed; tiktoken's
+cl100k_base encoding must already be cached (see TIKTOKEN_CACHE_DIR).
+
+The fake provider and the clients run on their own event loops in
+separate threads, so the measured loop lag is the app's own.
+
+Run from the project root:
+    python -m benchmarks.bench_socket_load --clients 50 --rounds 3 --token-rate 80
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from copy import deepcopy
+
+from bson import ObjectId
+
+FILLER = ['The', ' model', ' streams', ' a', ' reply', ',', ' token', ' by', ' token', '.', '\n']
+CODE = ['\n```', 'python\n', 'def', ' handler', '():\n', '    return', ' 42', '\n```\n']
+
+# --- Fake streaming provider -------------------------------------------------
+
+class FakeProvider:
+    """ASGI app speaking the OpenAI chat-completions and Anthropic messages streaming formats."""
+    def __init__(self, tokens, token_rate, first_token_latency, chunk_tokens):
+        self.tokens = tokens
+        self.token_interval = 1.0 / token_rate if token_rate > 0 else 0.0
+        self.first_token_latency = first_token_latency
+        self.chunk_tokens = max(1, chunk_tokens)
+
+    def reply_chunks(self):
+        words = []
+        while len(words) < self.tokens:
+            words.extend(FILLER * 4)
+            words.extend(CODE)
+        words = words[:self.tokens]
+        for start in range(0, len(words), self.chunk_tokens):
+            yield ''.join(words[start:start + self.chunk_tokens])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        request = json.loads(body or b'{}')
+        path = scope['path']
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'text/event-stream')]})
+        if path.endswith('/messages'):
+            events = self._anthropic_events(request.get('model', 'claude'))
+        else:
+            events = self._openai_events(request.get('model', 'gpt'))
+
+        await asyncio.sleep(self.first_token_latency)
+        async for event in events:
+            await send({'type': 'http.response.body', 'body': event.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _paced(self):
+        for index, chunk in enumerate(self.reply_chunks()):
+            if index and self.token_interval:
+                await asyncio.sleep(self.token_interval * self.chunk_tokens)
+            yield chunk
+
+    async def _openai_events(self, model):
+        base = {'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model}
+        async for chunk in self._paced():
+            payload = {**base, 'choices': [{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}]}
+            yield f'data: {json.dumps(payload)}\n\n'
+        payload = {**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+        yield f'data: {json.dumps(payload)}\n\n'
+        yield 'data: [DONE]\n\n'
+
+    async def _anthropic_events(self, model):
+        def event(name, data):
+            return f'event: {name}\ndata: {json.dumps({"type": name, **data})}\n\n'
+        yield event('message_start', {'message': {
+            'id': 'msg_bench', 'type': 'message', 'role': 'assistant', 'content': [], 'model': model,
+            'stop_reason': None, 'stop_sequence': None, 'usage': {'input_tokens': 10, 'output_tokens': 1}}})
+        yield event('content_block_start', {'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+        async for chunk in self._paced():
+            yield event('content_block_delta', {'index': 0, 'delta': {'type': 'text_delta', 'text': chunk}})
+        yield event('content_block_stop', {'index': 0})
+        yield event('message_delta', {'delta': {'stop_reason': 'end_turn', 'stop_sequence': None}, 'usage': {'output_tokens': self.tokens}})
+        yield event('message_stop', {})
+
+# --- In-memory database stand-in ---------------------------------------------
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+class InMemoryCollection:
+    """Covers the Motor calls made on the chat path; not a general Mongo emulator."""
+    def __init__(self, name, default_document=None):
+        self.name = name
+        self.documents = {}
+        self.default_document = default_document
+
+    async def insert_one(self, document):
+        document.setdefault('_id', ObjectId())
+        self.documents[document['_id']] = deepcopy(document)
+        return _Result(inserted_id=document['_id'])
+
+    async def update_one(self, filter, update, upsert=False, **kwargs):
+        document = self.documents.get(filter.get('_id'))
+        if document is None and upsert:
+            document = self.documents.setdefault(filter.get('_id'), {'_id': filter.get('_id')})
+        if document is not None:
+            document.update(update.get('$set', {}))
+        matched = int(document is not None)
+        return _Result(matched_count=matched, modified_count=matched, upserted_id=None)
+
+    async def find_one(self, filter=None, projection=None, **kwargs):
+        filter = filter or {}
+        document = self.documents.get(filter.get('_id'))
+        if document is None and self.default_document is not None:
+            return {'_id': filter.get('_id'), **self.default_document}
+        return deepcopy(document)
+
+    async def create_index(self, *args, **kwargs):
+        return 'bench_index'
+
+class InMemoryDb:
+    def __init__(self):
+        self.collections = {
+            'users': InMemoryCollection('users', {'open_key': 'sk-bench', 'anthropic_key': 'sk-ant-bench'})
+        }
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = InMemoryCollection(name)
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+class InMemoryMongoClient:
+    def __init__(self):
+        self.db = InMemoryDb()
+
+# --- Helpers -------------------------------------------------------------------
+
+def percentiles(values):
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ordered = sorted(values)
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1]}
+
+def format_ms(stats):
+    return '  '.join(f'{name}={value * 1000:8.1f}ms' for name, value in stats.items())
+
+def run_in_thread(coroutine_factory):
+    """Runs a coroutine on a fresh event loop in a daemon thread; returns (thread, loop holder)."""
+    holder = {}
+    ready = threading.Event()
+
+    def target():
+        loop = asyncio.new_event_loop()
+        holder['loop'] = loop
+        asyncio.set_event_loop(loop)
+        ready.set()
+        holder['result'] = loop.run_until_complete(coroutine_factory())
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    ready.wait()
+    return thread, holder
+
+async def serve(asgi_app, port):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host='127.0.0.1', port=port, log_level='warning', lifespan='off'))
+    task = asyncio.ensure_future(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# --- Clients ------------------------------------------------------------------
+
+async def run_clients(url, args, models):
+    import socketio
+
+    samples = defaultdict(list)
+    errors = []
+
+    async def one_client(index):
+        uid = f'bench-user-{index}'
+        chat_id = str(ObjectId())
+        model = models[index % len(models)]
+        client = socketio.AsyncClient(reconnection=False)
+        state = {}
+
+        @client.on('chat_response')
+        async def on_frame(data):
+            now = time.perf_counter()
+            if data.get('type') == 'end_of_stream':
+                state['done'].set_result(now)
+                return
+            if state.get('first') is None:
+                state['first'] = now
+            else:
+                samples['gap'].append(now - state['last'])
+            state['last'] = now
+
+        @client.on('error')
+        async def on_error(data):
+            errors.append(data.get('type') or data.get('error'))
+            if not state['done'].done():
+                state['done'].set_result(None)
+
+        await client.connect(url, auth={'uid': uid}, transports=['websocket'])
+        history = []
+        try:
+            for round_number in range(args.rounds):
+                history.append({'message_from': 'user', 'content': f'Question {round_number} from {uid}', 'type': 'database'})
+                state.update(first=None, last=None, done=asyncio.get_running_loop().create_future())
+                sent_at = time.perf_counter()
+                await client.emit('chat_response', {'selectedChat': {
+                    'uid': uid, 'chatId': chat_id, 'messages': history, 'context': [],
+                    'agent_model': model, 'system_message': '', 'use_profile_data': False,
+                }})
+                finished_at = await asyncio.wait_for(state['done'], timeout=args.timeout)
+                if finished_at is None or state['first'] is None:
+                    continue
+                samples['ttft'].append(state['first'] - sent_at)
+                samples['turn'].append(finished_at - sent_at)
+                history.append({'message_from': 'agent', 'content': [{'type': 'text', 'content': 'reply'}], 'type': 'database'})
+        except asyncio.TimeoutError:
+            errors.append('timeout')
+        finally:
+            await client.disconnect()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_client(index) for index in range(args.clients)))
+    return samples, errors, time.perf_counter() - started
+
+# --- Main ---------------------------------------------------------------------
+
+async def monitor_loop_lag(lags, interval=0.05):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+async def main(args):
+    provider_port = free_port()
+    app_port = free_port()
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{provider_port}/v1'
+    os.environ['ANTHROPIC_BASE_URL'] = f'http://127.0.0.1:{provider_port}'
+    os.environ['NO_PROXY'] = '127.0.0.1,localhost'
+
+    from app.utils.token_counter import get_encoding
+    try:
+        get_encoding()
+    except Exception as e:
+        sys.exit(f'tiktoken encoding unavailable offline ({e}); cache it first via TIKTOKEN_CACHE_DIR')
+
+    import socketio
+    from app.services.SocketClient import socket_client
+    from app.agents.admission_controller import admission_controller
+    from app.socket_handlers.room_handler import setup_room_handlers
+    from app.socket_handlers.generation_handler import setup_generation_handlers
+    from app.socket_handlers.chat_handler import setup_chat_handlers
+
+    admission_controller.config.default_concurrency = args.admission_concurrency
+    admission_controller.config.max_queue_wait = args.timeout
+
+    provider = FakeProvider(args.tokens, args.token_rate, args.first_token_latency, args.chunk_tokens)
+    provider_stop = threading.Event()
+
+    async def run_provider():
+        server, task = await serve(provider, provider_port)
+        while not provider_stop.is_set():
+            await asyncio.sleep(0.05)
+        server.should_exit = True
+        await task
+
+    provider_thread, _ = run_in_thread(run_provider)
+
+    setup_room_handlers(socket_client)
+    setup_generation_handlers(socket_client)
+    setup_chat_handlers(socket_client, InMemoryMongoClient())
+    app_server, app_task = await serve(socketio.ASGIApp(socket_client), app_port)
+
+    lags = []
+    lag_task = asyncio.create_task(monitor_loop_lag(lags))
+
+    models = {'openai': ['gpt-4o-mini'], 'anthropic': ['claude-3-5-sonnet-latest'], 'mixed': ['gpt-4o-mini', 'claude-3-5-sonnet-latest']}[args.provider]
+    client_thread, client_result = run_in_thread(lambda: run_clients(f'http://127.0.0.1:{app_port}', args, models))
+    while client_thread.is_alive():
+        await asyncio.sleep(0.1)
+    samples, errors, elapsed = client_result['result']
+
+    lag_task.cancel()
+    app_server.should_exit = True
+    await app_task
+    provider_stop.set()
+    provider_thread.join(timeout=5)
+
+    turns = len(samples['turn'])
+    print(f'clients={args.clients} rounds={args.rounds} provider={args.provider} tokens={args.tokens} '
+          f'token_rate={args.token_rate}/s chunk_tokens={args.chunk_tokens} first_token_latency={args.first_token_latency}s')
+    print(f'completed turns: {turns}/{args.clients * args.rounds} in {elapsed:.1f}s ({turns / elapsed:.1f} turns/s)')
+    if errors:
+        counts = defaultdict(int)
+        for error in errors:
+            counts[error] += 1
+        print(f'errors: {dict(counts)}')
+    print(f'time to first token  {format_ms(percentiles(samples["ttft"]))}')
+    print(f'inter-frame gap      {format_ms(percentiles(samples["gap"]))}')
+    print(f'turn duration        {format_ms(percentiles(samples["turn"]))}')
+    print(f'event loop lag       {format_ms(percentiles(lags))}  mean={statistics.fmean(lags) * 1000 if lags else 0:.1f}ms')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Socket.IO chat load test against a fake streaming LLM provider.')
+    parser.add_argument('--clients', type=int, default=20, help='concurrent Socket.IO clients')
+    parser.add_argument('--rounds', type=int, default=3, help='chat turns per client')
+    parser.add_argument('--provider', choices=['openai', 'anthropic', 'mixed'], default='mixed')
+    parser.add_argument('--tokens', type=int, default=400, help='tokens per reply')
+    parser.add_argument('--token-rate', type=float, default=80.0, help='tokens per second per stream (0 = unpaced)')
+    parser.add_argument('--chunk-tokens', type=int, default=1, help='tokens per streamed delta')
+    parser.add_argument('--first-token-latency', type=float, default=0.3, help='seconds before the first token')
+    parser.add_argument('--admission-concurrency', type=int, default=64, help='admission slots per provider/model')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for a turn')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""
+Import-time report for create_app().
+
+Imports `app` and calls create_app() in a fresh interpreter with
+`-X importtime`, then reports the wall time, the slowest imports, and any
+heavy library that got loaded. Heavy subsystems (ColBERT/torch, dspy,
+newspaper, PyMuPDF, paramiko, Pillow, Firebase) are meant to load on first
+use; tests/test_startup.py enforces that and the time budget, and this
+script shows where the time went when it fails.
+
+Run from the project root:
+    python -m benchmarks.bench_startup [--top 15]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+HEAVY_MODULES = ('ragatouille', 'torch', 'dspy', 'litellm', 'newspaper', 'fitz', 'pymupdf4llm', 'paramiko', 'PIL', 'firebase_admin')
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def parse_importtime(stderr):
+    """Returns (cumulative_us, depth, module) for each line of -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative, indent, module = match.groups()
+            entries.append((int(cumulative), len(indent), module))
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description='Report where create_app() spends its import time.')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports to list')
+    args = parser.parse_args()
+
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        print(result.stderr[-4000:])
+        sys.exit('create_app() failed to import; see the traceback above')
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded_heavy = sorted({name.split('.')[0] for name in report['modules']} & set(HEAVY_MODULES))
+
+    print(f"create_app(): {report['elapsed']:.3f}s, {len(report['modules'])} modules loaded")
+    if loaded_heavy:
+        print(f"heavy modules loaded at startup: {', '.join(loaded_heavy)}")
+    print('slowest imports (cumulative):')
+    entries = parse_importtime(result.stderr)
+    for cumulative, _, module in sorted(entries, reverse=True)[:args.top]:
+        print(f'  {cumulative / 1000:9.1f}ms  {module}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Microbenchmark for StreamHandler response assembly.
+
+Compares the previous per-token dict list + repeated string concatenation
+with ResponseAccumulator over a synthetic 50k-token response, then times
+the full StreamHandler path (fence parsing, coalesced emits, assembly)
+with fences split across deltas.
+
+Run from the project root:
+    python -m benchmarks.bench_stream_assembly
+"""
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from app.agents.handlers.stream_handler import ResponseAccumulator, StreamHandler
+
+TOKEN_COUNT = 50_000
+
+class NullSio:
+    async def emit(self, *args, **kwargs):
+        pass
+
+def synthetic_tokens(count):
+    random.seed(7)
+    words = ['the', ' model', ' streams', ' tokens', ',', ' and', ' code', '.', '\n']
+    tokens = []
+    while len(tokens) < count:
+        tokens.extend(random.choice(words) for _ in range(200))
+        # Split the fences across deltas to exercise the parser
+        tokens.extend(['\n``', '`py', 'thon\n', 'x = 1', '\n', 'print(x)', '\n`', '``', '\n'])
+    return tokens[:count]
+
+async def as_stream(tokens):
+    for token in tokens:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+def legacy_collapse(tokens):
+    response_chunks = [{'type': 'text', 'content': token, 'room': 'bench'} for token in tokens]
+    collapsed_response = []
+    current_message = response_chunks[0].copy()
+    for chunk in response_chunks[1:]:
+        if chunk['type'] == current_message['type']:
+            current_message['content'] += chunk['content']
+        else:
+            collapsed_response.append(current_message)
+            current_message = chunk.copy()
+    collapsed_response.append(current_message)
+    return collapsed_response
+
+def measure(label, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<26} {elapsed * 1000:9.1f} ms   peak {peak / 1024:9.1f} KiB')
+    return result
+
+def main():
+    tokens = synthetic_tokens(TOKEN_COUNT)
+    handler = StreamHandler(NullSio(), 'bench')
+
+    async def run_handler():
+        accumulator = await handler.process_stream('bench', as_stream(tokens))
+        return handler.collapse_response_chunks(accumulator)
+
+    def run_accumulator():
+        accumulator = ResponseAccumulator('bench')
+        for token in tokens:
+            accumulator.append(token, 'text')
+        return accumulator.to_chunks()
+
+    print(f'{TOKEN_COUNT} tokens, {sum(len(t) for t in tokens)} characters')
+    measure('legacy dict + concat', lambda: legacy_collapse(tokens))
+    measure('ResponseAccumulator', run_accumulator)
+    chunks = measure('full StreamHandler path', lambda: asyncio.run(run_handler()))
+    print(f'segments: {len(chunks)}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Benchmark for app.utils.token_counter on a crawled-KB-sized corpus.
+
+Uses markdown files from a directory when one is given, otherwise builds a
+synthetic corpus of crawled pages (default 500 pages of ~12k characters).
+
+Run from the project root:
+    python -m benchmarks.bench_token_counter [markdown_dir] [--pages N]
+"""
+import argparse
+import contextlib
+import io
+import pathlib
+import random
+import sys
+import time
+
+import tiktoken
+
+from app.utils.token_counter import count_many, token_counter
+
+def legacy_token_counter(message):
+    """The previous implementation: encoder lookup + KeyError fallback on every call."""
+    try:
+        encoding = tiktoken.encoding_for_model("cl100k_base")
+    except KeyError:
+        print("Warning: model not found. Using cl100k_base encoding.")
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return 6 + len(encoding.encode(message))
+
+def load_corpus(markdown_dir, pages):
+    if markdown_dir:
+        return [path.read_text(errors='ignore') for path in pathlib.Path(markdown_dir).rglob('*.md')]
+    random.seed(11)
+    words = ['## Installation', 'configure', 'the', 'server', '`pip install`', 'request', 'response',
+             'MongoDB', 'index', 'query', '\n\n', '- item', 'https://example.com/docs', '```python\nx = 1\n```']
+    return [' '.join(random.choice(words) for _ in range(1500)) for _ in range(pages)]
+
+def measure(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<28} {elapsed * 1000:9.1f} ms   total tokens {sum(result)}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('markdown_dir', nargs='?')
+    parser.add_argument('--pages', type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.markdown_dir, args.pages)
+    print(f'{len(corpus)} pages, {sum(len(page) for page in corpus)} characters')
+
+    token_counter('warm up the encoder cache')
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        legacy = [legacy_token_counter(page) for page in corpus]
+        legacy_elapsed = time.perf_counter() - started
+    print(f'{"legacy per-call lookup":<28} {legacy_elapsed * 1000:9.1f} ms   total tokens {sum(legacy)}')
+    measure('cached token_counter', lambda: [token_counter(page) for page in corpus])
+    measure('count_many (batch)', lambda: count_many(corpus))
+    measure('count_many (estimate)', lambda: count_many(corpus, estimate=True))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
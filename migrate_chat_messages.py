@@ -0,0 +1,29 @@
+import asyncio
+import logging
+from app.services.MongoDbClient import MongoDbClient
+from app.services.ChatService import ChatService
+from app.services.IndexRegistry import ensure_indexes
+
+# Moves messages embedded in chat documents into the chat_messages /
+# system_chat_messages collections, then backfills the 'updated_at' and
+# 'last_message' fields the chat list sorts and previews by. Safe to run
+# more than once.
+# Usage: python migrate_chat_messages.py
+
+logging.basicConfig(level=logging.INFO)
+
+async def migrate():
+    mongo_client = MongoDbClient('paxxium')
+    try:
+        await ensure_indexes(mongo_client.db)
+        for chat_type in ('user', 'system'):
+            chat_service = ChatService(mongo_client.db, chat_type=chat_type)
+            migrated = await chat_service.migrate_embedded_messages()
+            print(f'{chat_type} chats: migrated {migrated} messages')
+            backfilled = await chat_service.backfill_chat_summaries()
+            print(f'{chat_type} chats: backfilled updated_at/last_message on {backfilled} chats')
+    finally:
+        mongo_client.close()
+
+if __name__ == '__main__':
+    asyncio.run(migrate())
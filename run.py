@@ -1,18 +1,25 @@
+import os
 import uvicorn
 import argparse
 from app import create_app
 
 app = create_app()
 
-def main(debug=False):
+def main(debug=False, workers=1):
     if debug:
         uvicorn.run("run:app", host="0.0.0.0", port=3033, reload=True)
     else:
-        uvicorn.run("run:app", host="0.0.0.0", port=3033, workers=1, log_level="info")
+        if workers > 1:
+            # Workers are separate processes: sockets and shared state must fan out through Mongo
+            backend = os.environ.setdefault('PUBSUB_BACKEND', 'mongo')
+            if backend != 'mongo':
+                raise SystemExit(f"PUBSUB_BACKEND={backend} cannot be shared between workers, use 'mongo'")
+        uvicorn.run("run:app", host="0.0.0.0", port=3033, workers=workers, log_level="info")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Run the application in production or development mode.')
     parser.add_argument('--dev', action='store_true', help='Run in development mode with debugging and hot reloading')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', '1')), help='Number of worker processes (more than one enables Mongo pub/sub)')
     args = parser.parse_args()
 
-    main(debug=args.dev)
+    main(debug=args.dev, workers=args.workers)
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+from app.agents.admission_controller import AdmissionConfig, AdmissionController, AdmissionRejected
+
+def single_slot_controller(**overrides):
+    return AdmissionController(AdmissionConfig(**{'default_concurrency': 1, 'max_queue_wait': 1000.0, **overrides}))
+
+async def hold_slot(controller, uid, gate):
+    async with controller.slot('openai', 'gpt-4o', uid):
+        await gate.wait()
+
+def set_event():
+    event = asyncio.Event()
+    event.set()
+    return event
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_flooding_uid_does_not_delay_another_uids_request():
+    async def run():
+        controller = single_slot_controller()
+        order = []
+
+        async def request(uid):
+            async with controller.slot('openai', 'gpt-4o', uid):
+                order.append(uid)
+
+        gate = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(controller, 'holder', gate))
+        await settle()
+        flood = [asyncio.create_task(request('flood')) for _ in range(5)]
+        await settle()
+        other = asyncio.create_task(request('other'))
+        await settle()
+        assert controller.snapshot()['queues']['openai/gpt-4o']['waiting'] == 6
+
+        gate.set()
+        await asyncio.gather(holder, other, *flood)
+        return order
+
+    order = asyncio.run(run())
+    # Queued behind five of the flooder's requests, but admitted right after its first
+    assert order.index('other') == 1
+    assert order.count('flood') == 5
+
+def test_cancelled_waiter_leaves_the_queue_without_leaking_a_slot():
+    async def run():
+        controller = single_slot_controller()
+        gate = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(controller, 'holder', gate))
+        await settle()
+        waiter = asyncio.create_task(hold_slot(controller, 'waiter', asyncio.Event()))
+        await settle()
+        assert controller.snapshot()['queues']['openai/gpt-4o']['waiting'] == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queue = controller.snapshot()['queues']['openai/gpt-4o']
+        assert (queue['active'], queue['waiting']) == (1, 0)
+
+        gate.set()
+        await holder
+        queue = controller.snapshot()['queues']['openai/gpt-4o']
+        assert (queue['active'], queue['waiting']) == (0, 0)
+        assert controller.stats['cancelled'] == 1
+
+        # The slot is free again for the next request
+        await asyncio.wait_for(hold_slot(controller, 'next', set_event()), timeout=1)
+
+    asyncio.run(run())
+
+def test_slot_granted_during_cancel_is_handed_to_the_next_waiter():
+    async def run():
+        controller = single_slot_controller()
+        queue = controller._get_queue('openai/gpt-4o', 'openai')
+        await controller._acquire(queue, 'holder', 1.0, None)
+        cancelled = asyncio.create_task(controller._acquire(queue, 'first', 1.0, None))
+        await settle()
+        next_waiter = asyncio.create_task(controller._acquire(queue, 'second', 1.0, None))
+        await settle()
+
+        # Grant the slot to the first waiter and cancel it before it resumes
+        await controller._release(queue)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+        await asyncio.wait_for(next_waiter, timeout=1)
+        assert (queue.active, queue.waiting) == (1, 0)
+        await controller._release(queue)
+        assert queue.active == 0
+
+    asyncio.run(run())
+
+def test_sheds_with_retry_after_when_the_wait_is_too_long():
+    async def run():
+        controller = single_slot_controller(max_queue_wait=5.0, initial_hold_estimate=10.0)
+        gate = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(controller, 'holder', gate))
+        await settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot('openai', 'gpt-4o', 'late'):
+                pass
+        gate.set()
+        await holder
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    # One request ahead on one slot with a 10s average hold
+    assert rejected.retry_after == 10.0
+
+def test_sheds_with_retry_after_when_the_event_loop_lags():
+    async def run():
+        controller = single_slot_controller(max_loop_lag=0.5)
+        controller.loop_lag = 1.0
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot('openai', 'gpt-4o', 'uid'):
+                pass
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.retry_after == 4.0
+
+def test_queue_positions_are_reported_in_tag_order():
+    async def run():
+        controller = single_slot_controller()
+        positions = []
+
+        def recorder(uid):
+            async def on_position(position, estimated_wait):
+                positions.append((uid, position))
+            return on_position
+
+        async def request(uid, weight):
+            async with controller.slot('openai', 'gpt-4o', uid, weight=weight, on_position=recorder(uid)):
+                pass
+
+        gate = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(controller, 'holder', gate))
+        await settle()
+        # Heavier weights get earlier finish tags, so each arrival goes to the front
+        tasks = []
+        for uid, weight in (('a', 1.0), ('b', 2.0), ('c', 4.0)):
+            tasks.append(asyncio.create_task(request(uid, weight)))
+            await settle()
+        gate.set()
+        await asyncio.gather(holder, *tasks)
+        return positions
+
+    positions = asyncio.run(run())
+    assert positions[:6] == [('a', 1), ('b', 1), ('a', 2), ('c', 1), ('b', 2), ('a', 3)]
+    # Moving up the queue as slots free: b then a
+    assert positions[6:] == [('b', 1), ('a', 2), ('a', 1)]
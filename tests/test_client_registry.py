@@ -0,0 +1,41 @@
+import asyncio
+import anthropic
+import openai
+from app.agents.AnthropicClient import AnthropicClient
+from app.agents.OpenAiClient import OpenAiClient
+from app.agents.client_registry import client_registry
+
+def test_builds_anthropic_and_openai_clients_on_their_own_pools(monkeypatch):
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-anthropic-key')
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-openai-key')
+
+    async def build():
+        client_registry.invalidate()
+        try:
+            anthropic_client = AnthropicClient()
+            openai_client = OpenAiClient()
+            await anthropic_client.initialize()
+            await openai_client.initialize()
+
+            assert isinstance(anthropic_client.client, anthropic.AsyncAnthropic)
+            assert isinstance(openai_client.client, openai.OpenAI)
+            assert isinstance(openai_client.async_client, openai.AsyncOpenAI)
+
+            anthropic_pool = client_registry.async_http_client(anthropic)
+            openai_pool = client_registry.async_http_client(openai)
+            assert isinstance(anthropic_pool, anthropic.DefaultAsyncHttpxClient)
+            assert isinstance(openai_pool, openai.DefaultAsyncHttpxClient)
+            assert anthropic_pool is not openai_pool
+            assert anthropic_client.client._client is anthropic_pool
+            assert openai_client.async_client._client is openai_pool
+            assert openai_client.client._client is client_registry.sync_http_client(openai)
+
+            # A second lookup reuses the cached SDK client
+            again = AnthropicClient()
+            await again.initialize()
+            assert again.client is anthropic_client.client
+        finally:
+            client_registry.invalidate()
+            await client_registry.close()
+
+    asyncio.run(build())
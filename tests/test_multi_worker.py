@@ -0,0 +1,104 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+import socketio
+import uvicorn
+from app.services import PubSubBroker
+from app.services.PubSubBroker import LocalBroker
+from app.services.SocketClient import BrokerClientManager
+from app.services.System.SystemStateManager import SystemStateManager
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def serve(sio, port):
+    server = uvicorn.Server(uvicorn.Config(socketio.ASGIApp(sio), host='127.0.0.1', port=port, log_level='warning', lifespan='off'))
+    task = asyncio.ensure_future(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+async def wait_until(condition, timeout=5.0, poke=None):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, 'timed out waiting for the other worker'
+        if poke:
+            await poke()
+        await asyncio.sleep(0.05)
+
+def test_emit_on_one_worker_reaches_a_client_on_another():
+    async def run():
+        broker = LocalBroker()
+        worker_a = socketio.AsyncServer(async_mode='asgi', client_manager=BrokerClientManager(broker))
+        worker_b = socketio.AsyncServer(async_mode='asgi', client_manager=BrokerClientManager(broker))
+
+        @worker_b.on('join')
+        async def join(sid, room):
+            await worker_b.enter_room(sid, room)
+            return True
+
+        port_a, port_b = free_port(), free_port()
+        servers = [await serve(worker_a, port_a), await serve(worker_b, port_b)]
+        client = socketio.AsyncClient(reconnection=False)
+        probes, chunks = [], []
+        client.on('probe', lambda data: probes.append(data))
+        client.on('chat_response', lambda data: chunks.append(data))
+        try:
+            await client.connect(f'http://127.0.0.1:{port_b}', transports=['websocket'])
+            assert await client.call('join', 'chat-1') is True
+
+            # Worker B subscribes to the broker on its first connection; probe until it listens
+            await wait_until(lambda: probes, poke=lambda: worker_a.emit('probe', {}, room='chat-1'))
+
+            sent = [{'chat_id': 'chat-1', 'content': f'token {i} '} for i in range(10)]
+            for chunk in sent:
+                await worker_a.emit('chat_response', chunk, room='chat-1')
+            await worker_a.emit('chat_response', {'chat_id': 'chat-2', 'content': 'other room'}, room='chat-2')
+            await wait_until(lambda: len(chunks) >= len(sent))
+            await asyncio.sleep(0.1)
+            assert chunks == sent
+        finally:
+            await client.disconnect()
+            for server, task in servers:
+                server.should_exit = True
+                await task
+
+    asyncio.run(run())
+
+class FakeConfigCollection:
+    def __init__(self, config_files):
+        self.config_files = config_files
+
+    async def find_one(self, query):
+        return {'config_files': [dict(file) for file in self.config_files]}
+
+def test_system_state_change_reaches_the_other_worker(monkeypatch):
+    broker = LocalBroker()
+    monkeypatch.setattr(PubSubBroker, '_broker', broker)
+    nginx = {'path': '/etc/nginx/nginx.conf', 'category': 'Nginx', 'restart_command': 'systemctl restart nginx'}
+    collection = FakeConfigCollection([nginx])
+    db = SimpleNamespace(db=SimpleNamespace(system_config=collection, users=None))
+
+    async def run():
+        worker_a = SystemStateManager(db)
+        worker_b = SystemStateManager(db)
+        worker_a.worker_id, worker_b.worker_id = 'worker-a', 'worker-b'
+        await worker_a.initialize()
+        await worker_b.initialize()
+        worker_b.start_state_sync()
+        try:
+            # Let worker B subscribe before worker A publishes
+            await wait_until(lambda: broker._subscribers.get('system_state'))
+
+            collection.config_files = [dict(nginx, restart_command='systemctl reload nginx')]
+            await worker_a._notify_state_changed()
+            await wait_until(lambda: worker_b.config_files[nginx['path']]['restart_command'] == 'systemctl reload nginx')
+        finally:
+            worker_b._sync_task.cancel()
+            await asyncio.gather(worker_b._sync_task, return_exceptions=True)
+
+    asyncio.run(run())
@@ -0,0 +1,21 @@
+import json
+import os
+import subprocess
+import sys
+from benchmarks.bench_startup import CHILD, HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET_SECONDS = float(os.getenv('STARTUP_BUDGET_SECONDS', '2.0'))
+
+def test_create_app_stays_light_and_within_budget():
+    # A fresh interpreter, so modules imported by other tests don't count
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    result = subprocess.run([sys.executable, '-c', CHILD], capture_output=True, text=True, env=env, cwd=ROOT)
+    assert result.returncode == 0, result.stderr[-4000:]
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded_heavy = sorted({name.split('.')[0] for name in report['modules']} & set(HEAVY_MODULES))
+    assert not loaded_heavy, f"heavy modules loaded at startup: {', '.join(loaded_heavy)}"
+    assert report['elapsed'] <= STARTUP_BUDGET_SECONDS, (
+        f"startup took {report['elapsed']:.3f}s, over the {STARTUP_BUDGET_SECONDS:.3f}s budget; "
+        'run `python -m benchmarks.bench_startup` for the slowest imports')
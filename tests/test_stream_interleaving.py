@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+from app.agents.handlers.stream_emitter import CoalescingConfig
+from app.agents.handlers.stream_handler import StreamHandler
+
+class RecordingSio:
+    def __init__(self):
+        self.emits = []
+
+    async def emit(self, event, data, room=None, **kwargs):
+        self.emits.append((room, data['content']))
+
+def openai_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+def anthropic_chunk(text):
+    return SimpleNamespace(type='content_block_delta', delta=SimpleNamespace(type='text_delta', text=text))
+
+async def fake_provider_stream(make_chunk, tokens, delay=0.005):
+    """An async provider stream that yields to the event loop between deltas, like a network read."""
+    for token in tokens:
+        await asyncio.sleep(delay)
+        yield make_chunk(token)
+
+def test_concurrent_streams_interleave_and_stay_in_their_rooms():
+    sio = RecordingSio()
+    # One frame per delta, so the emit order shows how the streams were scheduled
+    config = CoalescingConfig(base_window=0.0, max_chars=1)
+    openai_tokens = [f'a{i} ' for i in range(20)]
+    anthropic_tokens = [f'b{i} ' for i in range(20)]
+
+    async def run():
+        handler_a = StreamHandler(sio, 'chat_response', config, model='openai')
+        handler_b = StreamHandler(sio, 'chat_response', config, model='anthropic')
+        return await asyncio.gather(
+            handler_a.process_stream('chat-a', fake_provider_stream(openai_chunk, openai_tokens), room='room-a'),
+            handler_b.process_stream('chat-b', fake_provider_stream(anthropic_chunk, anthropic_tokens), room='room-b'),
+        )
+
+    accumulator_a, accumulator_b = asyncio.run(run())
+
+    # Each room gets only its own chunks, in order
+    assert [content for room, content in sio.emits if room == 'room-a'] == openai_tokens
+    assert [content for room, content in sio.emits if room == 'room-b'] == anthropic_tokens
+    assert ''.join(chunk['content'] for chunk in accumulator_a.to_chunks()) == ''.join(openai_tokens)
+    assert ''.join(chunk['content'] for chunk in accumulator_b.to_chunks()) == ''.join(anthropic_tokens)
+
+    # The streams ran at the same time instead of one after the other
+    rooms = [room for room, _ in sio.emits]
+    first_b = rooms.index('room-b')
+    last_a = len(rooms) - 1 - rooms[::-1].index('room-a')
+    assert first_b < last_a
+    switches = sum(1 for previous, current in zip(rooms, rooms[1:]) if previous != current)
+    assert switches > len(openai_tokens) // 2